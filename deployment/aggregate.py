@@ -0,0 +1,238 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import CLASSES, MAP_FILE_PATH, RESULTS_DB_PATH, SITE_RADIUS_M
+from dedup import haversine_m
+from geo import UNKNOWN, load_boundary_map
+
+METERS_PER_DEGREE = 111_320
+MEASURES = ("sites", "weighted", "images")
+
+
+# --- SITE DEDUP ---
+def grid_cells(lons, lats, radius_m):
+    """[x, y] grid cell of side `radius_m` per point (equirectangular meters)."""
+    y = np.floor(lats * METERS_PER_DEGREE / radius_m)
+    x = np.floor(lons * METERS_PER_DEGREE * np.cos(np.radians(lats)) / radius_m)
+    return np.stack([x, y], axis=1).astype(np.int64).tolist()
+
+
+class SiteIndex:
+    """
+    Distinct physical objects of one class, found by GPS proximity: a
+    sighting within `radius_m` of a known site is that site again (the
+    nearest one wins). Sites are hashed into grid cells of `radius_m`, so a
+    sighting only checks the 3x3 cells around it.
+    """
+
+    def __init__(self, radius_m):
+        self.radius_m = radius_m
+        self.cells = {}
+        self.lons, self.lats, self.best, self.owner = [], [], [], []
+
+    def find(self, lon, lat, cell):
+        cx, cy = cell
+        best_site, best_m = None, self.radius_m
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for site in self.cells.get((cx + dx, cy + dy), ()):
+                    meters = haversine_m(lon, lat, self.lons[site], self.lats[site])
+                    if meters <= best_m:
+                        best_site, best_m = site, meters
+        return best_site
+
+    def add(self, lon, lat, cell, conf, owner):
+        site = len(self.lons)
+        self.lons.append(lon)
+        self.lats.append(lat)
+        self.best.append(conf)
+        self.owner.append(owner)
+        self.cells.setdefault(tuple(cell), []).append(site)
+        return site
+
+
+# --- AGGREGATION ---
+class SubdistrictAggregator:
+    """
+    Provider presence per subdistrict, updated in O(batch) as rows arrive:
+
+        images[s]       photos tagged to subdistrict s
+        hits[s, c]      photos in s where class c is flagged
+        sites[s, c]     distinct class-c objects in s after merging sightings
+                        within `radius_m` (a pole shot five times counts once)
+        weighted[s, c]  sum over those sites of their best confidence
+
+    A flagged class without a box (checked by the analyst) has confidence 1.
+    Photos without GPS cannot be merged, so each is its own site. A site
+    belongs to the subdistrict of its first sighting. Deleting rows or
+    editing checkboxes cannot be undone incrementally; rebuild with
+    from_db() after those.
+    """
+
+    def __init__(self, radius_m=SITE_RADIUS_M):
+        self.radius_m = radius_m
+        self.names = []
+        self.index = {}
+        self.images = np.zeros(0, dtype=np.int64)
+        self.hits = np.zeros((0, len(CLASSES)), dtype=np.int64)
+        self.sites = np.zeros((0, len(CLASSES)), dtype=np.int64)
+        self.weighted = np.zeros((0, len(CLASSES)), dtype=np.float64)
+        self.site_index = [SiteIndex(radius_m) for _ in CLASSES]
+        self.seen = set()  # image ids already counted
+        self.stale = False
+
+    def _rows_for(self, names):
+        """Row index per subdistrict name; new names grow the arrays (capacity doubles)."""
+        for name in names:
+            if name not in self.index:
+                self.index[name] = len(self.names)
+                self.names.append(name)
+        if len(self.names) > len(self.images):
+            grow = max(len(self.names), 2 * len(self.images), 64) - len(self.images)
+            self.images = np.concatenate([self.images, np.zeros(grow, dtype=np.int64)])
+            for attr in ("hits", "sites", "weighted"):
+                array = getattr(self, attr)
+                setattr(self, attr, np.concatenate([array, np.zeros((grow, len(CLASSES)), dtype=array.dtype)]))
+        return np.array([self.index[name] for name in names], dtype=np.int64)
+
+    def add_arrays(self, image_ids, subdistricts, lons, lats, flags, confs):
+        """flags / confs: (n, n_classes); confs is the best box confidence per class (0 without a box)."""
+        if self.seen.intersection(image_ids):
+            self.stale = True  # re-inferred images: their old counts are still in
+        self.seen.update(image_ids)
+        rows = self._rows_for([UNKNOWN if s is None else str(s) for s in subdistricts])
+        np.add.at(self.images, rows, 1)
+        np.add.at(self.hits, rows, flags.astype(np.int64))
+
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        has_gps = (lons != 0.0) & np.isfinite(lons) & np.isfinite(lats)
+        weights = np.where(confs > 0, confs, 1.0)
+        no_gps = flags & ~has_gps[:, None]  # each its own site
+        np.add.at(self.sites, rows, no_gps.astype(np.int64))
+        np.add.at(self.weighted, rows, np.where(no_gps, weights, 0.0))
+
+        gps = np.nonzero(has_gps)[0]
+        cells = grid_cells(lons[gps], lats[gps], self.radius_m)
+        for k, i in enumerate(gps.tolist()):
+            lon, lat, cell, row = float(lons[i]), float(lats[i]), cells[k], int(rows[i])
+            for c in np.flatnonzero(flags[i]).tolist():
+                weight = float(weights[i, c])
+                index = self.site_index[c]
+                site = index.find(lon, lat, cell)
+                if site is None:
+                    index.add(lon, lat, cell, weight, row)
+                    self.sites[row, c] += 1
+                    self.weighted[row, c] += weight
+                elif weight > index.best[site]:
+                    self.weighted[index.owner[site], c] += weight - index.best[site]
+                    index.best[site] = weight
+
+    def add(self, rows):
+        """Pipeline / table rows (class flags + labels + confs)."""
+        if not rows: return
+        flags = np.array([[bool(row[cls]) for cls in CLASSES] for row in rows], dtype=bool)
+        confs = np.zeros(flags.shape)
+        class_ids = {cls.lower(): c for c, cls in enumerate(CLASSES)}
+        for i, row in enumerate(rows):
+            for label, conf in zip(row["labels"], row["confs"]):
+                c = class_ids.get(label.lower())
+                if c is not None and conf > confs[i, c]: confs[i, c] = conf
+        self.add_arrays([row.get("image_id", row.get("path")) for row in rows], [row["subdistrict"] for row in rows],
+                        [row["lon"] or 0.0 for row in rows], [row["lat"] or 0.0 for row in rows], flags, confs)
+
+    @classmethod
+    def from_db(cls, results_db, radius_m=SITE_RADIUS_M):
+        """Rebuilds the counts from every image in the results store, chunk by chunk."""
+        aggregator = cls(radius_m)
+        for images, detections, flags in results_db.chunks():
+            confs = np.zeros(flags.shape)
+            np.maximum.at(confs, (detections["image"], detections["class_id"]), detections["conf"])
+            aggregator.add_arrays(images["image_id"].tolist(), images["subdistrict"].tolist(),
+                                  images["lon"].fillna(0.0).to_numpy(), images["lat"].fillna(0.0).to_numpy(),
+                                  flags, confs)
+        return aggregator
+
+    # Queries
+    def frame(self):
+        """One row per subdistrict: images, then <class>_sites / _weighted / _images columns."""
+        n = len(self.names)
+        data = {"subdistrict": self.names, "images": self.images[:n]}
+        for c, cls in enumerate(CLASSES):
+            data[f"{cls}_sites"] = self.sites[:n, c]
+            data[f"{cls}_weighted"] = self.weighted[:n, c].round(2)
+            data[f"{cls}_images"] = self.hits[:n, c]
+        return pd.DataFrame(data)
+
+    def query(self, measure="sites", classes=None, subdistricts=None):
+        """Subdistrict x class pivot of one measure ("sites", "weighted" or "images"), optionally filtered."""
+        n = len(self.names)
+        values = {"sites": self.sites, "weighted": self.weighted, "images": self.hits}[measure][:n]
+        df = pd.DataFrame(values, index=pd.Index(self.names, name="subdistrict"), columns=CLASSES)
+        if classes is not None: df = df[list(classes)]
+        if subdistricts is not None: df = df.loc[df.index.intersection(list(subdistricts))]
+        return df
+
+    def top(self, cls, count=10, measure="sites"):
+        return self.query(measure)[cls].nlargest(count)
+
+    # Export
+    def export(self, path, boundary=None):
+        """
+        .csv: the frame as is. .geojson / .gpkg: the frame joined to the
+        subdistrict polygons (kelurahan dissolved per subdistrict); areas
+        without photos get zeros, photos outside the map are left out.
+        """
+        df = self.frame()
+        if path.lower().endswith(".csv"):
+            df.to_csv(path, index=False)
+            return len(df)
+        if boundary is None:
+            raise ValueError("Polygon export needs the boundary map")
+        gdf = subdistrict_polygons(boundary).merge(df, on="subdistrict", how="left")
+        counts = df.columns.drop("subdistrict")
+        gdf[counts] = gdf[counts].fillna(0).astype(df.dtypes[counts])
+        driver = "GPKG" if path.lower().endswith(".gpkg") else "GeoJSON"
+        gdf.to_file(path, driver=driver)
+        return len(gdf)
+
+
+def subdistrict_polygons(boundary):
+    """GeoDataFrame with one (multi)polygon per subdistrict name of a BoundaryIndex."""
+    import geopandas as gpd
+
+    gdf = gpd.GeoDataFrame({"subdistrict": boundary.names}, geometry=list(boundary.geometries), crs="EPSG:4326")
+    return gdf.dissolve(by="subdistrict", as_index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Provider counts per subdistrict from the results store")
+    parser.add_argument("--db", type=str, default=RESULTS_DB_PATH, help="Results store (SQLite)")
+    parser.add_argument("--map", type=str, default=MAP_FILE_PATH, help="BPS boundary shapefile (polygon outputs)")
+    parser.add_argument("--out", type=str, default=None, help="Write the summary (.csv, .geojson or .gpkg)")
+    parser.add_argument("--radius", type=float, default=SITE_RADIUS_M, help="Meters within which sightings merge")
+    parser.add_argument("--measure", type=str, default="sites", choices=MEASURES, help="What the printed table counts")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"results store not found: {args.db}")
+    from results_db import ResultsDB
+
+    db = ResultsDB(args.db)
+    t0 = time.perf_counter()
+    aggregator = SubdistrictAggregator.from_db(db, args.radius)
+    db.close()
+    print(f"Aggregated {int(aggregator.images.sum())} images in {time.perf_counter() - t0:.1f}s")
+    print(aggregator.query(args.measure).to_string())
+    if args.out:
+        boundary = None
+        if not args.out.lower().endswith(".csv"):
+            if not os.path.exists(args.map):
+                parser.error(f"map not found: {args.map} (needed for {args.out})")
+            boundary = load_boundary_map(args.map)
+        count = aggregator.export(args.out, boundary)
+        print(f"Wrote {count} subdistricts -> {args.out}")
@@ -1,141 +1,171 @@
 import sys
 import os
+import time
 import pandas as pd
-import geopandas as gpd
-from shapely.geometry import Point
-from PIL import Image
-from PIL.ExifTags import TAGS, GPSTAGS
 
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
-                             QHBoxLayout, QPushButton, QFileDialog, QTableWidget,
-                             QTableWidgetItem, QLabel, QHeaderView, QMessageBox,
+                             QHBoxLayout, QPushButton, QFileDialog, QTableView,
+                             QLabel, QHeaderView, QMessageBox,
                              QProgressDialog, QAbstractItemView, QStyle)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
 from PyQt6.QtGui import QPixmap, QImage, QIcon
-import ctypes
-from ultralytics import YOLO
 
-# --- CONFIGURATION ---
-CLASSES = ["Indihome", "Indosat", "MyRepublic", "Lintasarta", "CBN"]
-MODEL_PATH = "best.pt"
-
-# --- CONFIGURATION PETA BPS ---
-MAP_FILE_PATH = "map/Batas_Wilayah_KelurahanDesa_10K_AR.shp"
-KECAMATAN_COLUMN = "WADMKC"
+from config import (MODEL_PATH, MAP_FILE_PATH, RESULT_CACHE_PATH, RESULTS_DB_PATH, JOURNAL_DIR,
+                    STREAM_CHUNK_SIZE, STREAM_INTERVAL_S, SERVER_URL, PROCESS_WORKERS, DEDUP_ENABLED, STORE_POLL_S)
+from engine import InferencePipeline
+from client import RemotePipeline
+from pool import ProcessPipeline
+from geo import load_boundary_map
+from result_cache import ResultCache
+from results_db import ResultsDB
+from previews import PreviewCache
+from table_model import ResultStore, ResultsTableModel
+from journal import RunJournal, find_incomplete
+from dedup import REPORT_COLUMNS, find_near_duplicates
+from aggregate import SubdistrictAggregator
 
 # --- TASKBAR ICON ---
-myappid = 'provider.detection'
-ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
+if sys.platform == 'win32':
+    import ctypes
+    myappid = 'provider.detection'
+    ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
 
 
 # --- WORKER THREAD ---
 class InferenceWorker(QThread):
     progress_signal = pyqtSignal(int, str)
-    finished_signal = pyqtSignal(list)
+    rows_signal = pyqtSignal(list)
+    stats_signal = pyqtSignal(dict)
+    finished_signal = pyqtSignal(int)
     error_signal = pyqtSignal(str)
 
-    def __init__(self, model_path, image_paths, start_id, gdf_map):
+    def __init__(self, model_path, image_paths, start_id, boundary, cache=None, previews=None, journal=None,
+                 results_db=None):
         super().__init__()
         self.model_path = model_path
         self.image_paths = image_paths
         self.start_id = start_id
-        self.gdf_map = gdf_map
-        self.is_running = True
-
-    def get_geotagging(self, exif):
-        if not exif: return None, None
-        geotagging = {}
-        for (idx, tag) in TAGS.items():
-            if tag == 'GPSInfo':
-                if idx not in exif: return None, None
-                for (key, val) in GPSTAGS.items():
-                    if key in exif[idx]:
-                        geotagging[val] = exif[idx][key]
-        return geotagging
-
-    def get_decimal_from_dms(self, dms, ref):
-        degrees = dms[0]
-        minutes = dms[1]
-        seconds = dms[2]
-        result = degrees + minutes / 60.0 + seconds / 3600.0
-        if ref in ['S', 'W']:
-            result = -result
-        return result
-
-    def get_coordinates(self, file_path):
+        self.boundary = boundary
+        self.journal = journal
+        self.results_db = results_db
+        if SERVER_URL:
+            # Model and boundary map are already loaded by a running server.py
+            self.pipeline = RemotePipeline(SERVER_URL, previews=previews)
+        elif PROCESS_WORKERS:
+            self.pipeline = ProcessPipeline(model_path, boundary, processes=PROCESS_WORKERS, cache=cache,
+                                            previews=previews)
+        else:
+            self.pipeline = InferencePipeline(model_path, boundary, cache=cache, previews=previews)
+
+    def flush(self, chunk):
+        # Journal and store first, so every row the UI has seen is also on disk
+        if self.journal is not None: self.journal.append(chunk)
+        if self.results_db is not None: self.results_db.add_rows(chunk)
+        self.rows_signal.emit(chunk)
+
+    def run(self):
+        chunk = []
+        count = 0
+        last_flush = time.perf_counter()
+        stats_text = ""
         try:
-            image = Image.open(file_path)
-            exif = image._getexif()
-            geotags = self.get_geotagging(exif) if exif else None
-
-            if geotags and 'GPSLatitude' in geotags and 'GPSLongitude' in geotags:
-                lat = self.get_decimal_from_dms(geotags['GPSLatitude'], geotags['GPSLatitudeRef'])
-                lon = self.get_decimal_from_dms(geotags['GPSLongitude'], geotags['GPSLongitudeRef'])
-                return round(lon, 6), round(lat, 6)
-        except Exception:
-            pass
-        return 0.0, 0.0
+            try:
+                for row_data in self.pipeline.run(self.image_paths, self.start_id):
+                    chunk.append(row_data)
+                    count += 1
+                    if len(chunk) >= STREAM_CHUNK_SIZE or time.perf_counter() - last_flush >= STREAM_INTERVAL_S:
+                        self.flush(chunk)
+                        chunk = []
+                        last_flush = time.perf_counter()
+                        snapshot = self.pipeline.stats.snapshot()
+                        stats_text = self.pipeline.stats.format(snapshot)
+                        self.stats_signal.emit(snapshot)
+                    self.progress_signal.emit(count, f"Processing: {row_data['name']}\n{stats_text}")
+            finally:
+                if chunk: self.flush(chunk)
+                self.stats_signal.emit(self.pipeline.stats.snapshot())
+                self.pipeline.close()  # one worker per run: shut down pool processes
+
+            # A cancelled run keeps its journal so it can be resumed later
+            if self.journal is not None and count == len(self.image_paths):
+                self.journal.finish()
+            self.finished_signal.emit(count)
 
-    def get_kecamatan(self, lon, lat):
-        if self.gdf_map is None or lon == 0.0: return "Unknown"
+        except Exception as e:
+            self.error_signal.emit(str(e))
 
-        try:
-            point = Point(lon, lat)
-            matching_area = self.gdf_map[self.gdf_map.contains(point)]
+    def stop(self):
+        self.pipeline.stop()
 
-            if not matching_area.empty:
-                return matching_area.iloc[0][KECAMATAN_COLUMN]
-            else:
-                return "Outside Area"
-        except Exception:
-            return "Error"
+
+class MapLoader(QThread):
+    loaded_signal = pyqtSignal(object)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, map_path):
+        super().__init__()
+        self.map_path = map_path
 
     def run(self):
-        results_data = []
         try:
-            model = YOLO(self.model_path)
+            self.loaded_signal.emit(load_boundary_map(self.map_path))
+        except Exception as e:
+            self.error_signal.emit(str(e))
 
-            for i, img_path in enumerate(self.image_paths):
-                if not self.is_running: break
 
-                filename = os.path.basename(img_path)
-                self.progress_signal.emit(i + 1, f"Processing: {filename}")
+class DedupWorker(QThread):
+    done_signal = pyqtSignal(object)
+    error_signal = pyqtSignal(str)
 
-                results = model(img_path, verbose=False)[0]
-                detected_indices = results.boxes.cls.cpu().numpy().astype(int)
-                detected_names_lower = [results.names[i].lower() for i in detected_indices]
+    def __init__(self, image_paths):
+        super().__init__()
+        self.image_paths = image_paths
 
-                lon, lat = self.get_coordinates(img_path)
+    def run(self):
+        try:
+            self.done_signal.emit(find_near_duplicates(self.image_paths))
+        except Exception as e:
+            self.error_signal.emit(str(e))
 
-                # --- LOGIKA KECAMATAN ---
-                subdistrict = self.get_kecamatan(lon, lat)
 
-                res_plotted = results.plot()
-                current_id = self.start_id + i
+class ExportWorker(QThread):
+    done_signal = pyqtSignal(int)
+    error_signal = pyqtSignal(str)
 
-                row_data = {
-                    "id": current_id,
-                    "path": img_path,
-                    "name": filename,
-                    "lon": lon,
-                    "lat": lat,
-                    "subdistrict": subdistrict,
-                    "result_img": res_plotted
-                }
+    def __init__(self, results_db, path, level):
+        super().__init__()
+        self.results_db = results_db
+        self.path = path
+        self.level = level
 
-                for cls in CLASSES:
-                    row_data[cls] = cls.lower() in detected_names_lower
+    def run(self):
+        try:
+            self.done_signal.emit(self.results_db.export(self.path, self.level))
+        except Exception as e:
+            self.error_signal.emit(str(e))
 
-                results_data.append(row_data)
 
-            self.finished_signal.emit(results_data)
+class SummaryWorker(QThread):
+    done_signal = pyqtSignal(object, int)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, aggregator, results_db, boundary, path):
+        super().__init__()
+        self.aggregator = aggregator
+        self.results_db = results_db
+        self.boundary = boundary
+        self.path = path
 
+    def run(self):
+        try:
+            # Rebuilt from the store on first use and after deletes / checkbox edits
+            aggregator = self.aggregator
+            if aggregator is None or aggregator.stale:
+                aggregator = SubdistrictAggregator.from_db(self.results_db)
+            self.done_signal.emit(aggregator, aggregator.export(self.path, self.boundary))
         except Exception as e:
             self.error_signal.emit(str(e))
 
-    def stop(self):
-        self.is_running = False
-
 
 # MAIN APP
 class ProviderApp(QMainWindow):
@@ -147,20 +177,30 @@ class ProviderApp(QMainWindow):
         if os.path.exists("logo.ico"):
             self.setWindowIcon(QIcon("logo.ico"))
 
-        self.df_data = []
+        self.store = ResultStore()
         self.current_batch_paths = []
-
-        #LOAD PETA BPS
-        self.gdf_map = None
-        try:
-            if os.path.exists(MAP_FILE_PATH):
-                self.gdf_map = gpd.read_file(MAP_FILE_PATH)
-                if self.gdf_map.crs != "EPSG:4326":
-                    self.gdf_map = self.gdf_map.to_crs("EPSG:4326")
-            else:
-                print(f"Warning: Map file {MAP_FILE_PATH} not found. Subdistrict feature disabled.")
-        except Exception as e:
-            print(f"Error loading map: {e}")
+        self.journal = None
+        self.last_stats = None
+        self.clusters = None
+        self.cluster_rows = []
+        self.result_cache = ResultCache(RESULT_CACHE_PATH)
+        self.results_db = ResultsDB(RESULTS_DB_PATH)
+        self.previews = PreviewCache()
+        self.aggregator = None  # built from the store on the first summary, then kept up to date per chunk
+        self.summary_worker = None
+        self.summary_missed = False  # rows / edits that came in while a summary was being built
+
+        #LOAD PETA BPS (background, from the compiled cache)
+        self.boundary = None
+        self.map_loader = None
+        if os.path.exists(MAP_FILE_PATH):
+            self.map_loader = MapLoader(MAP_FILE_PATH)
+            self.map_loader.loaded_signal.connect(self.on_map_loaded)
+            self.map_loader.error_signal.connect(self.on_map_error)
+            self.map_loader.start()
+            self.statusBar().showMessage("Loading boundary map...")
+        else:
+            print(f"Warning: Map file {MAP_FILE_PATH} not found. Subdistrict feature disabled.")
 
         # UI Setup
         central_widget = QWidget()
@@ -174,9 +214,12 @@ class ProviderApp(QMainWindow):
         self.btn_run = QPushButton("2. Run Inference")
         self.btn_run.clicked.connect(self.run_inference)
         self.btn_run.setEnabled(False)
-        self.btn_export = QPushButton("3. Export CSV")
-        self.btn_export.clicked.connect(self.export_csv)
+        self.btn_export = QPushButton("3. Export Results")
+        self.btn_export.clicked.connect(self.export_results)
         self.btn_export.setEnabled(False)
+        self.btn_summary = QPushButton("4. Subdistrict Summary")
+        self.btn_summary.clicked.connect(self.export_summary)
+        self.btn_summary.setEnabled(False)
         self.btn_open = QPushButton("Open Full Image")
         self.btn_open.clicked.connect(self.open_full_image)
         self.btn_delete = QPushButton()
@@ -191,6 +234,7 @@ class ProviderApp(QMainWindow):
         btn_layout.addWidget(self.btn_load)
         btn_layout.addWidget(self.btn_run)
         btn_layout.addWidget(self.btn_export)
+        btn_layout.addWidget(self.btn_summary)
         btn_layout.addWidget(self.btn_open)
         btn_layout.addWidget(self.btn_delete)
         main_layout.addLayout(btn_layout)
@@ -211,23 +255,81 @@ class ProviderApp(QMainWindow):
         img_layout.addWidget(self.lbl_pred)
         main_layout.addLayout(img_layout)
 
-        # Table
-        self.table = QTableWidget()
-        self.table.setColumnCount(5 + len(CLASSES))
-        self.table.setHorizontalHeaderLabels(["ID", "Image Name", "Longitude", "Latitude", "Subdistrict"] + CLASSES)
+        # Table (virtualized: the view only asks the model for visible cells)
+        self.table_model = ResultsTableModel(self.store, self.results_db)
+        self.table_model.dataChanged.connect(self.mark_summary_stale)
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
         # self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.table.cellClicked.connect(self.display_image)
+        self.table.clicked.connect(self.display_image)
         self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.table.verticalHeader().setVisible(False)
         header = self.table.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         header.setSectionResizeMode(0, QHeaderView.ResizeMode.Fixed)
         self.table.setColumnWidth(0, 50)
         main_layout.addWidget(self.table)
 
+        # Results of earlier sessions (with the analyst's checkbox edits) come back from the store
+        self.store_seq = self.results_db.last_seq()
+        self.own_writes = {}  # image_id -> seq of rows this window stored itself (not to be reloaded)
+        self.table_model.append_rows(self.results_db.load_rows())
+        self.btn_export.setEnabled(len(self.store) > 0)
+        self.btn_summary.setEnabled(len(self.store) > 0)
+        self.offer_resume()
+
+        # Rows other tools write to the store (watch.py, batch.py --db) show up while the app is open
+        self.store_timer = QTimer(self)
+        self.store_timer.timeout.connect(self.poll_store)
+        self.store_timer.start(int(STORE_POLL_S * 1000))
+
+    def offer_resume(self):
+        """Restores rows from a crashed/cancelled run and queues its remaining images."""
+        incomplete = find_incomplete(JOURNAL_DIR)
+        if not incomplete: return
+        journal = RunJournal.load(incomplete[0])
+        remaining = journal.remaining_paths
+
+        confirm = QMessageBox.question(self, "Resume Previous Run",
+                                       f"An unfinished run was found ({len(journal.rows)} of {len(journal.paths)} "
+                                       f"images done).\nRestore its results and continue?",
+                                       QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if confirm != QMessageBox.StandardButton.Yes:
+            journal.discard()
+            return
+
+        # Rows flushed before the crash are already in the results store
+        known_paths = set(self.store.columns["path"])
+        missing = [row for row in journal.rows if row["path"] not in known_paths]
+        self.results_db.add_rows(missing)
+        self.own_writes.update((row["image_id"], row["seq"]) for row in missing)
+        self.table_model.append_rows(missing)
+        if len(self.store):
+            self.btn_export.setEnabled(True)
+            self.btn_summary.setEnabled(True)
+        if remaining:
+            self.journal = journal
+            self.current_batch_paths = remaining
+            self.btn_run.setEnabled(True)
+            self.btn_run.setText(f"2. Run Inference ({len(remaining)} remaining images)")
+        else:
+            journal.finish()
+
+    def on_map_loaded(self, boundary):
+        self.boundary = boundary
+        self.statusBar().showMessage(f"Boundary map ready ({len(boundary)} areas).", 5000)
+
+    def on_map_error(self, err_msg):
+        print(f"Error loading map: {err_msg}")
+        self.statusBar().showMessage("Boundary map failed to load. Subdistrict feature disabled.")
+
     def load_images(self):
         files, _ = QFileDialog.getOpenFileNames(self, "Select Images", "", "Images (*.png *.jpg *.jpeg)")
         if files:
             self.current_batch_paths = files
+            self.journal = None
+            self.clusters = None
             self.btn_run.setEnabled(True)
             self.btn_run.setText(f"2. Run Inference ({len(files)} new images)")
             QMessageBox.information(self, "Info", f"Loaded {len(files)} new images.")
@@ -235,10 +337,26 @@ class ProviderApp(QMainWindow):
     def run_inference(self):
         if not self.current_batch_paths: return
 
-        if self.gdf_map is None:
+        if self.map_loader is not None and self.map_loader.isRunning():
+            QMessageBox.information(self, "Map Loading", "Boundary map is still loading, please try again in a moment.")
+            return
+
+        if DEDUP_ENABLED and self.journal is None and self.clusters is None:
+            # Near-duplicate pre-pass first; inference resumes in on_dedup_done
+            self.btn_run.setEnabled(False)
+            self.statusBar().showMessage(f"Looking for near-duplicates in {len(self.current_batch_paths)} images...")
+            self.dedup_worker = DedupWorker(self.current_batch_paths)
+            self.dedup_worker.done_signal.connect(self.on_dedup_done)
+            self.dedup_worker.error_signal.connect(self.on_dedup_error)
+            self.dedup_worker.start()
+            return
+
+        if self.boundary is None:
             QMessageBox.warning(self, "Map Warning", "File BPS not found. Subdistrict will be 'Unknown'.")
 
-        start_id = len(self.df_data)
+        start_id = len(self.store)
+        if self.journal is None:
+            self.journal = RunJournal.create(JOURNAL_DIR, self.current_batch_paths)
 
         self.progress = QProgressDialog("Initializing...", "Cancel", 0, len(self.current_batch_paths), self)
         self.progress.setWindowTitle("Processing Batch")
@@ -246,53 +364,98 @@ class ProviderApp(QMainWindow):
         self.progress.setMinimumDuration(0)
         self.progress.setValue(0)
 
-        # Pass self.gdf_map ke Worker
-        self.worker = InferenceWorker(MODEL_PATH, self.current_batch_paths, start_id, self.gdf_map)
+        # Pass self.boundary ke Worker
+        self.worker = InferenceWorker(MODEL_PATH, self.current_batch_paths, start_id, self.boundary,
+                                      self.result_cache, self.previews, self.journal, self.results_db)
 
         self.worker.progress_signal.connect(self.update_progress_ui)
+        self.worker.rows_signal.connect(self.on_rows_ready)
+        self.worker.stats_signal.connect(self.on_stats)
         self.worker.finished_signal.connect(self.on_inference_complete)
         self.worker.error_signal.connect(self.on_inference_error)
         self.progress.canceled.connect(self.worker.stop)
 
         self.worker.start()
 
+    def on_dedup_done(self, clusters):
+        self.clusters = clusters
+        self.cluster_rows.extend(clusters.report_rows())
+        self.current_batch_paths = clusters.representative_paths
+        self.btn_run.setEnabled(True)
+        self.statusBar().showMessage(f"{clusters.skipped} near-duplicate photos skipped, "
+                                     f"{len(self.current_batch_paths)} to process.")
+        self.run_inference()
+
+    def on_dedup_error(self, err_msg):
+        self.btn_run.setEnabled(True)
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "Error", f"Near-duplicate check failed:\n{err_msg}")
+
     def update_progress_ui(self, val, msg):
         self.progress.setValue(val)
         self.progress.setLabelText(msg)
 
-    def on_inference_complete(self, new_data):
-        self.df_data.extend(new_data)
-        self.current_batch_paths = []
-        self.btn_run.setEnabled(False)
-        self.btn_run.setText("2. Run Inference")
-        self.populate_table()
-        self.progress.setValue(self.progress.maximum())
+    def on_stats(self, snapshot):
+        self.last_stats = snapshot
+        self.statusBar().showMessage(f"{snapshot['images']} images | {snapshot['images_per_s']:.1f} img/s | "
+                                     f"RSS {snapshot['memory']['rss_mb'] or 0:.0f} MB")
+
+    def on_rows_ready(self, rows):
+        # Already stored by the inference worker (flush), which set image_id / seq
+        self.own_writes.update((row["image_id"], row["seq"]) for row in rows if "seq" in row)
+        self.show_rows(rows)
+
+    def poll_store(self):
+        if self.results_db.last_seq() <= self.store_seq: return
+        rows = self.results_db.load_rows(since_seq=self.store_seq)
+        if not rows: return  # deleted in the meantime
+        self.store_seq = max(row["seq"] for row in rows)
+        rows = [row for row in rows if self.own_writes.pop(row["image_id"], None) != row["seq"]]
+        if rows:
+            self.show_rows(rows)
+            self.statusBar().showMessage(f"{len(rows)} new results from the store.", 5000)
+
+    def show_rows(self, rows):
+        self.table_model.append_rows(rows)
         self.btn_export.setEnabled(True)
-        QMessageBox.information(self, "Success", f"Added {len(new_data)} items.")
+        if self.summary_running():
+            self.summary_missed = True
+            return
+        self.btn_summary.setEnabled(True)
+        if self.aggregator is not None:
+            self.aggregator.add(rows)
+
+    def summary_running(self):
+        return self.summary_worker is not None and self.summary_worker.isRunning()
+
+    def mark_summary_stale(self, *args):
+        if self.summary_running():
+            self.summary_missed = True
+        elif self.aggregator is not None:
+            self.aggregator.stale = True
+
+    def on_inference_complete(self, count):
+        if count < len(self.current_batch_paths):
+            # Cancelled: keep the journal and the remaining images for a later resume
+            self.current_batch_paths = self.journal.remaining_paths if self.journal else []
+            self.btn_run.setText(f"2. Run Inference ({len(self.current_batch_paths)} remaining images)")
+            self.btn_run.setEnabled(bool(self.current_batch_paths))
+        else:
+            self.current_batch_paths = []
+            self.journal = None
+            self.btn_run.setEnabled(False)
+            self.btn_run.setText("2. Run Inference")
+        self.progress.setValue(self.progress.maximum())
+        QMessageBox.information(self, "Success", f"Added {count} items.")
 
     def on_inference_error(self, err_msg):
         self.progress.cancel()
+        if self.journal is not None:
+            self.current_batch_paths = self.journal.remaining_paths
         QMessageBox.critical(self, "Error", f"Inference Failed:\n{err_msg}")
 
-    def populate_table(self):
-        self.table.setRowCount(len(self.df_data))
-        for row, data in enumerate(self.df_data):
-            self.table.setItem(row, 0, QTableWidgetItem(str(data['id'])))
-            self.table.setItem(row, 1, QTableWidgetItem(data['name']))
-            self.table.setItem(row, 2, QTableWidgetItem(str(data['lon'])))
-            self.table.setItem(row, 3, QTableWidgetItem(str(data['lat'])))
-            self.table.setItem(row, 4, QTableWidgetItem(str(data['subdistrict'])))
-
-            for col_idx, cls in enumerate(CLASSES):
-                item = QTableWidgetItem()
-                item.setFlags(Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsEnabled)
-                state = Qt.CheckState.Checked if data[cls] else Qt.CheckState.Unchecked
-                item.setCheckState(state)
-                item.setData(Qt.ItemDataRole.UserRole, data['id'])
-                self.table.setItem(row, 5 + col_idx, item)
-
     def delete_selected_rows(self):
-        selected_rows = sorted(set(index.row() for index in self.table.selectedIndexes()), reverse=True)
+        selected_rows = sorted(index.row() for index in self.table.selectionModel().selectedRows())
         if not selected_rows: return
 
         confirm = QMessageBox.question(self, "Confirm Delete",
@@ -300,43 +463,41 @@ class ProviderApp(QMainWindow):
                                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
 
         if confirm == QMessageBox.StandardButton.Yes:
-            ids_to_delete = []
+            paths = self.store.columns['path']
             for row in selected_rows:
-                id_item = self.table.item(row, 0)
-                if id_item: ids_to_delete.append(int(id_item.text()))
-
-            self.df_data = [d for d in self.df_data if d['id'] not in ids_to_delete]
-
-            for new_id, data in enumerate(self.df_data):
-                data['id'] = new_id
-
-            self.populate_table()
-            if not self.df_data: self.btn_export.setEnabled(False)
-
-    def display_image(self, row, col):
-        if row >= len(self.df_data): return
-        data = self.df_data[row]
+                self.previews.discard(paths[row])
+            image_ids = self.store.columns['image_id']
+            self.results_db.remove([image_ids[row] for row in selected_rows if image_ids[row] is not None])
+
+            self.table_model.remove_rows(selected_rows)
+            self.mark_summary_stale()
+            if not len(self.store):
+                self.btn_export.setEnabled(False)
+                self.btn_summary.setEnabled(False)
+
+    def display_image(self, index):
+        row = index.row()
+        if row >= len(self.store): return
+        data = self.store.row(row)
         try:
-            pix_orig = QPixmap(data['path'])
-            pix_orig_scaled = pix_orig.scaled(self.lbl_orig.size(), Qt.AspectRatioMode.KeepAspectRatio,
-                                              Qt.TransformationMode.SmoothTransformation)
-            self.lbl_orig.setPixmap(pix_orig_scaled)
-            img_res = data['result_img']
-            height, width, channel = img_res.shape
-            bytes_per_line = 3 * width
-            q_img = QImage(img_res.data, width, height, bytes_per_line, QImage.Format.Format_BGR888)
-            pix_res = QPixmap.fromImage(q_img)
-            pix_res_scaled = pix_res.scaled(self.lbl_pred.size(), Qt.AspectRatioMode.KeepAspectRatio,
-                                            Qt.TransformationMode.SmoothTransformation)
-            self.lbl_pred.setPixmap(pix_res_scaled)
+            previews = self.previews.get(data)
+            if previews is None: return
+            for label, img in zip((self.lbl_orig, self.lbl_pred), previews):
+                height, width, channel = img.shape
+                bytes_per_line = 3 * width
+                q_img = QImage(img.data, width, height, bytes_per_line, QImage.Format.Format_BGR888)
+                pix = QPixmap.fromImage(q_img)
+                pix_scaled = pix.scaled(label.size(), Qt.AspectRatioMode.KeepAspectRatio,
+                                        Qt.TransformationMode.SmoothTransformation)
+                label.setPixmap(pix_scaled)
         except Exception:
             pass
 
     def open_full_image(self):
-        current_row = self.table.currentRow()
+        current_row = self.table.currentIndex().row()
         if current_row < 0: return
-        if current_row < len(self.df_data):
-            img_path = self.df_data[current_row]['path']
+        if current_row < len(self.store):
+            img_path = self.store.columns['path'][current_row]
             if platform.system() == 'Windows':
                 os.startfile(img_path)
             elif platform.system() == 'Darwin':
@@ -344,28 +505,76 @@ class ProviderApp(QMainWindow):
             else:
                 subprocess.call(('xdg-open', img_path))
 
-    def export_csv(self):
-        export_data = []
-        for row in range(self.table.rowCount()):
-            row_dict = {
-                "id": self.table.item(row, 0).text(),
-                "image_name": self.table.item(row, 1).text(),
-                "longitude": self.table.item(row, 2).text(),
-                "latitude": self.table.item(row, 3).text(),
-                "subdistrict": self.table.item(row, 4).text(),
-            }
-            for col_idx, cls in enumerate(CLASSES):
-                # Geser index + 5
-                item = self.table.item(row, 5 + col_idx)
-                is_checked = item.checkState() == Qt.CheckState.Checked
-                row_dict[cls] = is_checked
-            export_data.append(row_dict)
-
-        df = pd.DataFrame(export_data)
-        path, _ = QFileDialog.getSaveFileName(self, "Save CSV", "detection_results_kecamatan.csv", "CSV (*.csv)")
-        if path:
-            df.to_csv(path, index=False)
-            QMessageBox.information(self, "Success", "Data exported successfully!")
+    def closeEvent(self, event):
+        self.previews.close()
+        self.result_cache.close()
+        self.results_db.close()
+        super().closeEvent(event)
+
+    def export_results(self):
+        filters = {"CSV, one row per image (*.csv)": "images", "Parquet, one row per image (*.parquet)": "images",
+                   "GeoPackage, one point per image (*.gpkg)": "images",
+                   "CSV, one row per box (*.csv)": "detections", "Parquet, one row per box (*.parquet)": "detections",
+                   "GeoPackage, one point per box (*.gpkg)": "detections"}
+        path, selected = QFileDialog.getSaveFileName(self, "Export Results", "detection_results_kecamatan.csv",
+                                                     ";;".join(filters))
+        if not path: return
+        ext = selected[selected.rindex("*") + 1:-1]
+        if not path.lower().endswith(ext): path += ext
+        if self.cluster_rows:
+            pd.DataFrame(self.cluster_rows, columns=REPORT_COLUMNS).to_csv(
+                os.path.splitext(path)[0] + "_clusters.csv", index=False)
+
+        self.btn_export.setEnabled(False)
+        self.statusBar().showMessage(f"Exporting {len(self.store)} images to {path}...")
+        self.export_worker = ExportWorker(self.results_db, path, filters[selected])
+        self.export_worker.done_signal.connect(self.on_export_done)
+        self.export_worker.error_signal.connect(self.on_export_error)
+        self.export_worker.start()
+
+    def on_export_done(self, count):
+        self.btn_export.setEnabled(len(self.store) > 0)
+        self.statusBar().showMessage(f"Exported {count} rows.", 5000)
+        QMessageBox.information(self, "Success", "Data exported successfully!")
+
+    def on_export_error(self, err_msg):
+        self.btn_export.setEnabled(len(self.store) > 0)
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "Error", f"Export Failed:\n{err_msg}")
+
+    def export_summary(self):
+        filters = ["GeoPackage, subdistrict polygons (*.gpkg)", "GeoJSON, subdistrict polygons (*.geojson)",
+                   "CSV, table only (*.csv)"]
+        path, selected = QFileDialog.getSaveFileName(self, "Subdistrict Summary", "subdistrict_summary.gpkg",
+                                                     ";;".join(filters))
+        if not path: return
+        ext = selected[selected.rindex("*") + 1:-1]
+        if not path.lower().endswith(ext): path += ext
+        if ext != ".csv" and self.boundary is None:
+            QMessageBox.warning(self, "Map Not Loaded", "The boundary map is needed for polygon output; "
+                                                        "export as CSV or wait for the map to load.")
+            return
+
+        self.btn_summary.setEnabled(False)
+        self.summary_missed = False
+        self.statusBar().showMessage(f"Writing subdistrict summary to {path}...")
+        self.summary_worker = SummaryWorker(self.aggregator, self.results_db, self.boundary, path)
+        self.summary_worker.done_signal.connect(self.on_summary_done)
+        self.summary_worker.error_signal.connect(self.on_summary_error)
+        self.summary_worker.start()
+
+    def on_summary_done(self, aggregator, count):
+        # Changes made while it ran are not in it: rebuild next time
+        self.aggregator = None if self.summary_missed else aggregator
+        self.btn_summary.setEnabled(len(self.store) > 0)
+        self.statusBar().showMessage(f"Summary written: {count} subdistricts.", 5000)
+        QMessageBox.information(self, "Success", "Subdistrict summary exported successfully!")
+
+    def on_summary_error(self, err_msg):
+        self.aggregator = None
+        self.btn_summary.setEnabled(len(self.store) > 0)
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "Error", f"Summary Failed:\n{err_msg}")
 
 
 # --- ENTRY POINT ---
@@ -0,0 +1,205 @@
+import argparse
+import glob
+import json
+import os
+import pstats
+import time
+
+from config import (BACKEND, MODEL_PATH, MAP_FILE_PATH, BATCH_SIZE, PREFETCH_WORKERS, PROCESS_WORKERS,
+                    RESULT_CACHE_PATH, JOURNAL_DIR, TILE_SIZE, TILE_OVERLAP, TILE_MERGE, DEDUP_ENABLED,
+                    DEDUP_MAX_DISTANCE, DEDUP_MAX_METERS, DEDUP_MAX_SECONDS)
+from dedup import find_near_duplicates
+from engine import InferencePipeline, BACKEND_WEIGHTS
+from client import RemotePipeline
+from pool import ProcessPipeline
+from geo import load_boundary_map
+from result_cache import ResultCache
+from results_db import ResultsDB
+from journal import RunJournal
+from writers import export_row, open_writer
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def collect_images(inputs):
+    """Expands directories (recursively) and glob patterns into a sorted, de-duplicated list."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.extend(os.path.join(root, f) for f in files)
+        else:
+            paths.extend(glob.glob(item, recursive=True))
+    paths = [p for p in paths if p.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(p)]
+    return sorted(set(paths))
+
+
+def load_boundary(args):
+    if args.server:
+        print(f"Using inference server: {args.server} (model and map are the server's)")
+        return None
+    if args.map and os.path.exists(args.map):
+        boundary = load_boundary_map(args.map)
+        print(f"Boundary map loaded: {len(boundary)} areas")
+        return boundary
+    print(f"Warning: Map file {args.map} not found. Subdistrict will be 'Unknown'.")
+    return None
+
+
+def build_pipeline(args, boundary, cache):
+    """Remote, process-pool or in-process pipeline from the shared command-line options."""
+    if args.server:
+        return RemotePipeline(args.server, upload=args.upload)
+    if getattr(args, "processes", 0):
+        pipeline = ProcessPipeline(args.model, boundary, processes=args.processes,
+                                   threads_per_process=args.threads_per_process, batch_size=args.batch_size,
+                                   device=args.device, cache=cache, backend=args.backend, tile_size=args.tile_size,
+                                   tile_overlap=args.tile_overlap, tile_merge=args.tile_merge,
+                                   tile_full_pass=not args.no_full_pass)
+        print(f"Process pool: {pipeline.processes} workers x {pipeline.threads_per_process} torch threads")
+        return pipeline
+    return InferencePipeline(args.model, boundary, batch_size=args.batch_size,
+                             prefetch_workers=args.workers, device=args.device, cache=cache,
+                             backend=args.backend, tile_size=args.tile_size,
+                             tile_overlap=args.tile_overlap, tile_merge=args.tile_merge,
+                             tile_full_pass=not args.no_full_pass)
+
+
+def run_batch(args):
+    if args.resume:
+        journal = RunJournal.load(args.resume)
+        image_paths = journal.remaining_paths
+        print(f"Resuming {args.resume}: {len(journal.rows)} done, {len(image_paths)} remaining")
+    else:
+        image_paths = collect_images(args.inputs)
+        print(f"Found {len(image_paths)} images")
+        if not image_paths: return
+        if args.dedup:
+            t0 = time.perf_counter()
+            clusters = find_near_duplicates(image_paths, args.dedup_distance, args.dedup_meters,
+                                            args.dedup_seconds, args.workers)
+            report_path = os.path.splitext(args.out)[0] + "_clusters.csv"
+            clusters.write_report(report_path)
+            image_paths = clusters.representative_paths
+            print(f"Near-duplicates: {clusters.skipped} skipped, {len(image_paths)} representatives "
+                  f"({time.perf_counter() - t0:.1f}s). Clusters: {report_path}")
+        journal = RunJournal.create(args.journal_dir, image_paths)
+    print(f"Journal: {journal.path}")
+
+    boundary = load_boundary(args)
+    cache = None if args.no_cache or args.server else ResultCache(args.cache)
+    pipeline = build_pipeline(args, boundary, cache)
+    if args.profile:
+        rows = pipeline.profile(image_paths[:args.profile], args.profile_out)
+        print(pipeline.stats.format())
+        print(f"Profiled {len(rows)} images -> {args.profile_out} (view with: python -m pstats / snakeviz)")
+        pstats.Stats(args.profile_out).sort_stats("cumulative").print_stats(25)
+        journal.discard()
+        pipeline.close()
+        if cache is not None: cache.close()
+        return
+
+    stats_log = open(args.stats_jsonl, "a", encoding="utf-8") if args.stats_jsonl else None
+
+    def log_stats():
+        if stats_log is None: return
+        stats_log.write(json.dumps(pipeline.stats.snapshot()) + "\n")
+        stats_log.flush()
+
+    writer = open_writer(args.out)
+    writer.write([export_row(row_data) for row_data in journal.rows])
+    results_db = ResultsDB(args.db) if args.db else None
+    if results_db is not None: results_db.add_rows(journal.rows)
+    chunk = []
+    completed = False
+    last_report = time.perf_counter()
+    try:
+        for i, row_data in enumerate(pipeline.run(image_paths, start_id=len(journal.rows)), start=1):
+            chunk.append(row_data)
+            if len(chunk) >= args.flush_every:
+                journal.append(chunk)
+                writer.write([export_row(r) for r in chunk])
+                if results_db is not None: results_db.add_rows(chunk)
+                chunk = []
+            if time.perf_counter() - last_report >= args.report_every:
+                print(f"[{i}/{len(image_paths)}] {pipeline.summary()}")
+                log_stats()
+                last_report = time.perf_counter()
+        completed = True
+    finally:
+        journal.append(chunk)
+        writer.write([export_row(r) for r in chunk])
+        writer.close()
+        if results_db is not None:
+            results_db.add_rows(chunk)
+            results_db.close()
+        log_stats()
+        if stats_log is not None: stats_log.close()
+        pipeline.close()
+        if cache is not None: cache.close()
+        if completed:
+            journal.finish()
+        else:
+            print(f"Interrupted. Resume with: --resume {journal.path}")
+
+    print(f"Done. {pipeline.summary()}")
+    print(f"Results saved to: {args.out}")
+
+
+def add_pipeline_args(parser):
+    """Model, backend, tiling, map, cache and server options shared by batch.py and watch.py."""
+    parser.add_argument("--model", type=str, default=MODEL_PATH, help="Model weights")
+    parser.add_argument("--backend", type=str, default=BACKEND, choices=list(BACKEND_WEIGHTS),
+                        help="Inference backend (exported with scripts/export.py)")
+    parser.add_argument("--tile-size", type=int, default=TILE_SIZE, help="Sliced inference tile size (off if unset)")
+    parser.add_argument("--tile-overlap", type=float, default=TILE_OVERLAP, help="Overlap between tiles (0..1)")
+    parser.add_argument("--tile-merge", type=str, default=TILE_MERGE, choices=["nms", "wbf"],
+                        help="How boxes from overlapping tiles are merged")
+    parser.add_argument("--no-full-pass", action="store_true", help="Skip the downscaled full-image pass")
+    parser.add_argument("--map", type=str, default=MAP_FILE_PATH, help="BPS boundary shapefile")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Images per model call")
+    parser.add_argument("--workers", type=int, default=PREFETCH_WORKERS, help="Decode/EXIF prefetch threads")
+    parser.add_argument("--device", type=str, default=None, help="Device (0, 1, or cpu)")
+    parser.add_argument("--cache", type=str, default=RESULT_CACHE_PATH, help="Persistent result cache (SQLite)")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-run inference")
+    parser.add_argument("--server", type=str, default=None, help="Use a running server.py (e.g. http://127.0.0.1:8765)")
+    parser.add_argument("--upload", action="store_true", help="Upload image bytes instead of sending paths to --server")
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="Headless provider detection + EXIF + subdistrict tagging")
+    parser.add_argument("inputs", nargs="*", help="Image directories and/or glob patterns")
+    parser.add_argument("--out", type=str, default="detection_results_kecamatan.csv", help="Output .csv or .parquet")
+    add_pipeline_args(parser)
+    parser.add_argument("--dedup", action=argparse.BooleanOptionalAction, default=DEDUP_ENABLED,
+                        help="Infer one photo per near-duplicate cluster (report written next to --out)")
+    parser.add_argument("--dedup-distance", type=int, default=DEDUP_MAX_DISTANCE, help="Max dHash bit difference")
+    parser.add_argument("--dedup-meters", type=float, default=DEDUP_MAX_METERS, help="Max GPS distance")
+    parser.add_argument("--dedup-seconds", type=float, default=DEDUP_MAX_SECONDS,
+                        help="Max capture time difference")
+    parser.add_argument("--processes", type=int, default=PROCESS_WORKERS,
+                        help="Worker processes, each with its own model (0 = single process)")
+    parser.add_argument("--threads-per-process", type=int, default=None,
+                        help="Torch threads per worker (default: cores / processes)")
+    parser.add_argument("--db", type=str, default=None,
+                        help="Also keep rows, boxes included, in this results store (see results_db.py)")
+    parser.add_argument("--journal-dir", type=str, default=JOURNAL_DIR, help="Where run journals are written")
+    parser.add_argument("--resume", type=str, default=None, help="Journal of an interrupted run to resume")
+    parser.add_argument("--flush-every", type=int, default=64, help="Rows per write to the output file")
+    parser.add_argument("--stats-jsonl", type=str, default=None,
+                        help="Append a pipeline stats snapshot (JSON line) at every progress report")
+    parser.add_argument("--profile", type=int, default=0, metavar="N",
+                        help="Profile the first N images with cProfile (single-threaded) and exit")
+    parser.add_argument("--profile-out", type=str, default="pipeline.prof", help="Where --profile writes its stats")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Seconds between progress lines")
+    args = parser.parse_args()
+    if not args.inputs and not args.resume:
+        parser.error("give at least one input directory/glob, or --resume")
+    if args.profile and (args.server or args.processes):
+        parser.error("--profile runs the single-process pipeline; drop --server / --processes")
+    return args
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    run_batch(opt)
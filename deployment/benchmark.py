@@ -0,0 +1,229 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from config import BACKEND, MODEL_PATH, KECAMATAN_COLUMN
+from engine import InferencePipeline, BACKEND_WEIGHTS
+from pool import ProcessPipeline
+from stats import peak_rss_mb
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "experiments", "benchmark")
+
+# Synthetic survey area (around Jakarta), split into GRID x GRID fake subdistricts
+BBOX = (106.70, -6.30, 106.95, -6.10)
+GRID = 20
+
+
+# --- SYNTHETIC DATA ---
+def _dms(value):
+    value = abs(value)
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    return float(degrees), float(minutes), round((value - degrees - minutes / 60) * 3600, 4)
+
+
+def make_corpus(out_dir, n, size=(1240, 930), seed=0):
+    """n photo-sized JPEGs (random shapes + text) with GPS and DateTimeOriginal EXIF."""
+    from PIL import Image
+
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(n):
+        path = os.path.join(out_dir, f"synthetic_{i:05d}.jpg")
+        paths.append(path)
+        if os.path.exists(path): continue
+
+        width, height = size
+        image = np.full((height, width, 3), rng.integers(60, 200, 3), dtype=np.uint8)
+        for _ in range(12):
+            x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+            color = tuple(int(c) for c in rng.integers(0, 255, 3))
+            cv2.rectangle(image, (x, y), (x + int(rng.integers(20, 300)), y + int(rng.integers(20, 200))), color, -1)
+        cv2.putText(image, f"ODP-{i:05d}", (40, 80), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+
+        lon, lat = rng.uniform(BBOX[0], BBOX[2]), rng.uniform(BBOX[1], BBOX[3])
+        exif = Image.Exif()
+        exif.get_ifd(0x8825).update({1: "S" if lat < 0 else "N", 2: _dms(lat), 3: "E" if lon >= 0 else "W",
+                                     4: _dms(lon)})
+        exif.get_ifd(0x8769).update({0x9003: time.strftime("%Y:%m:%d %H:%M:%S", time.gmtime(1767225600 + i * 30))})
+        Image.fromarray(image[:, :, ::-1]).save(path, quality=90, exif=exif)
+    return paths
+
+
+def make_polygon_layer(out_dir, grid=GRID):
+    """Shapefile of grid x grid boxes over BBOX, named like BPS subdistricts."""
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    path = os.path.join(out_dir, "synthetic_boundaries.shp")
+    if os.path.exists(path): return path
+    xs = np.linspace(BBOX[0], BBOX[2], grid + 1)
+    ys = np.linspace(BBOX[1], BBOX[3], grid + 1)
+    cells = [(box(xs[i], ys[j], xs[i + 1], ys[j + 1]), f"KEC_{i:02d}_{j:02d}") for i in range(grid) for j in range(grid)]
+    gdf = gpd.GeoDataFrame({KECAMATAN_COLUMN: [name for _, name in cells]},
+                           geometry=[geom for geom, _ in cells], crs="EPSG:4326")
+    gdf.to_file(path)
+    return path
+
+
+def run_config(config):
+    """One benchmark configuration, meant to run in a fresh process (isolated peak RSS, cold caches)."""
+    from geo import load_boundary_map
+    from previews import PreviewCache
+
+    paths = config["paths"]
+    boundary = load_boundary_map(config["map"])
+    previews = PreviewCache() if config["previews"] else None
+
+    if config["processes"]:
+        pipeline = ProcessPipeline(config["model"], boundary, processes=config["processes"],
+                                   batch_size=config["batch_size"], device=config["device"],
+                                   previews=previews, backend=config["backend"])
+    else:
+        pipeline = InferencePipeline(config["model"], boundary, batch_size=config["batch_size"],
+                                     prefetch_workers=config["workers"], device=config["device"],
+                                     previews=previews, backend=config["backend"])
+
+    # Warm-up on the same pipeline (model load, first-call kernels, pool spawn, file cache) is excluded
+    # from the numbers; with --processes it gets at least one shard per worker so every worker is loaded
+    warmup = max(config["warmup"], (config["processes"] or 0) * config["batch_size"])
+    for _ in pipeline.run(paths[:warmup]): pass
+    pipeline.stats.reset()
+
+    t0 = time.perf_counter()
+    count = sum(1 for _ in pipeline.run(paths))
+    wall = time.perf_counter() - t0
+    pipeline.close()
+    if previews is not None: previews.close()
+    return {
+        "backend": config["backend"],
+        "batch_size": config["batch_size"],
+        "workers": config["workers"],
+        "processes": config["processes"],
+        "images": count,
+        "wall_s": round(wall, 3),
+        "images_per_s": round(count / wall, 2) if wall > 0 else 0.0,
+        "stages": {name: {"images_per_s": round(stats.rate, 2), **stats.distribution()}
+                   for name, stats in pipeline.stats.stages.items()},
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_worker_mb": peak_rss_mb(children=True) if config["processes"] else None,
+    }
+
+
+def environment():
+    import torch
+    import ultralytics
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "ultralytics": ultralytics.__version__,
+    }
+
+
+# --- REPORT ---
+def config_key(r):
+    return r["backend"], r["batch_size"], r["workers"], r.get("processes", 0)
+
+
+def print_table(results, baseline=None):
+    base = {config_key(r): r for r in (baseline or [])}
+    print(f"\n{'backend':<14}{'batch':>6}{'workers':>8}{'procs':>6}{'img/s':>9}{'decode p95':>12}{'infer p95':>11}"
+          f"{'post p95':>10}{'RSS MB':>9}" + ("   vs baseline" if baseline else ""))
+    for r in results:
+        stages = r["stages"]
+        line = (f"{r['backend']:<14}{r['batch_size']:>6}{r['workers']:>8}{r.get('processes', 0):>6}{r['images_per_s']:>9.2f}"
+                f"{stages['decode'].get('p95_ms', 0):>12.1f}{stages['infer'].get('p95_ms', 0):>11.1f}"
+                f"{stages['post'].get('p95_ms', 0):>10.1f}{r['peak_rss_mb'] or 0:>9.0f}")
+        old = base.get(config_key(r))
+        if old and old["images_per_s"]:
+            line += f"   {(r['images_per_s'] / old['images_per_s'] - 1) * 100:+.1f}%"
+        print(line)
+
+
+def benchmark(args):
+    data_dir = os.path.abspath(args.data_dir)
+    print(f"Preparing synthetic corpus in {data_dir} ({args.images} images)...")
+    paths = make_corpus(data_dir, args.images, seed=args.seed)
+    map_path = make_polygon_layer(data_dir)
+
+    results = []
+    for backend, batch_size, workers, processes in itertools.product(args.backends, args.batch_sizes, args.workers,
+                                                                     args.processes):
+        if processes and workers != args.workers[0]: continue  # prefetch threads are unused by the process pool
+        config = {"paths": paths, "map": map_path, "model": os.path.abspath(args.model), "backend": backend,
+                  "batch_size": batch_size, "workers": workers, "processes": processes, "device": args.device,
+                  "previews": not args.no_previews, "warmup": args.warmup}
+        print(f"\n[{backend} | batch {batch_size} | workers {workers} | processes {processes}]")
+        # Fresh interpreter per configuration so peak RSS and caches are not shared
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], input=json.dumps(config),
+                              capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        if proc.returncode != 0:
+            print(f"  failed: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"  {result['images_per_s']:.2f} img/s, peak RSS {result['peak_rss_mb']} MB")
+        results.append(result)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+
+    report = {"environment": environment(), "images": len(paths), "results": results}
+    out = args.out or os.path.join(RESULTS_DIR, f"bench_{report['environment']['commit'] or 'nogit'}_"
+                                                f"{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to: {out}")
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="Benchmark the deployment pipeline on synthetic data")
+    parser.add_argument("--model", type=str, default=MODEL_PATH, help="Model weights")
+    parser.add_argument("--backends", nargs="+", default=[BACKEND], choices=list(BACKEND_WEIGHTS))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 4, 8])
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 4])
+    parser.add_argument("--processes", nargs="+", type=int, default=[0],
+                        help="Process pool sizes to try (0 = single-process pipeline)")
+    parser.add_argument("--images", type=int, default=64, help="Synthetic corpus size")
+    parser.add_argument("--warmup", type=int, default=4, help="Images run before timing each configuration")
+    parser.add_argument("--device", type=str, default=None, help="Device (0, 1, or cpu)")
+    parser.add_argument("--no-previews", action="store_true", help="Skip preview rendering (GUI does it)")
+    parser.add_argument("--data-dir", type=str, default=os.path.join("cache", "benchmark"),
+                        help="Where the synthetic corpus is generated (reused across runs)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", type=str, default=None, help="Earlier results JSON to compare img/s against")
+    parser.add_argument("--out", type=str, default=None, help="Results JSON (default: experiments/benchmark/)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    if opt.child:
+        print(json.dumps(run_config(json.load(sys.stdin))))
+    else:
+        benchmark(opt)
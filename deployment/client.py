@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from engine import make_row
+from stats import PipelineStats
+
+
+# --- HTTP CLIENT ---
+class InferenceClient:
+    """Thin client for server.py (stdlib only)."""
+
+    def __init__(self, url, timeout=300):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, route, data=None, headers=None):
+        request = urllib.request.Request(self.url + route, data=data, headers=headers or {})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def health(self):
+        return self._request("/health")
+
+    def metrics(self):
+        return self._request("/metrics")
+
+    def infer_paths(self, paths):
+        """Payloads for files the server can read itself (same machine / share)."""
+        body = json.dumps({"paths": [os.path.abspath(p) for p in paths]}).encode("utf-8")
+        return self._request("/infer", body, {"Content-Type": "application/json"})["results"]
+
+    def infer_image(self, data, name="upload"):
+        """Payload for one uploaded, still encoded image."""
+        headers = {"Content-Type": "application/octet-stream", "X-Filename": name}
+        return self._request("/infer", data, headers)["results"][0]
+
+
+# --- REMOTE PIPELINE ---
+class RemotePipeline:
+    """
+    Drop-in for InferencePipeline that sends images to a running server.py.
+    Several small requests are kept in flight so the server can merge them
+    (and other analysts' requests) into full batches.
+    """
+
+    def __init__(self, url, previews=None, chunk_size=4, concurrency=4, upload=False):
+        self.client = InferenceClient(url)
+        self.previews = previews
+        self.chunk_size = max(1, chunk_size)
+        self.concurrency = max(1, concurrency)
+        self.upload = upload
+        self.stats = PipelineStats(("remote",))
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        pass  # the model lives in the server
+
+    @property
+    def throughput(self):
+        return self.stats.throughput
+
+    def summary(self):
+        return f"server {self.client.url}: {self.stats['remote'].items} img | total: {self.throughput:.1f} img/s"
+
+    def _infer_chunk(self, paths):
+        t0 = time.perf_counter()
+        if self.upload:
+            payloads = []
+            for img_path in paths:
+                with open(img_path, "rb") as f:
+                    payloads.append(self.client.infer_image(f.read(), os.path.basename(img_path)))
+        else:
+            payloads = self.client.infer_paths(paths)
+        for payload in payloads:
+            if "error" in payload: raise IOError(payload["error"])
+        self.stats["remote"].add(len(paths), time.perf_counter() - t0)
+        return payloads
+
+    def run(self, image_paths, start_id=0):
+        """Yields one row dict per image, in input order."""
+        self.client.health()  # fail fast when the server is not running
+        self.stats.start()
+        chunks = [image_paths[i:i + self.chunk_size] for i in range(0, len(image_paths), self.chunk_size)]
+        current_id = start_id
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            in_flight = [pool.submit(self._infer_chunk, chunk) for chunk in chunks[:self.concurrency]]
+            next_chunk = len(in_flight)
+            try:
+                while in_flight and not self._stop.is_set():
+                    chunk = chunks[next_chunk - len(in_flight)]
+                    payloads = in_flight.pop(0).result()
+                    if next_chunk < len(chunks):
+                        in_flight.append(pool.submit(self._infer_chunk, chunks[next_chunk]))
+                        next_chunk += 1
+                    for img_path, payload in zip(chunk, payloads):
+                        if self.previews is not None:
+                            image = cv2.imread(img_path)
+                            if image is not None:
+                                self.previews.add(img_path, image, payload["labels"], payload["boxes"],
+                                                  payload["confs"])
+                        yield make_row(current_id, img_path, payload)
+                        current_id += 1
+            finally:
+                for future in in_flight: future.cancel()
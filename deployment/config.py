@@ -0,0 +1,63 @@
+# --- CONFIGURATION ---
+CLASSES = ["Indihome", "Indosat", "MyRepublic", "Lintasarta", "CBN"]
+MODEL_PATH = "best.pt"
+# pytorch | onnx | onnx-int8 | openvino | openvino-int8 (see scripts/export.py)
+BACKEND = "pytorch"
+
+# --- CONFIGURATION PETA BPS ---
+MAP_FILE_PATH = "map/Batas_Wilayah_KelurahanDesa_10K_AR.shp"
+KECAMATAN_COLUMN = "WADMKC"
+MAP_CACHE_DIR = "map/.cache"
+
+# --- PIPELINE ---
+BATCH_SIZE = 8
+PREFETCH_WORKERS = 4
+QUEUE_SIZE = 32
+PROCESS_WORKERS = 0  # >0: shard images over this many processes (pool.py); 0: one process
+STREAM_CHUNK_SIZE = 32
+STREAM_INTERVAL_S = 0.5
+
+# --- SLICED INFERENCE (small / thin objects) ---
+TILE_SIZE = None  # e.g. 640 to enable
+TILE_OVERLAP = 0.2
+TILE_MERGE = "nms"  # nms | wbf
+TILE_FULL_PASS = True
+
+# --- PREVIEWS ---
+PREVIEW_SIZE = (600, 500)
+PREVIEW_CACHE_MB = 256
+
+# --- RESULT CACHE ---
+RESULT_CACHE_PATH = "cache/results.sqlite"
+RESULT_CACHE_MAX_MB = 256
+
+# --- RESULTS STORE ---
+RESULTS_DB_PATH = "results/results.sqlite"  # every image, box and checkbox override (results_db.py)
+EXPORT_CHUNK_ROWS = 100_000
+STORE_POLL_S = 5  # GUI picks up rows other tools (watch.py, batch.py --db) wrote to the store
+
+# --- SUBDISTRICT SUMMARY ---
+SITE_RADIUS_M = 15  # sightings of a class closer than this are one physical object (aggregate.py)
+
+# --- RUN JOURNAL ---
+JOURNAL_DIR = "cache/journal"
+
+# --- INFERENCE SERVER ---
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_URL = None  # e.g. "http://127.0.0.1:8765" to make the GUI use a running server.py
+SERVER_MAX_BATCH = 8
+SERVER_MAX_WAIT_MS = 10
+
+# --- NEAR-DUPLICATE PHOTOS ---
+DEDUP_ENABLED = False  # run inference on one photo per near-duplicate cluster
+DEDUP_MAX_DISTANCE = 6  # dHash bits (of 64)
+DEDUP_MAX_METERS = 15
+DEDUP_MAX_SECONDS = 300
+
+# --- WATCH FOLDERS ---
+WATCH_POLL_S = 2.0  # how often ready files are collected (and the folders rescanned without watchdog)
+WATCH_RESCAN_S = 60  # full rescan with watchdog, for events lost on network shares
+WATCH_DEBOUNCE_S = 3.0  # a file is ready once its size and mtime stop changing for this long
+WATCH_STALE_S = 30  # a stable file that looks truncated is inferred once unchanged this long (the check is a hint)
+WATCH_MAX_BATCH = 64  # images per pipeline run; new uploads wait at most one run
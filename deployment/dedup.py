@@ -0,0 +1,189 @@
+import argparse
+import csv
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from config import DEDUP_MAX_DISTANCE, DEDUP_MAX_METERS, DEDUP_MAX_SECONDS, PREFETCH_WORKERS
+from exif import get_coordinates, get_datetime_original
+
+REPORT_COLUMNS = ["cluster_id", "cluster_size", "representative", "path", "hamming", "meters", "seconds"]
+
+
+# --- PERCEPTUAL HASH ---
+def photo_signature(img_path, hash_size=8):
+    """
+    (dHash, sharpness) from a thumbnail. JPEGs are decoded at 1/8 scale by
+    libjpeg itself, so this costs a fraction of a full decode.
+    """
+    thumb = cv2.imread(img_path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if thumb is None:
+        thumb = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+    if thumb is None:
+        raise IOError(f"Cannot read image: {img_path}")
+    sharpness = float(cv2.Laplacian(thumb, cv2.CV_64F).var())
+    small = cv2.resize(thumb, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2), sharpness
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class MultiIndexHash:
+    """
+    Hamming-radius search over 64-bit hashes. The bits are split into
+    radius + 1 chunks; two hashes within `radius` bits must agree exactly on
+    at least one chunk (pigeonhole), so candidates come from radius + 1 dict
+    lookups and only those are compared bit by bit.
+    """
+
+    def __init__(self, radius, bits=64):
+        self.radius = radius
+        edges = [round(k * bits / (radius + 1)) for k in range(radius + 2)]
+        self.chunks = [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(edges, edges[1:])]
+        self.tables = [{} for _ in self.chunks]
+        self.values = {}
+
+    def add(self, value, index):
+        self.values[index] = value
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            table.setdefault((value >> shift) & mask, []).append(index)
+
+    def query(self, value, radius=None):
+        radius = self.radius if radius is None else min(radius, self.radius)
+        candidates = set()
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            candidates.update(table.get((value >> shift) & mask, ()))
+        return [i for i in candidates if hamming(value, self.values[i]) <= radius]
+
+
+# --- METADATA PROXIMITY ---
+def haversine_m(lon1, lat1, lon2, lat2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((p2 - p1) / 2) ** 2
+         + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * 6371000 * math.asin(math.sqrt(a))
+
+
+def _timestamp(value):
+    try:
+        return time.mktime(time.strptime(value, "%Y:%m:%d %H:%M:%S")) if value else None
+    except ValueError:
+        return None
+
+
+def _photo_info(img_path):
+    phash, sharpness = photo_signature(img_path)
+    lon, lat = get_coordinates(img_path)
+    return {"path": img_path, "hash": phash, "sharpness": sharpness,
+            "lon": lon, "lat": lat, "has_gps": (lon, lat) != (0.0, 0.0),
+            "time": _timestamp(get_datetime_original(img_path))}
+
+
+def _metadata_gap(a, b):
+    """(meters, seconds) between two photos; None where either side lacks the tag."""
+    meters = haversine_m(a["lon"], a["lat"], b["lon"], b["lat"]) if a["has_gps"] and b["has_gps"] else None
+    seconds = abs(a["time"] - b["time"]) if a["time"] is not None and b["time"] is not None else None
+    return meters, seconds
+
+
+# --- CLUSTERING ---
+class PhotoClusters:
+    """Near-duplicate groups; the sharpest photo of each group is its representative."""
+
+    def __init__(self, infos, groups):
+        self.infos = infos
+        self.groups = groups
+        self.representatives = [max(group, key=lambda i: infos[i]["sharpness"]) for group in groups]
+
+    @property
+    def representative_paths(self):
+        return [self.infos[i]["path"] for i in sorted(self.representatives)]
+
+    @property
+    def skipped(self):
+        return len(self.infos) - len(self.groups)
+
+    def report_rows(self):
+        rows = []
+        for cluster_id, (group, rep) in enumerate(zip(self.groups, self.representatives)):
+            for i in group:
+                meters, seconds = _metadata_gap(self.infos[rep], self.infos[i])
+                rows.append({"cluster_id": cluster_id, "cluster_size": len(group),
+                             "representative": self.infos[rep]["path"], "path": self.infos[i]["path"],
+                             "hamming": hamming(self.infos[rep]["hash"], self.infos[i]["hash"])
+                             if self.infos[i]["hash"] is not None else "",
+                             "meters": round(meters, 1) if meters is not None else "",
+                             "seconds": round(seconds) if seconds is not None else ""})
+        return rows
+
+    def write_report(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.report_rows())
+
+
+def find_near_duplicates(image_paths, max_distance=DEDUP_MAX_DISTANCE, max_meters=DEDUP_MAX_METERS,
+                         max_seconds=DEDUP_MAX_SECONDS, workers=PREFETCH_WORKERS):
+    """
+    Groups photos whose dHashes are within `max_distance` bits AND, where
+    both carry the tags, that were taken within `max_meters` and
+    `max_seconds` of each other. Unreadable files form their own group.
+    """
+    def safe_info(img_path):
+        try:
+            return _photo_info(img_path)
+        except Exception:
+            return {"path": img_path, "hash": None, "sharpness": 0.0, "lon": 0.0, "lat": 0.0,
+                    "has_gps": False, "time": None}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        infos = list(pool.map(safe_info, image_paths))
+
+    parent = list(range(len(infos)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    index = MultiIndexHash(max_distance)
+    for i, info in enumerate(infos):
+        if info["hash"] is None: continue
+        for j in index.query(info["hash"]):
+            meters, seconds = _metadata_gap(info, infos[j])
+            if meters is not None and meters > max_meters: continue
+            if seconds is not None and seconds > max_seconds: continue
+            parent[find(i)] = find(j)
+        index.add(info["hash"], i)
+
+    groups = {}
+    for i in range(len(infos)):
+        groups.setdefault(find(i), []).append(i)
+    return PhotoClusters(infos, sorted(groups.values()))
+
+
+if __name__ == "__main__":
+    from batch import collect_images
+
+    parser = argparse.ArgumentParser(description="Group near-duplicate survey photos (no inference)")
+    parser.add_argument("inputs", nargs="+", help="Image directories and/or glob patterns")
+    parser.add_argument("--out", type=str, default="near_duplicates.csv", help="Cluster report CSV")
+    parser.add_argument("--max-distance", type=int, default=DEDUP_MAX_DISTANCE, help="Max dHash bit difference")
+    parser.add_argument("--max-meters", type=float, default=DEDUP_MAX_METERS, help="Max GPS distance")
+    parser.add_argument("--max-seconds", type=float, default=DEDUP_MAX_SECONDS, help="Max capture time difference")
+    parser.add_argument("--workers", type=int, default=PREFETCH_WORKERS, help="Reader threads")
+    args = parser.parse_args()
+
+    paths = collect_images(args.inputs)
+    t0 = time.perf_counter()
+    clusters = find_near_duplicates(paths, args.max_distance, args.max_meters, args.max_seconds, args.workers)
+    clusters.write_report(args.out)
+    print(f"{len(paths)} images -> {len(clusters.groups)} clusters ({clusters.skipped} near-duplicates) "
+          f"in {time.perf_counter() - t0:.1f}s. Report: {args.out}")
@@ -0,0 +1,346 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from config import (CLASSES, BACKEND, BATCH_SIZE, PREFETCH_WORKERS, QUEUE_SIZE,
+                    TILE_SIZE, TILE_OVERLAP, TILE_MERGE, TILE_FULL_PASS)
+from exif import get_coordinates
+from geo import get_kecamatan_many
+from stats import PipelineStats
+from tiling import sliced_predict
+from utils import file_digest, weights_digest
+
+_DONE = object()
+
+# Exported model names, as written by ultralytics / scripts/export.py next to best.pt
+BACKEND_WEIGHTS = {
+    "pytorch": "{stem}.pt",
+    "onnx": "{stem}.onnx",
+    "onnx-int8": "{stem}_int8.onnx",
+    "openvino": "{stem}_openvino_model",
+    "openvino-int8": "{stem}_int8_openvino_model",
+}
+
+
+def resolve_weights(model_path, backend=BACKEND):
+    if backend not in BACKEND_WEIGHTS:
+        raise ValueError(f"Unknown backend '{backend}' (choose from {', '.join(BACKEND_WEIGHTS)})")
+    if backend == "pytorch": return model_path
+    stem = os.path.splitext(model_path)[0]
+    weights = BACKEND_WEIGHTS[backend].format(stem=stem)
+    if not os.path.exists(weights):
+        raise FileNotFoundError(f"{backend} model not found: {weights}. "
+                                f"Create it with scripts/export.py (see --formats / --int8).")
+    return weights
+
+
+# --- DETECTIONS ---
+def detections_from_arrays(boxes, scores, class_ids, names):
+    return {
+        "labels": [names[int(i)] for i in class_ids],
+        "boxes": [[round(v, 1) for v in box] for box in boxes.tolist()],
+        "confs": [round(c, 4) for c in scores.tolist()],
+    }
+
+
+def extract_detections(result):
+    """Plain-python labels / xyxy boxes / confidences from an ultralytics Results."""
+    return detections_from_arrays(result.boxes.xyxy.cpu().numpy(), result.boxes.conf.cpu().numpy(),
+                                  result.boxes.cls.cpu().numpy().astype(int), result.names)
+
+
+def make_row(row_id, img_path, payload):
+    """Table/export row from a detections + location payload."""
+    detected_names_lower = [label.lower() for label in payload["labels"]]
+    row_data = {
+        "id": row_id,
+        "path": img_path,
+        "name": os.path.basename(img_path),
+        "lon": payload["lon"],
+        "lat": payload["lat"],
+        "subdistrict": payload["subdistrict"],
+        "labels": payload["labels"],
+        "boxes": payload["boxes"],
+        "confs": payload["confs"]
+    }
+    for cls in CLASSES:
+        row_data[cls] = cls.lower() in detected_names_lower
+    return row_data
+
+
+def render_detections(image, labels, boxes, confs):
+    """Draws boxes the same way results.plot() does, from stored detections."""
+    from ultralytics.utils.plotting import Annotator, colors
+
+    class_ids = {name.lower(): i for i, name in enumerate(CLASSES)}
+    annotator = Annotator(image.copy(), example=str(CLASSES))
+    for label, box, conf in zip(labels, boxes, confs):
+        annotator.box_label(box, f"{label} {conf:.2f}", color=colors(class_ids.get(label.lower(), 0), True))
+    return annotator.result()
+
+
+# --- PIPELINE ---
+class InferencePipeline:
+    """
+    Three-stage pipeline: decode + EXIF prefetch (thread pool), batched YOLO
+    forward, and post-processing (subdistrict, names, previews). Stages are
+    joined by bounded queues so memory stays flat and the model never waits
+    on I/O. With a ResultCache, images already seen by the same model/map
+    cost only a content hash and a lookup. With a PreviewCache, display-size
+    previews are made from the already decoded image; rows never hold images.
+    """
+
+    def __init__(self, model_path, boundary=None, batch_size=BATCH_SIZE,
+                 prefetch_workers=PREFETCH_WORKERS, queue_size=QUEUE_SIZE, device=None, cache=None,
+                 previews=None, backend=BACKEND, tile_size=TILE_SIZE, tile_overlap=TILE_OVERLAP,
+                 tile_merge=TILE_MERGE, tile_full_pass=TILE_FULL_PASS):
+        self.model_path = model_path
+        self.weights = resolve_weights(model_path, backend)
+        self.boundary = boundary
+        self.batch_size = max(1, batch_size)
+        self.prefetch_workers = max(1, prefetch_workers)
+        self.queue_size = max(self.batch_size, queue_size)
+        self.device = device
+        self.cache = cache
+        self.previews = previews
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.tile_merge = tile_merge
+        self.tile_full_pass = tile_full_pass
+        self.model_hash = None
+        self.map_hash = getattr(boundary, "version", None) or "none"
+        # decode / infer / post are the pipeline stages; exif, geo and previews are timed inside them
+        self.stats = PipelineStats(("decode", "exif", "infer", "post", "geo", "previews"),
+                                   counters=("batches", "cache_hits"), output_stage="post")
+        self._model = None
+        self._stop = threading.Event()
+        self._error = None
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        """Releases the loaded model (pipelines are reusable until closed)."""
+        self._model = None
+
+    @property
+    def throughput(self):
+        return self.stats.throughput
+
+    def summary(self):
+        text = " | ".join(str(self.stats[name]) for name in ("decode", "infer", "post"))
+        if self.cache is not None:
+            text += f" | cache hits: {self.stats.counters['cache_hits']}"
+        return text + f" | total: {self.throughput:.1f} img/s"
+
+    def load_model(self):
+        from ultralytics import YOLO
+
+        model = YOLO(self.weights, task="detect")
+        if self.cache is not None:
+            self.model_hash = weights_digest(self.weights) if os.path.exists(self.weights) else self.weights
+            if self.tile_size:
+                # Sliced results differ from full-image ones; keep them apart in the cache
+                self.model_hash += (f"|tile{self.tile_size}-{self.tile_overlap}-{self.tile_merge}"
+                                    f"-{int(self.tile_full_pass)}")
+        return model
+
+    def predict(self, model, images):
+        """Detections dict per decoded BGR image, full-frame or sliced."""
+        if self.tile_size:
+            # One model batch per image: all of its tiles (+ the full-image pass)
+            return [detections_from_arrays(*sliced_predict(model, image, self.tile_size, self.tile_overlap,
+                                                           self.tile_merge, self.tile_full_pass,
+                                                           device=self.device))
+                    for image in images]
+        return [extract_detections(result) for result in model(images, verbose=False, device=self.device)]
+
+    # Stage 1
+    def _load(self, img_path):
+        t0 = time.perf_counter()
+        item = {"path": img_path, "image": None, "key": None, "cached": None}
+        if self.cache is not None:
+            item["key"] = (file_digest(img_path), self.model_hash, self.map_hash)
+            item["cached"] = self.cache.get(*item["key"])
+        if item["cached"] is None:
+            item["image"] = cv2.imread(img_path)
+            if item["image"] is None:
+                raise IOError(f"Cannot read image: {img_path}")
+            t1 = time.perf_counter()
+            item["lon"], item["lat"] = get_coordinates(img_path)
+            self.stats["exif"].add(1, time.perf_counter() - t1)
+        self.stats["decode"].add(1, time.perf_counter() - t0)
+        return item
+
+    def _feed(self, pool, image_paths, decode_q):
+        try:
+            for img_path in image_paths:
+                if not self._put(decode_q, pool.submit(self._load, img_path)): break
+        finally:
+            self._put(decode_q, _DONE)
+
+    # Stage 2
+    def _infer(self, model, decode_q, post_q):
+        try:
+            done = False
+            while not done and not self._stop.is_set():
+                batch = []
+                while len(batch) < self.batch_size:
+                    future = self._get(decode_q)
+                    if future is _DONE:
+                        done = True
+                        break
+                    batch.append(future.result())
+                if not batch: break
+
+                self._predict_batch(model, batch)
+                self.stats.sample()
+                self._put(post_q, batch)
+        except Exception as e:
+            self._error = e
+            self._stop.set()
+        finally:
+            self._put(post_q, _DONE)
+
+    def _predict_batch(self, model, batch):
+        pending = [item for item in batch if item["cached"] is None]
+        if pending:
+            t0 = time.perf_counter()
+            detections = self.predict(model, [item["image"] for item in pending])
+            for item, dets in zip(pending, detections):
+                item["detections"] = dets
+            self.stats["infer"].add(len(pending), time.perf_counter() - t0)
+        self.stats.count("batches")
+
+    # Stage 3
+    def _finish_batch(self, batch, first_id):
+        """Subdistricts, previews and cache writes for one batch -> its rows."""
+        t0 = time.perf_counter()
+        pending = [item for item in batch if item["cached"] is None]
+
+        # --- LOGIKA KECAMATAN ---
+        subdistricts = get_kecamatan_many(self.boundary,
+                                          [item["lon"] for item in pending], [item["lat"] for item in pending])
+        self.stats["geo"].add(len(pending), time.perf_counter() - t0)
+
+        new_entries = []
+        for item, subdistrict in zip(pending, subdistricts):
+            payload = item.pop("detections")
+            payload.update(lon=item["lon"], lat=item["lat"], subdistrict=subdistrict)
+            item["cached"] = payload
+            if self.previews is not None:
+                t1 = time.perf_counter()
+                self.previews.add(item["path"], item["image"],
+                                  payload["labels"], payload["boxes"], payload["confs"])
+                self.stats["previews"].add(1, time.perf_counter() - t1)
+            item["image"] = None
+            if item["key"] is not None:
+                new_entries.append((item["key"], payload))
+        if self.cache is not None:
+            self.cache.put_many(new_entries)
+            self.stats.count("cache_hits", len(batch) - len(pending))
+
+        rows = [make_row(first_id + i, item["path"], item["cached"]) for i, item in enumerate(batch)]
+        self.stats["post"].add(len(rows), time.perf_counter() - t0)
+        return rows
+
+    def _post(self, post_q, out_q, start_id):
+        current_id = start_id
+        try:
+            while True:
+                batch = self._get(post_q)
+                if batch is _DONE: break
+
+                rows = self._finish_batch(batch, current_id)
+                current_id += len(rows)
+                for row_data in rows:
+                    if not self._put(out_q, row_data): break
+        except Exception as e:
+            self._error = e
+            self._stop.set()
+        finally:
+            self._put(out_q, _DONE)
+
+    def run(self, image_paths, start_id=0):
+        """Yields one row dict per image, in input order. Can be called again; the model is loaded once."""
+        if self._model is None:
+            self._model = self.load_model()
+        model = self._model
+        self._stop.clear()
+        self._error = None
+
+        decode_q = queue.Queue(maxsize=self.queue_size)
+        post_q = queue.Queue(maxsize=2)
+        out_q = queue.Queue(maxsize=self.queue_size)
+        for name, q in (("decode", decode_q), ("post", post_q), ("out", out_q)):
+            self.stats.watch_queue(name, q)
+        self.stats.start()
+
+        # Named threads show up as such in py-spy dump / top
+        pool = ThreadPoolExecutor(max_workers=self.prefetch_workers, thread_name_prefix="pipeline-decode")
+        threads = [
+            threading.Thread(target=self._feed, args=(pool, image_paths, decode_q), name="pipeline-feed", daemon=True),
+            threading.Thread(target=self._infer, args=(model, decode_q, post_q), name="pipeline-infer", daemon=True),
+            threading.Thread(target=self._post, args=(post_q, out_q, start_id), name="pipeline-post", daemon=True),
+        ]
+        for t in threads: t.start()
+
+        try:
+            while True:
+                row_data = self._get(out_q)
+                if row_data is _DONE: break
+                yield row_data
+        finally:
+            self._stop.set()
+            for t in threads: t.join()
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        if self._error is not None:
+            raise self._error
+
+    def profile(self, image_paths, out_path="pipeline.prof"):
+        """
+        Runs image_paths through every stage sequentially in the calling
+        thread under cProfile (worker threads are invisible to it) and dumps
+        the profile to out_path (snakeviz / pstats). Returns the rows.
+        """
+        import cProfile
+
+        model = self.load_model()
+        if image_paths:
+            # The first call builds the predictor (imports, warm-up); keep it out of the profile
+            self.predict(model, [cv2.imread(image_paths[0])])
+        self.stats.start()
+        rows = []
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            for i in range(0, len(image_paths), self.batch_size):
+                batch = [self._load(p) for p in image_paths[i:i + self.batch_size]]
+                self._predict_batch(model, batch)
+                rows.extend(self._finish_batch(batch, len(rows)))
+        finally:
+            profiler.disable()
+            profiler.dump_stats(out_path)
+        return rows
+
+    # Queue helpers that give up once the pipeline is stopped, so no stage
+    # can block forever on a full or abandoned queue.
+    def _put(self, q, item):
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if self._stop.is_set(): return False
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set(): return _DONE
@@ -0,0 +1,162 @@
+import argparse
+import csv
+import io
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from config import PREFETCH_WORKERS
+
+GPS_IFD_TAG = 0x8825
+EXIF_IFD_TAG = 0x8769
+DATETIME_ORIGINAL_TAG = 0x9003
+GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE = 1, 2, 3, 4
+
+# TIFF type -> (struct code, size in bytes)
+TIFF_TYPES = {1: ("B", 1), 2: ("c", 1), 3: ("H", 2), 4: ("L", 4), 5: ("LL", 8), 7: ("B", 1), 9: ("l", 4), 10: ("ll", 8)}
+
+
+# --- JPEG APP1 ---
+def read_app1(file_path):
+    """
+    Returns the raw TIFF block of the Exif APP1 segment, reading only the
+    JPEG headers (markers are walked with seeks; pixel data is never read).
+    Accepts a path or an open binary file object.
+    """
+    if hasattr(file_path, "read"):
+        return _read_app1(file_path)
+    with open(file_path, "rb") as f:
+        return _read_app1(f)
+
+
+def _read_app1(f):
+    if f.read(2) != b"\xff\xd8": return None
+    while True:
+        header = f.read(4)
+        if len(header) < 4 or header[0] != 0xFF: return None
+        marker = header[1]
+        if marker in (0xDA, 0xD9): return None  # start of scan / end of image
+        length = struct.unpack(">H", header[2:])[0]
+        if marker == 0xE1:
+            payload = f.read(length - 2)
+            if payload[:6] == b"Exif\x00\x00": return payload[6:]
+        else:
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+# --- TIFF / IFD ---
+def read_ifd(tiff, offset, endian):
+    """tag -> decoded value for one IFD. Rationals become floats."""
+    entries = {}
+    if offset + 2 > len(tiff): return entries
+    count = struct.unpack_from(endian + "H", tiff, offset)[0]
+    for i in range(count):
+        pos = offset + 2 + i * 12
+        if pos + 12 > len(tiff): break
+        tag, typ, n = struct.unpack_from(endian + "HHL", tiff, pos)
+        if typ not in TIFF_TYPES: continue
+        code, size = TIFF_TYPES[typ]
+        data_pos = pos + 8 if size * n <= 4 else struct.unpack_from(endian + "L", tiff, pos + 8)[0]
+        if data_pos + size * n > len(tiff): continue
+
+        if typ == 2:
+            entries[tag] = tiff[data_pos:data_pos + n].split(b"\x00", 1)[0].decode("ascii", errors="ignore")
+        elif typ in (5, 10):
+            raw = struct.unpack_from(endian + code * n, tiff, data_pos)
+            entries[tag] = [num / den if den else 0.0 for num, den in zip(raw[0::2], raw[1::2])]
+        else:
+            values = struct.unpack_from(endian + code * n, tiff, data_pos)
+            entries[tag] = values[0] if n == 1 else list(values)
+    return entries
+
+
+def parse_tiff(tiff):
+    """(endian, IFD0 entries) of an Exif TIFF block."""
+    if tiff is None or len(tiff) < 8: return None, {}
+    endian = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if endian is None: return None, {}
+    return endian, read_ifd(tiff, struct.unpack_from(endian + "L", tiff, 4)[0], endian)
+
+
+def get_decimal_from_dms(dms, ref):
+    result = dms[0] + dms[1] / 60.0 + dms[2] / 3600.0
+    if ref in ['S', 'W']:
+        result = -result
+    return result
+
+
+def _coordinates_from_gps(gps):
+    if all(k in gps for k in (GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE)):
+        lat = get_decimal_from_dms(gps[GPS_LATITUDE], gps[GPS_LATITUDE_REF])
+        lon = get_decimal_from_dms(gps[GPS_LONGITUDE], gps[GPS_LONGITUDE_REF])
+        return round(lon, 6), round(lat, 6)
+    return 0.0, 0.0
+
+
+def _pil_gps(file_path):
+    # Non-JPEG inputs (PNG eXIf, HEIC via plugins...)
+    from PIL import Image
+
+    with Image.open(file_path) as image:
+        gps = image.getexif().get_ifd(GPS_IFD_TAG)
+    return {k: [float(x) for x in v] if isinstance(v, tuple) else v for k, v in gps.items()}
+
+
+# --- PUBLIC API ---
+def get_coordinates(file_path):
+    """(lon, lat) in decimal degrees, or (0.0, 0.0) when the image has no GPS tags."""
+    try:
+        tiff = read_app1(file_path)
+        if tiff is None:
+            if file_path.lower().endswith((".jpg", ".jpeg")): return 0.0, 0.0
+            return _coordinates_from_gps(_pil_gps(file_path))
+        endian, ifd0 = parse_tiff(tiff)
+        if GPS_IFD_TAG not in ifd0: return 0.0, 0.0
+        return _coordinates_from_gps(read_ifd(tiff, ifd0[GPS_IFD_TAG], endian))
+    except Exception:
+        return 0.0, 0.0
+
+
+def get_coordinates_from_bytes(data):
+    """get_coordinates for an in-memory JPEG (e.g. an HTTP upload)."""
+    try:
+        tiff = read_app1(io.BytesIO(data))
+        endian, ifd0 = parse_tiff(tiff)
+        if GPS_IFD_TAG not in ifd0: return 0.0, 0.0
+        return _coordinates_from_gps(read_ifd(tiff, ifd0[GPS_IFD_TAG], endian))
+    except Exception:
+        return 0.0, 0.0
+
+
+def get_datetime_original(file_path):
+    """EXIF DateTimeOriginal string ('YYYY:MM:DD HH:MM:SS') or None."""
+    try:
+        tiff = read_app1(file_path)
+        endian, ifd0 = parse_tiff(tiff)
+        if EXIF_IFD_TAG not in ifd0: return None
+        return read_ifd(tiff, ifd0[EXIF_IFD_TAG], endian).get(DATETIME_ORIGINAL_TAG)
+    except Exception:
+        return None
+
+
+def batch_coordinates(file_paths, workers=PREFETCH_WORKERS):
+    """get_coordinates for many files in parallel (I/O bound), in input order."""
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(get_coordinates, file_paths))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract GPS coordinates from image EXIF headers")
+    parser.add_argument("dir", type=str, help="Directory with images (searched recursively)")
+    parser.add_argument("--out", type=str, default="coordinates.csv", help="Output CSV")
+    parser.add_argument("--workers", type=int, default=16, help="Parallel reader threads")
+    args = parser.parse_args()
+
+    paths = sorted(os.path.join(root, f) for root, _, files in os.walk(args.dir) for f in files
+                   if f.lower().endswith((".png", ".jpg", ".jpeg")))
+    coords = batch_coordinates(paths, args.workers)
+    with open(args.out, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["path", "longitude", "latitude"])
+        writer.writerows((p, lon, lat) for p, (lon, lat) in zip(paths, coords))
+    print(f"{sum(1 for c in coords if c != (0.0, 0.0))}/{len(paths)} images geotagged -> {args.out}")
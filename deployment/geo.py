@@ -0,0 +1,178 @@
+import argparse
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+from config import KECAMATAN_COLUMN, MAP_FILE_PATH, MAP_CACHE_DIR
+from utils import file_digest
+
+CACHE_FORMAT = 1
+SHAPEFILE_PARTS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+UNKNOWN = "Unknown"
+OUTSIDE = "Outside Area"
+ERROR = "Error"
+
+
+# --- SPATIAL INDEX ---
+class BoundaryIndex:
+    """
+    STRtree over the (prepared) kelurahan polygons. A point resolves to the
+    first polygon in layer order that contains it, which is what the old
+    `gdf_map[gdf_map.contains(point)].iloc[0]` scan returned.
+    """
+
+    def __init__(self, geometries, names, version=None):
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.names = np.asarray(names, dtype=object)
+        self.version = version
+        shapely.prepare(self.geometries)
+        self.tree = STRtree(self.geometries)
+
+    @classmethod
+    def from_gdf(cls, gdf, column=KECAMATAN_COLUMN, version=None):
+        return cls(np.asarray(gdf.geometry.values, dtype=object), gdf[column].to_numpy(dtype=object), version)
+
+    # Pickled as packed WKB + names; the tree is rebuilt on load, which takes
+    # milliseconds compared to parsing and reprojecting the shapefile.
+    def __getstate__(self):
+        return {"wkb": shapely.to_wkb(self.geometries), "names": self.names, "version": self.version}
+
+    def __setstate__(self, state):
+        self.__init__(shapely.from_wkb(state["wkb"]), state["names"], state["version"])
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def lookup(self, lon, lat):
+        return self.lookup_many([lon], [lat])[0]
+
+    def lookup_many(self, lons, lats):
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        out = np.full(len(lons), UNKNOWN, dtype=object)
+
+        valid = (lons != 0.0) & np.isfinite(lons) & np.isfinite(lats)
+        if not valid.any(): return out.tolist()
+
+        valid_idx = np.flatnonzero(valid)
+        out[valid_idx] = OUTSIDE
+        points = shapely.points(lons[valid_idx], lats[valid_idx])
+        point_idx, poly_idx = self.tree.query(points, predicate="within")
+
+        if len(point_idx):
+            # Keep the lowest polygon index per point (layer order)
+            order = np.lexsort((poly_idx, point_idx))
+            point_idx, poly_idx = point_idx[order], poly_idx[order]
+            first = np.unique(point_idx, return_index=True)[1]
+            out[valid_idx[point_idx[first]]] = self.names[poly_idx[first]]
+        return out.tolist()
+
+
+# --- SUBDISTRICT ---
+def get_kecamatan(boundary, lon, lat):
+    return get_kecamatan_many(boundary, [lon], [lat])[0]
+
+
+def get_kecamatan_many(boundary, lons, lats):
+    if boundary is None: return [UNKNOWN] * len(lons)
+    try:
+        return boundary.lookup_many(lons, lats)
+    except Exception:
+        return [ERROR] * len(lons)
+
+
+# --- COMPILED MAP CACHE ---
+def _source_parts(shp_path):
+    parts = [os.path.splitext(shp_path)[0] + ext for ext in SHAPEFILE_PARTS]
+    return [p for p in parts if os.path.exists(p)]
+
+
+def source_stamp(shp_path):
+    return {os.path.basename(p): (os.stat(p).st_mtime_ns, os.stat(p).st_size) for p in _source_parts(shp_path)}
+
+
+def source_hash(shp_path):
+    digests = "".join(file_digest(p) for p in _source_parts(shp_path))
+    return hashlib.sha1(digests.encode()).hexdigest()[:16]
+
+
+def default_cache_path(shp_path, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(shp_path), os.path.basename(MAP_CACHE_DIR))
+    stem = os.path.splitext(os.path.basename(shp_path))[0]
+    return os.path.join(cache_dir, f"{stem}.boundary.pkl")
+
+
+def read_boundary_layer(shp_path, column=KECAMATAN_COLUMN):
+    """GeoDataFrame with only the subdistrict column, in EPSG:4326."""
+    import geopandas as gpd
+
+    gdf = gpd.read_file(shp_path, columns=[column])
+    if gdf.crs != "EPSG:4326":
+        gdf = gdf.to_crs("EPSG:4326")
+    return gdf
+
+
+def compile_boundary_map(shp_path, cache_path=None, column=KECAMATAN_COLUMN):
+    """Shapefile -> geometry + WADMKC only, EPSG:4326, pickled BoundaryIndex."""
+    cache_path = cache_path or default_cache_path(shp_path)
+    gdf = read_boundary_layer(shp_path, column)
+
+    boundary = BoundaryIndex.from_gdf(gdf, column, version=source_hash(shp_path))
+    _write_cache(cache_path, shp_path, boundary)
+    return boundary
+
+
+def _write_cache(cache_path, shp_path, boundary):
+    header = {"format": CACHE_FORMAT, "stamp": source_stamp(shp_path), "hash": boundary.version}
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(boundary, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+
+def load_boundary_map(shp_path, cache_path=None):
+    """
+    Returns the BoundaryIndex for `shp_path`, compiling it on first use. The
+    cache is reused while the shapefile's mtime/size are unchanged, or, if
+    they changed, while its content hash still matches; the cache then gets
+    the new stamp so later launches skip the hash again.
+    """
+    cache_path = cache_path or default_cache_path(shp_path)
+    refresh = False
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                header = pickle.load(f)
+                if header.get("format") == CACHE_FORMAT:
+                    if header["stamp"] == source_stamp(shp_path):
+                        return pickle.load(f)
+                    if header["hash"] == source_hash(shp_path):  # touched / copied, same content
+                        boundary = pickle.load(f)
+                        refresh = True
+        except Exception as e:
+            print(f"Warning: ignoring unreadable map cache {cache_path}: {e}")
+        if refresh:
+            try:
+                _write_cache(cache_path, shp_path, boundary)
+            except OSError as e:
+                print(f"Warning: could not update map cache {cache_path}: {e}")
+            return boundary
+    return compile_boundary_map(shp_path, cache_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the BPS boundary shapefile into a fast-loading cache.")
+    parser.add_argument("--map", type=str, default=MAP_FILE_PATH, help="Path to the boundary shapefile")
+    parser.add_argument("--out", type=str, default=None, help="Cache file (default: map/.cache/<name>.boundary.pkl)")
+    args = parser.parse_args()
+
+    boundary = compile_boundary_map(args.map, args.out)
+    print(f"Compiled {len(boundary)} polygons -> {args.out or default_cache_path(args.map)}")
@@ -0,0 +1,90 @@
+import glob
+import json
+import os
+import time
+import uuid
+
+from config import CLASSES
+
+JOURNAL_FIELDS = ["id", "path", "name", "lon", "lat", "subdistrict", "labels", "boxes", "confs"] + CLASSES
+
+
+# --- RUN JOURNAL ---
+class RunJournal:
+    """
+    Append-only JSONL log of one inference run: a header with the full list
+    of input paths, one line per finished row, and a "done" marker. A journal
+    without the marker belongs to a crashed or cancelled run and can be
+    resumed: its rows are restored and only the remaining paths are re-run.
+    """
+
+    def __init__(self, path, paths, rows=None):
+        self.path = path
+        self.paths = paths
+        self.rows = rows or []
+        self.done_paths = {row["path"] for row in self.rows}
+
+    @classmethod
+    def create(cls, journal_dir, paths):
+        os.makedirs(journal_dir, exist_ok=True)
+        run_id = time.strftime("%Y%m%d_%H%M%S") + "_" + uuid.uuid4().hex[:6]
+        journal = cls(os.path.join(journal_dir, f"run_{run_id}.jsonl"), list(paths))
+        journal._write([{"type": "run", "run_id": run_id, "started": time.time(), "paths": journal.paths}])
+        return journal
+
+    @classmethod
+    def load(cls, path):
+        paths, rows = [], []
+        good_bytes = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+                good_bytes += len(line)
+                if record["type"] == "run":
+                    paths = record["paths"]
+                elif record["type"] == "row":
+                    rows.append(record["row"])
+        if good_bytes < os.path.getsize(path):
+            # Drop a line torn by a crash so appends start on a clean line
+            with open(path, "r+b") as f:
+                f.truncate(good_bytes)
+        return cls(path, paths, rows)
+
+    @property
+    def remaining_paths(self):
+        return [p for p in self.paths if p not in self.done_paths]
+
+    def _write(self, records):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append(self, rows):
+        if not rows: return
+        self.done_paths.update(row["path"] for row in rows)
+        self._write([{"type": "row", "row": {k: row[k] for k in JOURNAL_FIELDS}} for row in rows])
+
+    def finish(self, keep=False):
+        self._write([{"type": "done", "finished": time.time()}])
+        if not keep: os.remove(self.path)
+
+    def discard(self):
+        if os.path.exists(self.path): os.remove(self.path)
+
+
+def find_incomplete(journal_dir):
+    """Journals (newest first) whose run never reached the done marker."""
+    incomplete = []
+    for path in sorted(glob.glob(os.path.join(journal_dir, "run_*.jsonl")), reverse=True):
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 256))
+            tail = f.read().decode("utf-8", errors="ignore")
+        if '"type":"done"' not in tail:
+            incomplete.append(path)
+    return incomplete
@@ -0,0 +1,173 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+
+from config import (BACKEND, BATCH_SIZE, PROCESS_WORKERS, PREVIEW_SIZE, TILE_SIZE, TILE_OVERLAP, TILE_MERGE,
+                    TILE_FULL_PASS)
+from engine import InferencePipeline, resolve_weights
+from stats import PipelineStats
+
+WORKER_STAGES = ("decode", "exif", "infer", "post", "geo", "previews")
+
+# Per-process state, set once by _init_worker
+_worker = {}
+
+
+# --- WORKER PROCESS ---
+class _PreviewCollector:
+    """Stands in for PreviewCache inside a worker: previews are rendered there and shipped back as JPEG."""
+
+    def __init__(self, size):
+        self.size = size
+        self.items = []
+
+    def add(self, path, image, labels, boxes, confs):
+        from previews import make_previews
+
+        original, annotated = make_previews(image, labels, boxes, confs, self.size)
+        self.items.append((path, cv2.imencode(".jpg", original)[1], cv2.imencode(".jpg", annotated)[1]))
+
+
+def _init_worker(config, boundary, threads):
+    import torch
+
+    # Each process gets its own slice of the cores instead of all of them
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(1)
+
+    cache = None
+    if config["cache_path"]:
+        from result_cache import ResultCache
+        cache = ResultCache(config["cache_path"])
+    collector = _PreviewCollector(config["preview_size"]) if config["previews"] else None
+    pipeline = InferencePipeline(config["model_path"], boundary, batch_size=config["batch_size"],
+                                 device=config["device"], cache=cache, previews=collector,
+                                 backend=config["backend"], tile_size=config["tile_size"],
+                                 tile_overlap=config["tile_overlap"], tile_merge=config["tile_merge"],
+                                 tile_full_pass=config["tile_full_pass"])
+    _worker.update(pipeline=pipeline, model=pipeline.load_model(), collector=collector)
+
+
+def _run_shard(image_paths, first_id):
+    """One model batch: decode + EXIF, inference, subdistricts -> (rows, previews, stage totals, counters)."""
+    pipeline, collector = _worker["pipeline"], _worker["collector"]
+    pipeline.stats = PipelineStats(WORKER_STAGES, counters=("batches", "cache_hits"))
+    if collector is not None: collector.items = []
+
+    batch = [pipeline._load(p) for p in image_paths]
+    pipeline._predict_batch(_worker["model"], batch)
+    rows = pipeline._finish_batch(batch, first_id)
+
+    totals = {name: (s.items, s.busy) for name, s in pipeline.stats.stages.items() if s.items}
+    return rows, collector.items if collector is not None else [], totals, dict(pipeline.stats.counters)
+
+
+# --- PROCESS POOL PIPELINE ---
+class ProcessPipeline:
+    """
+    Drop-in for InferencePipeline that shards images over worker processes,
+    one model batch per shard. Every worker loads the model once and gets
+    cpu_count // processes torch threads, so EXIF, shapely and the model
+    no longer share one GIL; rows are yielded in input order. The workers
+    (with their loaded models) are kept across run() calls until close().
+    """
+
+    def __init__(self, model_path, boundary=None, processes=PROCESS_WORKERS, threads_per_process=None,
+                 batch_size=BATCH_SIZE, device=None, cache=None, previews=None, backend=BACKEND,
+                 tile_size=TILE_SIZE, tile_overlap=TILE_OVERLAP, tile_merge=TILE_MERGE,
+                 tile_full_pass=TILE_FULL_PASS):
+        resolve_weights(model_path, backend)  # fail here, not in every worker
+        self.boundary = boundary
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self.threads_per_process = threads_per_process or max(1, (os.cpu_count() or 1) // self.processes)
+        self.batch_size = max(1, batch_size)
+        self.cache = cache
+        self.previews = previews
+        self.config = {
+            "model_path": model_path, "backend": backend, "batch_size": self.batch_size, "device": device,
+            "cache_path": getattr(cache, "path", None), "previews": previews is not None,
+            "preview_size": getattr(previews, "size", PREVIEW_SIZE), "tile_size": tile_size,
+            "tile_overlap": tile_overlap, "tile_merge": tile_merge, "tile_full_pass": tile_full_pass,
+        }
+        self.stats = PipelineStats(WORKER_STAGES + ("shard",), counters=("batches", "cache_hits"),
+                                   output_stage="shard")
+        self._stop = threading.Event()
+        self._executor = None
+
+    def stop(self):
+        """Ends the current run() after the shard being collected; the workers stay up for the next run."""
+        self._stop.set()
+
+    def close(self):
+        self._stop.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn: fork is unsafe with torch / Qt threads and unavailable on Windows. Workers start on
+            # demand, so a small run does not spawn (and load the model in) more processes than it has shards.
+            self._executor = ProcessPoolExecutor(max_workers=self.processes,
+                                                 mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker,
+                                                 initargs=(self.config, self.boundary, self.threads_per_process))
+        return self._executor
+
+    @property
+    def throughput(self):
+        return self.stats.throughput
+
+    def summary(self):
+        text = f"{self.processes} proc x {self.threads_per_process} thr | " + " | ".join(
+            str(self.stats[name]) for name in ("decode", "infer", "post"))
+        if self.cache is not None:
+            text += f" | cache hits: {self.stats.counters['cache_hits']}"
+        return text + f" | total: {self.throughput:.1f} img/s"
+
+    def _collect(self, result, seconds):
+        rows, previews, totals, counters = result
+        for name, (items, busy) in totals.items():
+            self.stats[name].add(items, busy)
+        for name, n in counters.items():
+            self.stats.count(name, n)
+        self.stats["shard"].add(len(rows), seconds)
+        if self.previews is not None:
+            for path, original, annotated in previews:
+                self.previews.put(path, cv2.imdecode(np.asarray(original), cv2.IMREAD_COLOR),
+                                  cv2.imdecode(np.asarray(annotated), cv2.IMREAD_COLOR))
+        return rows
+
+    def run(self, image_paths, start_id=0):
+        """Yields one row dict per image, in input order. Can be called again on the same workers."""
+        shards = [image_paths[i:i + self.batch_size] for i in range(0, len(image_paths), self.batch_size)]
+        max_in_flight = self.processes * 2
+        self._stop.clear()
+        executor = self._pool()
+        self.stats.start()
+        in_flight = []
+        next_shard = 0
+        try:
+            while (in_flight or next_shard < len(shards)) and not self._stop.is_set():
+                while next_shard < len(shards) and len(in_flight) < max_in_flight:
+                    first_id = start_id + next_shard * self.batch_size
+                    in_flight.append((executor.submit(_run_shard, shards[next_shard], first_id), time.perf_counter()))
+                    next_shard += 1
+                future, submitted = in_flight.pop(0)
+                rows = self._collect(future.result(), time.perf_counter() - submitted)
+                self.stats.sample()
+                for row_data in rows:
+                    yield row_data
+        except BrokenProcessPool:
+            self._executor = None  # a worker died (e.g. out of memory); the next run starts a fresh pool
+            raise
+        finally:
+            # Stopped or abandoned: drop the shards not started yet, let running ones finish in the background
+            for future, _ in in_flight:
+                future.cancel()
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import cv2
+
+from config import PREVIEW_SIZE, PREVIEW_CACHE_MB
+from engine import render_detections
+
+
+def make_previews(image, labels, boxes, confs, size=PREVIEW_SIZE):
+    """Downscales to fit `size` first, then draws the (scaled) boxes on the small image."""
+    height, width = image.shape[:2]
+    scale = min(size[0] / width, size[1] / height, 1.0)
+    if scale < 1.0:
+        image = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    scaled_boxes = [[v * scale for v in box] for box in boxes]
+    return image, render_detections(image, labels, scaled_boxes, confs)
+
+
+# --- PREVIEW CACHE ---
+class PreviewCache:
+    """
+    (original, annotated) display-size previews per image. Kept in a
+    size-bounded LRU in memory; entries pushed out of memory are spilled
+    as JPEGs to a session temp dir, so memory stays flat however many rows
+    the table holds.
+    """
+
+    def __init__(self, max_bytes=PREVIEW_CACHE_MB * 1024 * 1024, size=PREVIEW_SIZE, spill_dir=None):
+        self.max_bytes = max_bytes
+        self.size = size
+        self._own_dir = spill_dir is None
+        self.spill_dir = spill_dir or tempfile.mkdtemp(prefix="provider_previews_")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Spill files are written, read and deleted by different threads; the memory LRU does not wait on disk
+        self._spill_lock = threading.Lock()
+
+    def _spill_paths(self, path):
+        key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+        return (os.path.join(self.spill_dir, f"{key}_orig.jpg"),
+                os.path.join(self.spill_dir, f"{key}_pred.jpg"))
+
+    def put(self, path, original, annotated):
+        nbytes = original.nbytes + annotated.nbytes
+        with self._lock:
+            if path in self._entries:
+                self._bytes -= sum(im.nbytes for im in self._entries.pop(path))
+            self._entries[path] = (original, annotated)
+            self._bytes += nbytes
+            evicted = []
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old_path, old_entry = self._entries.popitem(last=False)
+                self._bytes -= sum(im.nbytes for im in old_entry)
+                evicted.append((old_path, old_entry))
+        with self._spill_lock:
+            for old_path, (old_orig, old_pred) in evicted:
+                orig_file, pred_file = self._spill_paths(old_path)
+                cv2.imwrite(orig_file, old_orig)
+                cv2.imwrite(pred_file, old_pred)
+
+    def _read_spill(self, path):
+        """Spilled (original, annotated), or None if missing or unreadable (then it is rendered again)."""
+        with self._spill_lock:
+            entry = tuple(cv2.imread(f) if os.path.exists(f) else None for f in self._spill_paths(path))
+        return entry if all(im is not None for im in entry) else None
+
+    def add(self, path, image, labels, boxes, confs):
+        self.put(path, *make_previews(image, labels, boxes, confs, self.size))
+
+    def get(self, row_data):
+        """Returns (original, annotated) BGR previews, rendering them on a miss."""
+        path = row_data["path"]
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+                return self._entries[path]
+
+        entry = self._read_spill(path)
+        if entry is None:
+            image = cv2.imread(path)
+            if image is None: return None
+            entry = make_previews(image, row_data["labels"], row_data["boxes"], row_data["confs"], self.size)
+        self.put(path, *entry)
+        return entry
+
+    def discard(self, path):
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._bytes -= sum(im.nbytes for im in entry)
+        with self._spill_lock:
+            for spill_file in self._spill_paths(path):
+                if os.path.exists(spill_file): os.remove(spill_file)
+
+    def close(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self._own_dir:
+            with self._spill_lock:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
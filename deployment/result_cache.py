@@ -0,0 +1,100 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import RESULT_CACHE_MAX_MB
+
+
+# --- PERSISTENT RESULT CACHE ---
+class ResultCache:
+    """
+    Per-image inference results keyed by (image content hash, model weights
+    hash, boundary map version). Swapping best.pt or the shapefile changes the
+    key, so only entries produced by the old model/map stop matching; they are
+    evicted oldest-first once the cache grows past `max_bytes`.
+    """
+
+    def __init__(self, path, max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Generous busy timeout: process-pool workers share the file
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                content_hash TEXT NOT NULL,
+                model_hash TEXT NOT NULL,
+                map_hash TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (content_hash, model_hash, map_hash)
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_used ON results(last_used)")
+        self._conn.commit()
+        # Running byte total, so put_many does not scan the table; re-summed only when eviction looks due
+        # (process-pool workers write to the same file, so this connection's total can lag behind)
+        self._total = self._sum_sizes()
+
+    def _sum_sizes(self):
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def get(self, content_hash, model_hash, map_hash):
+        key = (content_hash, model_hash, map_hash)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM results WHERE content_hash=? AND model_hash=? AND map_hash=?", key
+            ).fetchone()
+            if row is None: return None
+            self._conn.execute(
+                "UPDATE results SET last_used=? WHERE content_hash=? AND model_hash=? AND map_hash=?",
+                (time.time(),) + key)
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put_many(self, entries):
+        """entries: iterable of ((content_hash, model_hash, map_hash), payload dict)"""
+        now = time.time()
+        rows = {}  # last payload per key wins, as with INSERT OR REPLACE
+        for key, payload in entries:
+            blob = json.dumps(payload, separators=(",", ":"))
+            rows[tuple(key)] = tuple(key) + (blob, len(blob), now)
+        rows = list(rows.values())
+        if not rows: return
+        with self._lock:
+            for row in rows:
+                old = self._conn.execute(
+                    "SELECT size FROM results WHERE content_hash=? AND model_hash=? AND map_hash=?", row[:3]
+                ).fetchone()
+                self._total += row[4] - (old[0] if old else 0)
+            self._conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)", rows)
+            if self._total > self.max_bytes: self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        self._total = self._sum_sizes()
+        if self._total <= self.max_bytes: return
+        excess = self._total - self.max_bytes
+        freed = 0
+        stale = []
+        for content_hash, model_hash, map_hash, size in self._conn.execute(
+                "SELECT content_hash, model_hash, map_hash, size FROM results ORDER BY last_used"):
+            stale.append((content_hash, model_hash, map_hash))
+            freed += size
+            if freed >= excess: break
+        self._conn.executemany(
+            "DELETE FROM results WHERE content_hash=? AND model_hash=? AND map_hash=?", stale)
+        self._total -= freed
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,289 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import CLASSES, RESULTS_DB_PATH, EXPORT_CHUNK_ROWS
+from writers import EXPORT_COLUMNS, ChunkWriter, write_gpkg
+
+CLASS_IDS = {cls.lower(): i for i, cls in enumerate(CLASSES)}
+DETECTION_COLUMNS = ["id", "image_name", "path", "longitude", "latitude", "subdistrict",
+                     "class", "confidence", "x1", "y1", "x2", "y2"]
+
+
+def pack_boxes(row_data):
+    """(class_mask, n_boxes, class_ids, confs, boxes) of a pipeline row; the arrays as little-endian bytes."""
+    keep = [i for i, label in enumerate(row_data["labels"]) if label.lower() in CLASS_IDS]
+    class_ids = np.array([CLASS_IDS[row_data["labels"][i].lower()] for i in keep], dtype=np.uint8)
+    confs = np.array([row_data["confs"][i] for i in keep], dtype="<f4")
+    boxes = np.array([row_data["boxes"][i] for i in keep], dtype="<f4").reshape(-1, 4)
+    class_mask = int(np.bitwise_or.reduce(np.left_shift(1, class_ids.astype(np.int64)), initial=0))
+    return class_mask, len(keep), class_ids.tobytes(), confs.tobytes(), boxes.tobytes()
+
+
+# --- RESULTS STORE ---
+class ResultsDB:
+    """
+    Every processed image (path, location, subdistrict) with all of its boxes
+    and the analyst's checkbox overrides, one SQLite row per image. Boxes are
+    stored column-wise per image (class ids, confidences, xyxy as packed
+    arrays) next to a bitmask of the detected classes, so exports decode whole
+    chunks with np.frombuffer instead of building a Python object per value.
+    An image's class flag is its override when there is one, else whether any
+    box of that class was detected. Re-adding a path replaces its boxes and
+    drops only the overrides of classes whose detection changed, so re-runs
+    never duplicate an image nor lose edits the new result does not contradict.
+    """
+
+    def __init__(self, path=RESULTS_DB_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        # Written by the inference thread, read by the UI thread
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS images (
+                image_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL UNIQUE,
+                name TEXT NOT NULL,
+                lon REAL,
+                lat REAL,
+                subdistrict TEXT,
+                added REAL NOT NULL,
+                seq INTEGER NOT NULL DEFAULT 0,
+                class_mask INTEGER NOT NULL,
+                n_boxes INTEGER NOT NULL,
+                class_ids BLOB NOT NULL,
+                confs BLOB NOT NULL,
+                boxes BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_images_subdistrict ON images(subdistrict);
+            CREATE TABLE IF NOT EXISTS overrides (
+                image_id INTEGER NOT NULL,
+                class_id INTEGER NOT NULL,
+                value INTEGER NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (image_id, class_id)
+            ) WITHOUT ROWID;
+        """)
+        if "seq" not in [col[1] for col in self._conn.execute("PRAGMA table_info(images)")]:
+            self._conn.execute("ALTER TABLE images ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")  # older stores
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_images_seq ON images(seq)")
+        self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # Writes
+    def add_rows(self, rows):
+        """
+        Stores pipeline rows in one transaction and sets row["image_id"] on
+        each. A re-added image keeps the analyst's overrides of classes whose
+        detection result did not change (those are also applied to the row's
+        flags); overrides of classes that changed are dropped. All rows of
+        the call get the next write sequence number (row["seq"]), in commit
+        order across every process writing to the store.
+        """
+        if not rows: return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")  # hold the write lock, so seq follows commit order
+            seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM images").fetchone()[0]
+            for row_data in rows:
+                packed = pack_boxes(row_data)
+                old = self._conn.execute("SELECT image_id, class_mask FROM images WHERE path=?",
+                                         (row_data["path"],)).fetchone()
+                row_data["image_id"] = self._conn.execute(
+                    "INSERT INTO images (path, name, lon, lat, subdistrict, added, seq, class_mask, n_boxes, "
+                    "class_ids, confs, boxes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE "
+                    "SET name=excluded.name, lon=excluded.lon, lat=excluded.lat, subdistrict=excluded.subdistrict, "
+                    "added=excluded.added, seq=excluded.seq, class_mask=excluded.class_mask, "
+                    "n_boxes=excluded.n_boxes, class_ids=excluded.class_ids, confs=excluded.confs, "
+                    "boxes=excluded.boxes RETURNING image_id",
+                    (row_data["path"], row_data["name"], row_data["lon"], row_data["lat"], row_data["subdistrict"],
+                     now, seq) + packed).fetchone()[0]
+                row_data["seq"] = seq
+                if old is None: continue
+                changed = old[1] ^ packed[0]
+                overrides = self._conn.execute("SELECT class_id, value FROM overrides WHERE image_id=?",
+                                               (old[0],)).fetchall()
+                for class_id, value in overrides:
+                    if changed >> class_id & 1:
+                        self._conn.execute("DELETE FROM overrides WHERE image_id=? AND class_id=?", (old[0], class_id))
+                    else:
+                        row_data[CLASSES[class_id]] = bool(value)
+
+    def set_override(self, image_id, cls, value):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO overrides VALUES (?, ?, ?, ?)",
+                               (image_id, CLASSES.index(cls), int(bool(value)), time.time()))
+
+    def remove(self, image_ids):
+        ids = [(int(i),) for i in image_ids]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM overrides WHERE image_id=?", ids)
+            self._conn.executemany("DELETE FROM images WHERE image_id=?", ids)
+
+    # Reads
+    def _query(self, sql, params=()):
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def last_seq(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM images").fetchone()[0]
+
+    def chunks(self, chunk_rows=EXPORT_CHUNK_ROWS, boxes=True, since_seq=None):
+        """
+        (images, detections, flags) for consecutive image-id ranges:
+        detections holds the decoded boxes (`image` = row in images), flags
+        the (n, n_classes) class flags with the overrides applied. With
+        `since_seq`, only images written after that sequence number.
+        """
+        columns = "image_id, path, name, lon, lat, subdistrict, seq, class_mask"
+        if boxes: columns += ", n_boxes, class_ids, confs, boxes"
+        where = "image_id > ?" if since_seq is None else f"image_id > ? AND seq > {int(since_seq)}"
+        last_id = -1
+        while True:
+            images = self._query(f"SELECT {columns} FROM images WHERE {where} ORDER BY image_id LIMIT ?",
+                                 (last_id, chunk_rows))
+            if images.empty: return
+            first_id, last_id = int(images["image_id"].iloc[0]), int(images["image_id"].iloc[-1])
+            overrides = self._query("SELECT image_id, class_id, value FROM overrides WHERE image_id BETWEEN ? AND ?",
+                                    (first_id, last_id))
+            detections = unpack_boxes(images) if boxes else None
+            yield images, detections, class_flags(images, overrides)
+
+    def load_rows(self, since_seq=None):
+        """Every stored image (or those written after `since_seq`) as a pipeline-style row, boxes included."""
+        rows = []
+        for images, detections, flags in self.chunks(since_seq=since_seq):
+            bounds = np.cumsum(images["n_boxes"].to_numpy())
+            labels = np.array(CLASSES, dtype=object)[detections["class_id"]].tolist()
+            confs = detections["conf"].astype(float).round(4).tolist()
+            boxes = detections["xyxy"].astype(float).round(1).tolist()
+            flag_rows = flags.tolist()
+            start = 0
+            for i, image in enumerate(images.itertuples(index=False)):
+                end = bounds[i]
+                row_data = {"image_id": image.image_id, "path": image.path, "name": image.name,
+                            "lon": image.lon, "lat": image.lat, "subdistrict": image.subdistrict, "seq": image.seq,
+                            "labels": labels[start:end], "boxes": boxes[start:end], "confs": confs[start:end]}
+                row_data.update(zip(CLASSES, flag_rows[i]))
+                rows.append(row_data)
+                start = end
+        return rows
+
+    # Export
+    def export(self, path, level="images", chunk_rows=EXPORT_CHUNK_ROWS):
+        """
+        Streams the store to .csv / .parquet / .gpkg, one chunk of images at a
+        time: one row per image with the class flags ("images") or one row
+        per box ("detections"). Returns the number of rows written.
+        """
+        tmp_path = path + ".tmp" + os.path.splitext(path)[1]
+        written = [0]
+
+        def frames():
+            next_id = 0
+            for images, detections, flags in self.chunks(chunk_rows, boxes=level != "images"):
+                if level == "images":
+                    df = image_frame(images, flags, next_id)
+                else:
+                    df = detection_frame(images, detections, next_id)
+                next_id += len(images)
+                if len(df):
+                    written[0] += len(df)
+                    yield df
+            if not written[0]:  # empty store: header / schema only
+                yield pd.DataFrame(columns=EXPORT_COLUMNS if level == "images" else DETECTION_COLUMNS)
+
+        if tmp_path.lower().endswith(".gpkg"):
+            write_gpkg(tmp_path, frames())
+        else:
+            writer = ChunkWriter(tmp_path)
+            try:
+                for df in frames():
+                    writer.write(df)
+            finally:
+                writer.close()
+        os.replace(tmp_path, path)
+        return written[0]
+
+
+# --- VECTORIZED FRAMES ---
+def class_flags(images, overrides):
+    """(n_images, n_classes) bool: the detected-class bitmask, then overrides on top."""
+    masks = images["class_mask"].to_numpy(dtype=np.int64)
+    flags = ((masks[:, None] >> np.arange(len(CLASSES))) & 1).astype(bool)
+    image_ids = images["image_id"].to_numpy(dtype=np.int64)
+    override_ids = overrides["image_id"].to_numpy(dtype=np.int64)
+    rows = np.minimum(np.searchsorted(image_ids, override_ids), max(len(image_ids) - 1, 0))
+    present = image_ids[rows] == override_ids if len(image_ids) else np.zeros(len(override_ids), dtype=bool)
+    flags[rows[present], overrides["class_id"].to_numpy(dtype=np.int64)[present]] = \
+        overrides["value"].to_numpy(dtype=bool)[present]
+    return flags
+
+
+def unpack_boxes(images):
+    """Per-box arrays of a chunk: one join + frombuffer per column."""
+    counts = images["n_boxes"].to_numpy(dtype=np.int64)
+    return {
+        "image": np.repeat(np.arange(len(images)), counts),
+        "class_id": np.frombuffer(b"".join(images["class_ids"]), dtype=np.uint8).astype(np.int64),
+        "conf": np.frombuffer(b"".join(images["confs"]), dtype="<f4"),
+        "xyxy": np.frombuffer(b"".join(images["boxes"]), dtype="<f4").reshape(-1, 4),
+    }
+
+
+def image_frame(images, flags, first_id=0):
+    df = pd.DataFrame({
+        "id": np.arange(first_id, first_id + len(images)),
+        "image_name": images["name"], "path": images["path"],
+        "longitude": images["lon"], "latitude": images["lat"], "subdistrict": images["subdistrict"],
+    })
+    df[CLASSES] = flags
+    return df
+
+
+def detection_frame(images, detections, first_id=0):
+    position = detections["image"]
+    df = pd.DataFrame({
+        "id": first_id + position,
+        "image_name": images["name"].to_numpy()[position], "path": images["path"].to_numpy()[position],
+        "longitude": images["lon"].to_numpy()[position], "latitude": images["lat"].to_numpy()[position],
+        "subdistrict": images["subdistrict"].to_numpy()[position],
+        "class": pd.Categorical.from_codes(detections["class_id"], CLASSES),
+        "confidence": detections["conf"].astype(float).round(4),
+    })
+    df[["x1", "y1", "x2", "y2"]] = detections["xyxy"].astype(float).round(1)
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the persistent results store")
+    parser.add_argument("out", type=str, help="Output .csv, .parquet or .gpkg")
+    parser.add_argument("--db", type=str, default=RESULTS_DB_PATH, help="Results store (SQLite)")
+    parser.add_argument("--level", type=str, default="images", choices=["images", "detections"],
+                        help="One row per image (class flags) or one row per box")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_ROWS, help="Images per chunk (bounds memory)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"results store not found: {args.db}")
+    db = ResultsDB(args.db)
+    t0 = time.perf_counter()
+    count = db.export(args.out, args.level, args.chunk_size)
+    db.close()
+    print(f"Exported {count} {args.level} rows in {time.perf_counter() - t0:.1f}s -> {args.out}")
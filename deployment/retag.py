@@ -0,0 +1,92 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import KECAMATAN_COLUMN, MAP_FILE_PATH
+from geo import OUTSIDE, UNKNOWN, read_boundary_layer
+from writers import ChunkWriter
+
+LON_COLUMN, LAT_COLUMN, SUBDISTRICT_COLUMN = "longitude", "latitude", "subdistrict"
+
+
+# --- SPATIAL JOIN ---
+def assign_subdistricts(df, boundary, column=KECAMATAN_COLUMN):
+    """
+    One indexed spatial join for a whole chunk: points built in a single
+    vectorized step, `gpd.sjoin(predicate="within")` against the layer.
+    Same rules as live tagging: no GPS -> Unknown, no polygon -> Outside
+    Area, several polygons -> the first in layer order.
+    """
+    import geopandas as gpd
+
+    lons = pd.to_numeric(df[LON_COLUMN], errors="coerce").to_numpy(dtype=float)
+    lats = pd.to_numeric(df[LAT_COLUMN], errors="coerce").to_numpy(dtype=float)
+    out = np.full(len(df), UNKNOWN, dtype=object)
+    valid = (lons != 0.0) & np.isfinite(lons) & np.isfinite(lats)
+    if valid.any():
+        out[valid] = OUTSIDE
+        points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(lons[valid], lats[valid]), crs="EPSG:4326")
+        joined = gpd.sjoin(points, boundary, how="inner", predicate="within")
+        # index_right is the polygon's position in the layer; keep the lowest per point
+        joined = joined.sort_values("index_right", kind="stable")
+        joined = joined[~joined.index.duplicated(keep="first")]
+        out[np.flatnonzero(valid)[joined.index.to_numpy()]] = joined[column].to_numpy(dtype=object)
+    df[SUBDISTRICT_COLUMN] = out
+    return df
+
+
+# --- CHUNKED I/O ---
+def read_chunks(path, chunk_size):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        yield from pd.read_csv(path, chunksize=chunk_size)
+    elif ext == ".parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported input format '{ext}' (use .csv or .parquet)")
+
+
+def retag_file(in_path, out_path, map_path, column=KECAMATAN_COLUMN, chunk_size=200_000):
+    boundary = read_boundary_layer(map_path, column).reset_index(drop=True)
+    tmp_path = out_path + ".tmp" + os.path.splitext(out_path)[1]
+    writer = ChunkWriter(tmp_path)
+    rows, changed = 0, 0
+    try:
+        for chunk in read_chunks(in_path, chunk_size):
+            for col in (LON_COLUMN, LAT_COLUMN):
+                if col not in chunk.columns:
+                    raise ValueError(f"{in_path} has no '{col}' column")
+            before = chunk[SUBDISTRICT_COLUMN].astype(str).to_numpy() if SUBDISTRICT_COLUMN in chunk else None
+            chunk = assign_subdistricts(chunk, boundary, column)
+            if before is not None:
+                changed += int((before != chunk[SUBDISTRICT_COLUMN].astype(str).to_numpy()).sum())
+            writer.write(chunk)
+            rows += len(chunk)
+            print(f"  {rows} rows")
+    finally:
+        writer.close()
+    # Only replace the output (possibly the input itself) once every chunk is written
+    os.replace(tmp_path, out_path)
+    return rows, changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-tag subdistricts of exported results against a boundary layer")
+    parser.add_argument("input", type=str, help="Exported results (.csv or .parquet)")
+    parser.add_argument("--map", type=str, default=MAP_FILE_PATH, help="BPS boundary shapefile")
+    parser.add_argument("--column", type=str, default=KECAMATAN_COLUMN, help="Subdistrict name column in the map")
+    parser.add_argument("--out", type=str, default=None, help="Output file (default: <input>_retagged.<ext>)")
+    parser.add_argument("--in-place", action="store_true", help="Overwrite the input file")
+    parser.add_argument("--chunk-size", type=int, default=200_000, help="Rows per chunk (bounds memory)")
+    args = parser.parse_args()
+
+    stem, ext = os.path.splitext(args.input)
+    out = args.input if args.in_place else (args.out or f"{stem}_retagged{ext}")
+    t0 = time.perf_counter()
+    rows, changed = retag_file(args.input, out, args.map, args.column, args.chunk_size)
+    print(f"Re-tagged {rows} rows ({changed} changed) in {time.perf_counter() - t0:.1f}s -> {out}")
@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import cv2
+import numpy as np
+
+from config import (BACKEND, MODEL_PATH, MAP_FILE_PATH, SERVER_HOST, SERVER_PORT, SERVER_MAX_BATCH,
+                    SERVER_MAX_WAIT_MS, TILE_SIZE)
+from engine import InferencePipeline, BACKEND_WEIGHTS
+from exif import get_coordinates, get_coordinates_from_bytes
+from geo import get_kecamatan_many, load_boundary_map
+
+
+# --- METRICS ---
+class LatencyWindow:
+    """Sliding window of recent latencies for p50 / p95."""
+
+    def __init__(self, size=2000):
+        self.values = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.values.append(seconds)
+
+    def percentiles(self):
+        with self._lock:
+            values = np.fromiter(self.values, dtype=np.float64)
+        if not len(values): return {"p50_ms": None, "p95_ms": None}
+        p50, p95 = np.percentile(values, [50, 95]) * 1000
+        return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2)}
+
+
+# --- MICRO-BATCHING ---
+class MicroBatcher:
+    """
+    Collects images submitted from concurrent requests into one model call.
+    A batch is closed when it reaches `max_batch` images or `max_wait_s`
+    after its first image arrived, whichever comes first, so a lone request
+    waits at most `max_wait_s` and a burst fills whole batches.
+    """
+
+    def __init__(self, pipeline, model, max_batch=SERVER_MAX_BATCH, max_wait_s=SERVER_MAX_WAIT_MS / 1000):
+        self.pipeline = pipeline
+        self.model = model
+        self.max_batch = max(1, max_batch)
+        self.max_wait_s = max(0.0, max_wait_s)
+        self.requests = queue.Queue()
+        self.latency = LatencyWindow()
+        self.batches = 0
+        self.images = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, image):
+        future = Future()
+        self.requests.put((image, future, time.perf_counter()))
+        return future
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _next_batch(self):
+        try:
+            batch = [self.requests.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if not batch: continue
+            try:
+                detections = self.pipeline.predict(self.model, [image for image, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch: future.set_exception(e)
+                continue
+            done = time.perf_counter()
+            for (_, future, submitted), dets in zip(batch, detections):
+                self.latency.add(done - submitted)
+                future.set_result(dets)
+            self.batches += 1
+            self.images += len(batch)
+
+    def metrics(self):
+        return {
+            "queue_depth": self.requests.qsize(),
+            "batches": self.batches,
+            "images": self.images,
+            "mean_batch_size": round(self.images / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait_s * 1000,
+            "image_latency": self.latency.percentiles(),  # queue wait + model time
+        }
+
+
+# --- HTTP SERVER ---
+class InferenceServer(ThreadingHTTPServer):
+    """
+    Keeps one model and one boundary index in memory for every client.
+    POST /infer takes {"paths": [...]} (files readable by the server) or a
+    raw image body (upload; name in the X-Filename header) and returns one
+    detections + lon/lat + subdistrict payload per image.
+    GET /metrics and GET /health report queue depth, batching and latency.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, pipeline, boundary=None, max_batch=SERVER_MAX_BATCH,
+                 max_wait_s=SERVER_MAX_WAIT_MS / 1000):
+        super().__init__(address, InferenceHandler)
+        self.pipeline = pipeline
+        self.boundary = boundary
+        self.batcher = MicroBatcher(pipeline, pipeline.load_model(), max_batch, max_wait_s)
+        self.request_latency = LatencyWindow()
+        self.requests_served = 0
+        self.started_at = time.time()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def infer(self, items):
+        """[(name, image or None, lon, lat)] -> payload per item, in order."""
+        futures = [self.batcher.submit(image) if image is not None else None for _, image, _, _ in items]
+        subdistricts = get_kecamatan_many(self.boundary, [lon for _, _, lon, _ in items],
+                                          [lat for _, _, _, lat in items])
+        results = []
+        for (name, _, lon, lat), future, subdistrict in zip(items, futures, subdistricts):
+            if future is None:
+                results.append({"path": name, "error": f"Cannot read image: {name}"})
+                continue
+            payload = future.result()
+            payload.update(path=name, lon=lon, lat=lat, subdistrict=subdistrict)
+            results.append(payload)
+        return results
+
+    def metrics(self):
+        return {
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "requests": self.requests_served,
+            "request_latency": self.request_latency.percentiles(),
+            **self.batcher.metrics(),
+        }
+
+    def server_close(self):
+        super().server_close()
+        self.batcher.close()
+
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # per-request logging would dominate the console; see /metrics
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        route = urlparse(self.path).path
+        if route == "/health":
+            self._send_json(200, {"status": "ok", "model": self.server.pipeline.weights,
+                                  "map": self.server.pipeline.map_hash})
+        elif route == "/metrics":
+            self._send_json(200, self.server.metrics())
+        else:
+            self._send_json(404, {"error": f"Unknown route {route}"})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/infer":
+            self._send_json(404, {"error": f"Unknown route {self.path}"})
+            return
+        t0 = time.perf_counter()
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                items = [(p, cv2.imread(p), *get_coordinates(p)) for p in json.loads(body)["paths"]]
+            else:
+                image = cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR)
+                items = [(self.headers.get("X-Filename", "upload"), image, *get_coordinates_from_bytes(body))]
+            results = self.server.infer(items)
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": f"Bad request: {e}"})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self.server.request_latency.add(time.perf_counter() - t0)
+        self.server.requests_served += 1
+        self._send_json(200, {"results": results})
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="Local inference server with dynamic micro-batching")
+    parser.add_argument("--model", type=str, default=MODEL_PATH, help="Model weights")
+    parser.add_argument("--backend", type=str, default=BACKEND, choices=list(BACKEND_WEIGHTS))
+    parser.add_argument("--map", type=str, default=MAP_FILE_PATH, help="BPS boundary shapefile")
+    parser.add_argument("--host", type=str, default=SERVER_HOST, help="Bind address (keep 127.0.0.1 for local use)")
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--max-batch", type=int, default=SERVER_MAX_BATCH, help="Images per model call")
+    parser.add_argument("--max-wait-ms", type=float, default=SERVER_MAX_WAIT_MS,
+                        help="How long a batch waits for more images after the first one")
+    parser.add_argument("--device", type=str, default=None, help="Device (0, 1, or cpu)")
+    parser.add_argument("--tile-size", type=int, default=TILE_SIZE, help="Sliced inference tile size (off if unset)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    boundary = None
+    if os.path.exists(opt.map):
+        boundary = load_boundary_map(opt.map)
+        print(f"Boundary map loaded: {len(boundary)} areas")
+    else:
+        print(f"Warning: Map file {opt.map} not found. Subdistrict will be 'Unknown'.")
+
+    pipeline = InferencePipeline(opt.model, boundary, device=opt.device, backend=opt.backend, tile_size=opt.tile_size)
+    server = InferenceServer((opt.host, opt.port), pipeline, boundary, opt.max_batch, opt.max_wait_ms / 1000)
+    print(f"Serving {pipeline.weights} on {server.url} (max batch {opt.max_batch}, max wait {opt.max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
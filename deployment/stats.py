@@ -0,0 +1,160 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+# --- MEMORY ---
+def rss_mb():
+    """Current resident set size of this process in MB (None if unavailable)."""
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss / 2**20, 1)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb(children=False):
+    """Peak resident set size of this process (or of its largest finished child) in MB, None if unavailable."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+    except ImportError:
+        if children: return None
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / 2**20, 1)
+        except (ImportError, AttributeError):
+            return None
+
+
+# --- STAGE STATISTICS ---
+class StageStats:
+    def __init__(self, name, max_samples=10000):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.samples = deque(maxlen=max_samples)  # seconds per image, one sample per call
+        self._lock = threading.Lock()
+
+    def add(self, items, seconds):
+        with self._lock:
+            self.items += items
+            self.busy += seconds
+            if items: self.samples.append(seconds / items)
+
+    @property
+    def rate(self):
+        return self.items / self.busy if self.busy > 0 else 0.0
+
+    def distribution(self):
+        """Per-image latency summary in milliseconds."""
+        with self._lock:
+            samples = np.fromiter(self.samples, dtype=np.float64) * 1000
+        if not len(samples): return {"count": 0}
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {"count": len(samples), "mean_ms": round(float(samples.mean()), 3), "p50_ms": round(float(p50), 3),
+                "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3),
+                "max_ms": round(float(samples.max()), 3)}
+
+    def __str__(self):
+        return f"{self.name}: {self.items} img, {self.rate:.1f} img/s"
+
+
+# --- PIPELINE STATISTICS ---
+class PipelineStats:
+    """
+    Everything measured during one run: a StageStats per timer, plain
+    counters, occupancy of the queues between stages and the memory
+    watermark. snapshot() is a JSON-ready dict for the GUI and batch logs.
+    """
+
+    def __init__(self, stages, counters=(), output_stage=None):
+        self.stages = {name: StageStats(name) for name in stages}
+        self.counters = dict.fromkeys(counters, 0)
+        self.output_stage = output_stage or stages[-1]
+        self.queues = {}
+        self.queue_peaks = {}
+        self.peak_rss = 0.0
+        self.started_at = None
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        return self.stages[name]
+
+    def reset(self):
+        """Forgets everything measured so far (e.g. a warm-up run); watched queues stay registered."""
+        self.stages = {name: StageStats(name) for name in self.stages}
+        self.counters = dict.fromkeys(self.counters, 0)
+        self.queue_peaks = dict.fromkeys(self.queues, 0)
+        self.peak_rss = 0.0
+        self.started_at = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.sample()
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def watch_queue(self, name, q):
+        self.queues[name] = q
+        self.queue_peaks[name] = 0
+
+    def sample(self):
+        """Records queue occupancy and memory; cheap enough to call once per batch."""
+        for name, q in self.queues.items():
+            self.queue_peaks[name] = max(self.queue_peaks[name], q.qsize())
+        rss = rss_mb()
+        if rss is not None: self.peak_rss = max(self.peak_rss, rss)
+        return rss
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started_at if self.started_at is not None else 0.0
+
+    @property
+    def throughput(self):
+        elapsed = self.elapsed
+        return self.stages[self.output_stage].items / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self):
+        rss = self.sample()
+        return {
+            "time": time.time(),
+            "elapsed_s": round(self.elapsed, 3),
+            "images": self.stages[self.output_stage].items,
+            "images_per_s": round(self.throughput, 2),
+            "stages": {name: {"items": s.items, "busy_s": round(s.busy, 3), "images_per_s": round(s.rate, 2),
+                              **s.distribution()} for name, s in self.stages.items()},
+            "counters": dict(self.counters),
+            "queues": {name: {"size": q.qsize(), "peak": self.queue_peaks[name], "capacity": q.maxsize}
+                       for name, q in self.queues.items()},
+            "memory": {"rss_mb": rss, "peak_rss_mb": max(self.peak_rss, peak_rss_mb() or 0.0) or None},
+        }
+
+    def format(self, snapshot=None):
+        """Multi-line, human readable view of a snapshot (progress dialogs, consoles)."""
+        snap = snapshot or self.snapshot()
+        lines = [f"{snap['images']} img in {snap['elapsed_s']:.0f}s | {snap['images_per_s']:.1f} img/s"]
+        lines.append(" | ".join(f"{name} {s.get('p50_ms', 0):.0f}/{s.get('p95_ms', 0):.0f} ms"
+                                for name, s in snap["stages"].items() if s["count"]) + "  (p50/p95 per img)")
+        if snap["queues"]:
+            lines.append("queues " + " | ".join(f"{name} {q['size']}/{q['capacity']} (peak {q['peak']})"
+                                                for name, q in snap["queues"].items()))
+        extras = [f"{name} {value}" for name, value in snap["counters"].items()]
+        memory = snap["memory"]
+        if memory["rss_mb"] is not None:
+            extras.append(f"RSS {memory['rss_mb']:.0f} MB (peak {memory['peak_rss_mb']:.0f})")
+        if extras: lines.append(" | ".join(extras))
+        return "\n".join(lines)
@@ -0,0 +1,142 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+from config import CLASSES
+
+HEADERS = ["ID", "Image Name", "Longitude", "Latitude", "Subdistrict"] + CLASSES
+STORE_COLUMNS = ["image_id", "path", "name", "lon", "lat", "subdistrict", "labels", "boxes", "confs"] + CLASSES
+CLASS_OFFSET = 5
+
+
+# --- COLUMNAR STORE ---
+class ResultStore:
+    """
+    Column -> list store for processed rows. Appends cost O(batch); deletes
+    remove whole contiguous slices per column. The row ID is the row position,
+    so renumbering after a delete is free. `image_id` is the row's key in the
+    ResultsDB (None when rows are not persisted).
+    """
+
+    def __init__(self):
+        self.columns = {col: [] for col in STORE_COLUMNS}
+        self.image_ids = set()
+
+    def __len__(self):
+        return len(self.columns["path"])
+
+    def append(self, rows):
+        for col, values in self.columns.items():
+            values.extend(row.get(col) for row in rows)
+        self.image_ids.update(row.get("image_id") for row in rows)
+
+    def remove_range(self, first, last):
+        self.image_ids.difference_update(self.columns["image_id"][first:last + 1])
+        for values in self.columns.values():
+            del values[first:last + 1]
+
+    def replace(self, rows):
+        """Overwrites the rows holding the same image_id (re-inferred images); returns their positions."""
+        position = {image_id: i for i, image_id in enumerate(self.columns["image_id"])}
+        positions = []
+        for row in rows:
+            i = position[row["image_id"]]
+            for col, values in self.columns.items():
+                values[i] = row.get(col)
+            positions.append(i)
+        return positions
+
+    def row(self, index):
+        row_data = {col: values[index] for col, values in self.columns.items()}
+        row_data["id"] = index
+        return row_data
+
+
+def contiguous_ranges(rows):
+    """Sorted row numbers -> [(first, last), ...] in descending order, safe to remove one by one."""
+    ranges = []
+    for row in sorted(set(rows)):
+        if ranges and row == ranges[-1][1] + 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return [tuple(r) for r in reversed(ranges)]
+
+
+# --- TABLE MODEL ---
+class ResultsTableModel(QAbstractTableModel):
+    def __init__(self, store, db=None, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.db = db
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.store)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid(): return None
+        row, col = index.row(), index.column()
+        columns = self.store.columns
+
+        if col >= CLASS_OFFSET:
+            if role == Qt.ItemDataRole.CheckStateRole:
+                checked = columns[CLASSES[col - CLASS_OFFSET]][row]
+                return Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked
+            return None
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            if col == 0: return str(row)
+            if col == 1: return columns["name"][row]
+            if col == 2: return str(columns["lon"][row])
+            if col == 3: return str(columns["lat"][row])
+            if col == 4: return str(columns["subdistrict"][row])
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.CheckStateRole or index.column() < CLASS_OFFSET: return False
+        cls = CLASSES[index.column() - CLASS_OFFSET]
+        checked = Qt.CheckState(value) == Qt.CheckState.Checked
+        self.store.columns[cls][index.row()] = checked
+        image_id = self.store.columns["image_id"][index.row()]
+        if self.db is not None and image_id is not None:
+            self.db.set_override(image_id, cls, checked)
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def flags(self, index):
+        if not index.isValid(): return Qt.ItemFlag.NoItemFlags
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.column() >= CLASS_OFFSET:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def append_rows(self, rows):
+        """Appends new rows; rows of images already in the table (same image_id) replace them instead."""
+        if not rows: return
+        known = [row for row in rows if row.get("image_id") is not None and row["image_id"] in self.store.image_ids]
+        if known:
+            for i in self.store.replace(known):
+                self.dataChanged.emit(self.index(i, 0), self.index(i, len(HEADERS) - 1))
+            rows = [row for row in rows if row.get("image_id") is None or row["image_id"] not in self.store.image_ids]
+            if not rows: return
+        first = len(self.store)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self.store.append(rows)
+        self.endInsertRows()
+
+    def remove_rows(self, rows):
+        for first, last in contiguous_ranges(rows):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            self.store.remove_range(first, last)
+            self.endRemoveRows()
+        # IDs are row positions; refresh the ID column below the first removal
+        if rows and len(self.store):
+            top = min(min(rows), len(self.store) - 1)
+            self.dataChanged.emit(self.index(top, 0), self.index(len(self.store) - 1, 0),
+                                  [Qt.ItemDataRole.DisplayRole])
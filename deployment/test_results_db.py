@@ -0,0 +1,47 @@
+from config import CLASSES
+from results_db import ResultsDB
+
+
+def make_row(path, labels):
+    row_data = {"path": path, "name": path, "lon": 106.8, "lat": -6.2, "subdistrict": "X",
+                "labels": labels, "boxes": [[1, 2, 3, 4]] * len(labels), "confs": [0.9] * len(labels)}
+    row_data.update({cls: cls in labels for cls in CLASSES})
+    return row_data
+
+
+def stored_flags(db):
+    return [flags.tolist() for _, _, flags in db.chunks()][0]
+
+
+def test_overrides_survive_identical_rerun(tmp_path):
+    db = ResultsDB(str(tmp_path / "results.sqlite"))
+    db.add_rows([make_row("a.jpg", ["CBN"])])
+    image_id = db.load_rows()[0]["image_id"]
+    db.set_override(image_id, "CBN", False)
+    db.set_override(image_id, "Indosat", True)
+
+    rerun = make_row("a.jpg", ["CBN"])  # e.g. a cache hit: same detections
+    db.add_rows([rerun])
+
+    assert rerun["image_id"] == image_id and len(db) == 1
+    assert rerun["CBN"] is False and rerun["Indosat"] is True
+    flags = dict(zip(CLASSES, stored_flags(db)[0]))
+    assert flags["CBN"] is False and flags["Indosat"] is True
+    db.close()
+
+
+def test_rerun_drops_only_overrides_of_changed_classes(tmp_path):
+    db = ResultsDB(str(tmp_path / "results.sqlite"))
+    db.add_rows([make_row("a.jpg", ["CBN"])])
+    image_id = db.load_rows()[0]["image_id"]
+    db.set_override(image_id, "CBN", False)
+    db.set_override(image_id, "Indosat", True)
+
+    db.add_rows([make_row("a.jpg", ["CBN", "Indosat"])])  # Indosat now detected
+
+    flags = dict(zip(CLASSES, stored_flags(db)[0]))
+    assert flags["CBN"] is False  # unchanged class: edit kept
+    assert flags["Indosat"] is True  # changed class: detection wins
+    count = db._conn.execute("SELECT COUNT(*) FROM overrides").fetchone()[0]
+    assert count == 1
+    db.close()
@@ -0,0 +1,102 @@
+import numpy as np
+
+
+# --- TILES ---
+def tile_offsets(length, tile, overlap):
+    """Start offsets covering [0, length) with `overlap` (0..1) between neighbours; the last tile is flush."""
+    if length <= tile: return [0]
+    stride = max(1, int(tile * (1.0 - overlap)))
+    offsets = list(range(0, length - tile, stride))
+    offsets.append(length - tile)
+    return offsets
+
+
+def make_tiles(image, tile_size, overlap):
+    """[(x0, y0, crop), ...] views into `image` (no copies)."""
+    height, width = image.shape[:2]
+    return [(x0, y0, image[y0:y0 + tile_size, x0:x0 + tile_size])
+            for y0 in tile_offsets(height, tile_size, overlap)
+            for x0 in tile_offsets(width, tile_size, overlap)]
+
+
+# --- MERGING ---
+def pairwise_overlap(box, boxes, metric="ios"):
+    """IoU or IoS (intersection over the smaller box) of one box against many."""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    denom = np.minimum(area, areas) if metric == "ios" else area + areas - inter
+    return inter / np.maximum(denom, 1e-9)
+
+
+def merge_detections(boxes, scores, classes, iou_thres=0.5, method="nms", metric="ios"):
+    """
+    Class-aware merge of detections gathered from overlapping tiles.
+    "nms" keeps the best box of each group; "wbf" replaces it with the
+    score-weighted average of the group. IoS matching (the default) also
+    groups a box cut by a tile border with the full box from the next tile.
+    Returns (boxes, scores, classes) as numpy arrays.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32)
+    classes = np.asarray(classes, dtype=np.int64)
+    keep_boxes, keep_scores, keep_classes = [], [], []
+
+    for cls in np.unique(classes):
+        idx = np.flatnonzero(classes == cls)
+        idx = idx[np.argsort(-scores[idx])]
+        while len(idx):
+            best, rest = idx[0], idx[1:]
+            overlap = pairwise_overlap(boxes[best], boxes[rest], metric)
+            group = np.concatenate(([best], rest[overlap >= iou_thres]))
+            if method == "wbf":
+                weights = scores[group][:, None]
+                keep_boxes.append((boxes[group] * weights).sum(0) / weights.sum())
+                keep_scores.append(scores[group].mean())
+            else:
+                keep_boxes.append(boxes[best])
+                keep_scores.append(scores[best])
+            keep_classes.append(cls)
+            idx = rest[overlap < iou_thres]
+
+    if not keep_boxes:
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64)
+    order = np.argsort(-np.asarray(keep_scores))
+    return np.asarray(keep_boxes)[order], np.asarray(keep_scores)[order], np.asarray(keep_classes)[order]
+
+
+# --- SLICED INFERENCE ---
+def sliced_predict(model, image, tile_size, overlap=0.2, method="nms", full_pass=True, **predict_kwargs):
+    """
+    Runs all tiles of one image (plus an optional downscaled full-image pass
+    for large objects) as a single model batch and merges the boxes back
+    into image coordinates. Returns (boxes, scores, classes, names).
+    """
+    tiles = make_tiles(image, tile_size, overlap)
+    crops = [crop for _, _, crop in tiles]
+    offsets = [(x0, y0) for x0, y0, _ in tiles]
+    if full_pass and len(tiles) > 1:
+        crops.append(image)
+        offsets.append((0, 0))
+
+    results = model(crops, imgsz=tile_size, verbose=False, **predict_kwargs)
+    all_boxes, all_scores, all_classes = [], [], []
+    for (x0, y0), result in zip(offsets, results):
+        if not len(result.boxes): continue
+        boxes = result.boxes.xyxy.cpu().numpy()
+        boxes[:, [0, 2]] += x0
+        boxes[:, [1, 3]] += y0
+        all_boxes.append(boxes)
+        all_scores.append(result.boxes.conf.cpu().numpy())
+        all_classes.append(result.boxes.cls.cpu().numpy().astype(int))
+
+    names = results[0].names if results else {}
+    if not all_boxes:
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64), names
+    boxes, scores, classes = merge_detections(np.concatenate(all_boxes), np.concatenate(all_scores),
+                                              np.concatenate(all_classes), method=method)
+    return boxes, scores, classes, names
@@ -0,0 +1,22 @@
+import hashlib
+import os
+
+
+def file_digest(path, algorithm="sha1", chunk_size=1 << 20):
+    h = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def weights_digest(path):
+    """Digest of a weights file, or of every file in an exported model directory."""
+    if not os.path.isdir(path):
+        return file_digest(path)
+    h = hashlib.sha1()
+    for root, _, files in sorted(os.walk(path)):
+        for name in sorted(files):
+            h.update(name.encode("utf-8"))
+            h.update(file_digest(os.path.join(root, name)).encode("ascii"))
+    return h.hexdigest()
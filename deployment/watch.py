@@ -0,0 +1,318 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+from batch import IMAGE_EXTENSIONS, add_pipeline_args, build_pipeline, load_boundary
+from config import RESULTS_DB_PATH, WATCH_POLL_S, WATCH_RESCAN_S, WATCH_DEBOUNCE_S, WATCH_STALE_S, WATCH_MAX_BATCH
+from result_cache import ResultCache
+from results_db import ResultsDB
+from writers import export_row, open_writer
+
+try:
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None  # polling only
+
+JPEG_END = b"\xff\xd9"
+PNG_END = b"IEND\xaeB`\x82"
+TAIL_BYTES = 64 * 1024
+
+
+def looks_complete(path):
+    """
+    Cheap truncation hint: a JPEG has an EOI marker somewhere in its last
+    64 KiB (phones append MPF / maker trailers after it), a PNG ends with
+    its IEND chunk. Motion photos carry a whole video after the EOI, so a
+    miss only delays the file (see FolderWatcher), it never blocks it.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - TAIL_BYTES))
+            tail = f.read()
+    except OSError:
+        return False
+    if ext == ".png":
+        return tail.endswith(PNG_END)
+    return JPEG_END in tail
+
+
+# --- PROCESSED-FILE STATE ---
+class WatchState:
+    """
+    Append-only JSONL of every file already handled, with the (size, mtime)
+    it had at the time, so a restart neither re-infers old uploads nor misses
+    files that were replaced while it was down. Failed files are recorded too
+    and only retried once they change.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.known = {}  # path -> (size, mtime_ns)
+        self.ids = {}  # path -> id of its latest row
+        records = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        break  # torn last line
+                    records += 1
+                    self.known[record["path"]] = (record["size"], record["mtime_ns"])
+                    if "id" in record:
+                        self.ids[record["path"]] = record["id"]
+            if records > 2 * len(self.known) + 1000:
+                self._compact()  # mostly superseded records of re-uploaded files
+        self.next_id = max(self.ids.values(), default=-1) + 1
+        self.file = open(path, "a", encoding="utf-8")
+
+    def _compact(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for path, (size, mtime_ns) in self.known.items():
+                record = {"path": path, "size": size, "mtime_ns": mtime_ns}
+                if path in self.ids: record["id"] = self.ids[path]
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        os.replace(tmp, self.path)
+
+    def record(self, entries):
+        """entries: iterable of (path, (size, mtime_ns), row id or None, error or None)"""
+        for path, signature, row_id, error in entries:
+            record = {"path": path, "size": signature[0], "mtime_ns": signature[1]}
+            if row_id is not None:
+                record["id"] = self.ids[path] = row_id
+                self.next_id = max(self.next_id, row_id + 1)
+            if error is not None:
+                record["error"] = error
+            self.known[path] = signature
+            self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+# --- FOLDER WATCHER ---
+class _EventSink:
+    """watchdog handler: only remembers which paths were touched; all checks happen in poll()."""
+
+    def __init__(self, mark):
+        self.mark = mark
+
+    def dispatch(self, event):
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            if path: self.mark(os.fsdecode(path))
+
+
+class FolderWatcher:
+    """
+    Collects new or changed images under `folders`. Changes come from
+    inotify/FSEvents/ReadDirectoryChanges through watchdog when it is
+    installed, otherwise from rescanning every poll. A file is handed out
+    once its (size, mtime) has been stable for `debounce_s`; one that looks
+    truncated waits until it has been stable for `stale_s`. If an upload
+    was only paused, its later change makes the file new again.
+    """
+
+    def __init__(self, folders, known, debounce_s=WATCH_DEBOUNCE_S, stale_s=WATCH_STALE_S,
+                 rescan_s=WATCH_RESCAN_S, use_events=True):
+        self.folders = [os.path.abspath(f) for f in folders]
+        self.known = known
+        self.debounce_s = debounce_s
+        self.stale_s = stale_s
+        self.rescan_s = rescan_s
+        self.pending = {}  # path -> (size, mtime_ns, stable since)
+        self._touched = set()
+        self._lock = threading.Lock()
+        self._last_scan = None
+        self._observer = None
+        if use_events and Observer is not None:
+            self._observer = Observer()
+            for folder in self.folders:
+                self._observer.schedule(_EventSink(self._mark), folder, recursive=True)
+            self._observer.start()
+
+    @property
+    def mode(self):
+        return "events (watchdog)" if self._observer is not None else "polling"
+
+    def _mark(self, path):
+        with self._lock:
+            self._touched.add(path)
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+
+    @staticmethod
+    def scan(folder):
+        stack = [folder]
+        while stack:
+            try:
+                entries = list(os.scandir(stack.pop()))
+            except OSError:
+                continue  # removed while scanning
+            for entry in entries:
+                if entry.name.startswith("."): continue  # rsync / browser temp files
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield entry.path
+
+    def _candidates(self, now):
+        if self._observer is None or self._last_scan is None or now - self._last_scan >= self.rescan_s:
+            self._last_scan = now
+            with self._lock:
+                self._touched.clear()
+            return {p for folder in self.folders for p in self.scan(folder)}
+        with self._lock:
+            touched, self._touched = self._touched, set()
+        candidates = set()
+        for path in touched:
+            if os.path.isdir(path):
+                candidates.update(self.scan(path))  # a folder moved in at once
+            elif path.lower().endswith(IMAGE_EXTENSIONS) and not os.path.basename(path).startswith("."):
+                candidates.add(path)
+        return candidates
+
+    def poll(self):
+        """[(path, (size, mtime_ns))] of files that became ready since the last call."""
+        now = time.monotonic()
+        ready = []
+        for path in self._candidates(now) | set(self.pending):
+            try:
+                st = os.stat(path)
+            except OSError:
+                self.pending.pop(path, None)
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            if self.known.get(path) == signature:
+                self.pending.pop(path, None)
+                continue
+            previous = self.pending.get(path)
+            if previous is None or previous[:2] != signature:
+                # Untouched for a while already (e.g. backlog at startup): no need to wait again
+                age = time.time() - st.st_mtime
+                since = now - age if previous is None and age >= self.debounce_s else now
+                self.pending[path] = signature + (since,)
+                previous = self.pending[path]
+            stable_for = now - previous[2]
+            if st.st_size == 0 or stable_for < self.debounce_s: continue
+            if stable_for < self.stale_s and not looks_complete(path): continue
+            ready.append((path, signature))
+            del self.pending[path]
+        return sorted(ready)
+
+
+# --- INGEST LOOP ---
+def infer_files(pipeline, ready, start_id):
+    """
+    Rows for `ready` plus the paths that could not be read. One unreadable
+    upload must not stop the service, so a failed run is retried file by
+    file; if every file fails on its own the problem is not the files
+    (server down, bad weights) and the error is raised.
+    """
+    paths = [path for path, _ in ready]
+    try:
+        return list(pipeline.run(paths, start_id=start_id)), {}
+    except Exception as e:
+        if len(paths) == 1: raise
+        print(f"[watch] Run failed ({e}); retrying {len(paths)} files one by one")
+    rows, failed = [], {}
+    for path in paths:
+        try:
+            rows.extend(pipeline.run([path], start_id=start_id + len(rows)))
+        except Exception as e:
+            failed[path] = str(e)
+            last_error = e
+    if not rows:
+        raise last_error
+    return rows, failed
+
+
+def watch(args):
+    state_path = args.state or os.path.splitext(args.out)[0] + "_watch.jsonl"
+    state = WatchState(state_path)
+    writer = open_writer(args.out, append=True)
+    results_db = None if args.no_db else ResultsDB(args.db)
+    boundary = load_boundary(args)
+    cache = None if args.no_cache or args.server else ResultCache(args.cache)
+    pipeline = build_pipeline(args, boundary, cache)
+    watcher = FolderWatcher(args.folders, state.known, args.debounce, args.stale, args.rescan,
+                            use_events=not args.poll_only)
+    print(f"Watching {', '.join(watcher.folders)} ({watcher.mode}); "
+          f"{len(state.known)} files already processed (state: {state_path})")
+    print(f"Appending to {args.out}. Ctrl+C to stop.")
+
+    total = 0
+    try:
+        while True:
+            ready = watcher.poll()
+            for i in range(0, len(ready), args.max_batch):
+                chunk = ready[i:i + args.max_batch]
+                t0 = time.perf_counter()
+                rows, failed = infer_files(pipeline, chunk, state.next_id)
+                # Rows hit the output before the state: a crash in between repeats rows, never loses them
+                writer.write([export_row(r) for r in rows])
+                if results_db is not None: results_db.add_rows(rows)
+                row_ids = {row["path"]: row["id"] for row in rows}
+                state.record((path, signature, row_ids.get(path), failed.get(path)) for path, signature in chunk)
+                total += len(rows)
+                print(f"[watch] {len(rows)} images in {time.perf_counter() - t0:.1f}s"
+                      + (f", {len(failed)} unreadable" if failed else "")
+                      + f" | {total} this session, {len(watcher.pending)} still being written")
+                for path, error in failed.items():
+                    print(f"  [skipped] {path}: {error}")
+            if args.once and not watcher.pending: break
+            time.sleep(args.poll)
+    except KeyboardInterrupt:
+        print("Stopping...")
+    finally:
+        watcher.stop()
+        pipeline.close()
+        writer.close()
+        if results_db is not None: results_db.close()
+        state.close()
+        if cache is not None: cache.close()
+    print(f"Done. {total} images processed this session. Results: {args.out}")
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="Watch upload folders and infer new or changed images as they land")
+    parser.add_argument("folders", nargs="+", help="Folders to watch (recursively)")
+    parser.add_argument("--out", type=str, default="detection_results_kecamatan.csv",
+                        help="Output .csv, appended to across restarts")
+    parser.add_argument("--db", type=str, default=RESULTS_DB_PATH,
+                        help="Results store the rows (boxes included) also go to; the GUI shows new rows from it")
+    parser.add_argument("--no-db", action="store_true", help="Only write --out, not the results store")
+    parser.add_argument("--state", type=str, default=None,
+                        help="Processed-file state (default: <out>_watch.jsonl)")
+    add_pipeline_args(parser)
+    parser.add_argument("--poll", type=float, default=WATCH_POLL_S, help="Seconds between checks")
+    parser.add_argument("--rescan", type=float, default=WATCH_RESCAN_S,
+                        help="Seconds between full rescans when watchdog events are used")
+    parser.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE_S,
+                        help="Seconds a file must stay unchanged before it is inferred")
+    parser.add_argument("--stale", type=float, default=WATCH_STALE_S,
+                        help="Seconds a file that looks truncated must stay unchanged before it is inferred")
+    parser.add_argument("--max-batch", type=int, default=WATCH_MAX_BATCH, help="Images per pipeline run")
+    parser.add_argument("--poll-only", action="store_true", help="Rescan instead of using watchdog events")
+    parser.add_argument("--once", action="store_true", help="Process what is there (once stable) and exit")
+    args = parser.parse_args()
+    if os.path.splitext(args.out)[1].lower() != ".csv":
+        parser.error("--out must be a .csv file (it is appended to)")
+    for folder in args.folders:
+        if not os.path.isdir(folder):
+            parser.error(f"not a folder: {folder}")
+    return args
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    watch(opt)
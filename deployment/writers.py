@@ -0,0 +1,143 @@
+import csv
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import CLASSES
+
+EXPORT_COLUMNS = ["id", "image_name", "path", "longitude", "latitude", "subdistrict"] + CLASSES
+
+
+def export_row(row_data):
+    row_dict = {
+        "id": row_data["id"],
+        "image_name": row_data["name"],
+        "path": row_data["path"],
+        "longitude": row_data["lon"],
+        "latitude": row_data["lat"],
+        "subdistrict": row_data["subdistrict"],
+    }
+    for cls in CLASSES:
+        row_dict[cls] = bool(row_data[cls])
+    return row_dict
+
+
+# --- STREAMING WRITERS ---
+class CsvResultWriter:
+    def __init__(self, path, columns=EXPORT_COLUMNS, append=False):
+        self.columns = columns
+        is_new = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a" if append else "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=columns, extrasaction="ignore")
+        if is_new: self.writer.writeheader()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetResultWriter:
+    """Writes every `write()` call as one row group, so rows hit disk as they come."""
+
+    def __init__(self, path, columns=EXPORT_COLUMNS):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.columns = columns
+        self.schema = pa.schema(
+            [("id", pa.int64()), ("image_name", pa.string()), ("path", pa.string()),
+             ("longitude", pa.float64()), ("latitude", pa.float64()), ("subdistrict", pa.string())]
+            + [(cls, pa.bool_()) for cls in CLASSES]
+        )
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        if not rows: return
+        table = self.pa.Table.from_pylist([{c: r.get(c) for c in self.columns} for r in rows], schema=self.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        self.writer.close()
+
+
+class ChunkWriter:
+    """Appends DataFrame chunks to a CSV (header once) or Parquet file (one row group per chunk)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = os.path.splitext(path)[1].lower() == ".parquet"
+        self.writer = None
+        self.first = True
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table.cast(self.writer.schema))
+        else:
+            # Same CSV format as CsvResultWriter / the baseline export (True/False flags, minimal quoting)
+            with open(self.path, "w" if self.first else "a", newline="", encoding="utf-8") as f:
+                df.to_csv(f, header=self.first, index=False)
+        self.first = False
+
+    def close(self):
+        if self.writer is not None: self.writer.close()
+
+
+def write_gpkg(path, frames):
+    """
+    Streams DataFrames with longitude/latitude columns into one GeoPackage
+    point layer (rows without GPS get no geometry). It is a single GDAL write,
+    so the spatial index is built once at the end instead of per appended row.
+    """
+    try:
+        import pyarrow as pa
+        import shapely
+        from pyogrio.raw import write_arrow
+    except ImportError:
+        raise ImportError("GeoPackage output requires pyarrow and pyogrio (pip install pyarrow pyogrio)")
+
+    def batches():
+        for df in frames:
+            lons = pd.to_numeric(df["longitude"], errors="coerce").to_numpy(dtype=float)
+            lats = pd.to_numeric(df["latitude"], errors="coerce").to_numpy(dtype=float)
+            valid = (lons != 0.0) & np.isfinite(lons) & np.isfinite(lats)
+            geometry = np.full(len(df), None, dtype=object)
+            geometry[valid] = shapely.to_wkb(shapely.points(lons[valid], lats[valid]))
+            categories = {col: df[col].astype(str) for col in df.columns
+                          if isinstance(df[col].dtype, pd.CategoricalDtype)}
+            table = pa.Table.from_pandas(df.assign(**categories), preserve_index=False)
+            # All-null columns (an empty export) have no OGR field type
+            table = table.cast(pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f
+                                          for f in table.schema]))
+            field = pa.field("geometry", pa.binary(), metadata={"ARROW:extension:name": "geoarrow.wkb"})
+            table = table.append_column(field, pa.array(geometry, pa.binary()))
+            yield from table.to_batches() or [pa.RecordBatch.from_pylist([], schema=table.schema)]
+
+    stream = batches()
+    first = next(stream)
+    write_arrow(pa.RecordBatchReader.from_batches(first.schema, itertools.chain([first], stream)), path,
+                layer=os.path.splitext(os.path.basename(path))[0], driver="GPKG", geometry_name="geometry",
+                geometry_type="Point", crs="EPSG:4326")
+
+
+def open_writer(path, append=False):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        if append:
+            raise ValueError("Parquet files cannot be appended to; use a .csv output")
+        return ParquetResultWriter(path)
+    if ext == ".csv":
+        return CsvResultWriter(path, append=append)
+    raise ValueError(f"Unsupported output format '{ext}' (use .csv or .parquet)")
@@ -0,0 +1,272 @@
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from convert_cvat_to_yolo import load_class_mapping
+
+# PATH SETUP
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[2]
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+UNASSIGNED = "unassigned"
+ASPECT_BINS = [0, 0.25, 0.5, 1, 2, 4, np.inf]
+# sqrt(box area / image area): tiny < 2%, small < 10%, medium < 30%, large >= 30%
+SIZE_BINS = [0, 0.02, 0.1, 0.3, np.inf]
+SIZE_LABELS = ["tiny", "small", "medium", "large"]
+
+
+# --- LOADERS (columnar) ---
+def load_coco(json_path):
+    """
+    COCO instances JSON -> (images, boxes) DataFrames. Boxes carry normalized
+    x1, y1, x2, y2 plus pixel width/height, built in one vectorized step.
+    """
+    with open(json_path) as f:
+        coco = json.load(f)
+    names = {int(c['id']): c['name'] for c in coco.get('categories', [])}
+
+    images = pd.DataFrame({
+        'image_id': np.fromiter((im['id'] for im in coco['images']), dtype=np.int64),
+        'file_name': [Path(im['file_name']).name for im in coco['images']],
+        'width': np.fromiter((im['width'] for im in coco['images']), dtype=np.float64),
+        'height': np.fromiter((im['height'] for im in coco['images']), dtype=np.float64),
+    })
+    anns = coco.get('annotations', [])
+    bbox = np.array([a['bbox'] for a in anns], dtype=np.float64).reshape(-1, 4)
+    image_ids = np.fromiter((a['image_id'] for a in anns), dtype=np.int64, count=len(anns))
+    category_ids = np.fromiter((a['category_id'] for a in anns), dtype=np.int64, count=len(anns))
+
+    sizes = images.set_index('image_id')[['width', 'height']].reindex(image_ids).to_numpy()
+    boxes = pd.DataFrame({
+        'image_id': image_ids,
+        'class_name': pd.Series(category_ids).map(names).fillna('<unknown>').astype('category').array,
+        'x1': bbox[:, 0] / sizes[:, 0], 'y1': bbox[:, 1] / sizes[:, 1],
+        'x2': (bbox[:, 0] + bbox[:, 2]) / sizes[:, 0], 'y2': (bbox[:, 1] + bbox[:, 3]) / sizes[:, 1],
+        'w_px': bbox[:, 2], 'h_px': bbox[:, 3],
+    })
+    return images, boxes
+
+
+def _read_label_file(path):
+    """(tokens, malformed) for one YOLO .txt; polygon / broken rows mark the whole file as malformed."""
+    tokens = path.read_text().split()
+    if len(tokens) % 5:
+        return [], True
+    return tokens, False
+
+
+def load_yolo(labels_root, names, workers=8):
+    """
+    YOLO labels (labels/<split>/*.txt or a flat folder) -> (images, boxes).
+    Files are read on a thread pool and parsed with a single NumPy
+    conversion. Pixel sizes are unknown here, so w_px / h_px are NaN.
+    """
+    labels_root = Path(labels_root)
+    files = sorted(labels_root.rglob('*.txt'))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        parsed = list(pool.map(_read_label_file, files))
+
+    counts = np.fromiter((len(tokens) // 5 for tokens, _ in parsed), dtype=np.int64, count=len(files))
+    values = np.array([t for tokens, _ in parsed for t in tokens], dtype=np.float64).reshape(-1, 5)
+    splits = [p.parent.name if p.parent != labels_root else UNASSIGNED for p in files]
+
+    images = pd.DataFrame({
+        'image_id': np.arange(len(files), dtype=np.int64),
+        'file_name': [p.stem for p in files],
+        'width': np.nan, 'height': np.nan,
+        'split': splits,
+        'malformed': [malformed for _, malformed in parsed],
+    })
+    class_ids = values[:, 0].astype(np.int64)
+    cx, cy, w, h = values[:, 1], values[:, 2], values[:, 3], values[:, 4]
+    id_to_name = {i: name for name, i in names.items()}
+    boxes = pd.DataFrame({
+        'image_id': np.repeat(images['image_id'].to_numpy(), counts),
+        'class_name': pd.Series(class_ids).map(id_to_name).fillna('<unknown>').astype('category').array,
+        'x1': cx - w / 2, 'y1': cy - h / 2, 'x2': cx + w / 2, 'y2': cy + h / 2,
+        'w_px': np.nan, 'h_px': np.nan,
+    })
+    return images, boxes
+
+
+def assign_splits(images, images_root):
+    """Split of each image from where its file sits under images_root/<split>/ (COCO has no split info)."""
+    split_of = {}
+    images_root = Path(images_root)
+    if images_root.is_dir():
+        for split_dir in sorted(p for p in images_root.iterdir() if p.is_dir()):
+            for path in split_dir.rglob('*'):
+                if path.suffix.lower() in IMAGE_EXTENSIONS:
+                    split_of[path.stem] = split_dir.name
+    stems = images['file_name'].map(lambda name: Path(name).stem)
+    images['split'] = stems.map(split_of).fillna(UNASSIGNED)
+    return images
+
+
+# --- CHECKS & STATISTICS ---
+def box_issues(boxes, min_px=4, tolerance=1e-6):
+    """One boolean column per check, all vectorized over the whole box table."""
+    w, h = boxes['x2'] - boxes['x1'], boxes['y2'] - boxes['y1']
+    issues = pd.DataFrame(index=boxes.index)
+    issues['degenerate'] = (w <= 0) | (h <= 0) | ~np.isfinite(w) | ~np.isfinite(h)
+    issues['out_of_bounds'] = ((boxes['x1'] < -tolerance) | (boxes['y1'] < -tolerance)
+                               | (boxes['x2'] > 1 + tolerance) | (boxes['y2'] > 1 + tolerance))
+    issues['tiny'] = (np.fmin(boxes['w_px'], boxes['h_px']) < min_px).fillna(False)
+    issues['unknown_class'] = boxes['class_name'] == '<unknown>'
+    issues['duplicate'] = boxes.round({'x1': 4, 'y1': 4, 'x2': 4, 'y2': 4}).duplicated(
+        ['image_id', 'class_name', 'x1', 'y1', 'x2', 'y2'])
+    return issues
+
+
+def shape_table(boxes):
+    """Relative size and aspect ratio columns (aspect in pixels when sizes are known)."""
+    w, h = boxes['x2'] - boxes['x1'], boxes['y2'] - boxes['y1']
+    aspect = (boxes['w_px'] / boxes['h_px']).where(boxes['w_px'].notna(), w / h)
+    rel_size = np.sqrt(np.clip(w, 0, None) * np.clip(h, 0, None))
+    return pd.DataFrame({'class_name': boxes['class_name'], 'rel_size': rel_size,
+                         'aspect': aspect.replace([np.inf, -np.inf], np.nan)})
+
+
+def distributions(shapes):
+    groups = shapes.groupby('class_name', observed=True)
+    per_class = groups['rel_size'].quantile([0.05, 0.5, 0.95]).unstack()
+    per_class.columns = ['rel_size_p05', 'rel_size_p50', 'rel_size_p95']
+    per_class.insert(0, 'boxes', groups.size())
+    per_class['aspect_p50'] = groups['aspect'].median()
+    size_bins = pd.cut(shapes['rel_size'], SIZE_BINS, labels=SIZE_LABELS, right=False)
+    aspect_bins = pd.cut(shapes['aspect'], ASPECT_BINS, right=False)
+    return {
+        'size': size_bins.groupby(shapes['class_name'], observed=True).value_counts().unstack(fill_value=0)
+                .reindex(columns=SIZE_LABELS, fill_value=0),
+        'aspect': aspect_bins.groupby(shapes['class_name'], observed=True).value_counts().unstack(fill_value=0)
+                  .rename(columns=str),
+        'per_class': per_class,
+    }
+
+
+def split_balance(images, boxes, min_instances=10):
+    """
+    Class x split instance counts. A class is flagged when a non-train split
+    holds fewer than `min_instances` of it, or when its share in that split
+    is under half its overall share (the Lintasarta case).
+    """
+    split = boxes['image_id'].map(images.set_index('image_id')['split'])
+    table = pd.crosstab(boxes['class_name'], split)
+    table['total'] = table.sum(axis=1)
+
+    overall_share = table['total'] / table['total'].sum()
+    flags = []
+    for column in table.columns.drop('total'):
+        if column in ('train', UNASSIGNED): continue
+        share = table[column] / max(1, table[column].sum())
+        low = (table[column] < min_instances) | (share < overall_share / 2)
+        for name in table.index[low]:
+            flags.append(f"{name}: {table.at[name, column]} instances in '{column}' "
+                         f"({share[name]:.1%} of split vs {overall_share[name]:.1%} overall)")
+    table['imbalance'] = (table['total'].max() / table['total']).round(1)
+    return table, flags
+
+
+def audit(images, boxes, min_px=4, min_instances=10):
+    issues = box_issues(boxes, min_px)
+    shapes = shape_table(boxes)
+    balance, flags = split_balance(images, boxes, min_instances)
+    return {
+        'images': len(images),
+        'boxes': len(boxes),
+        'empty_images': int((~images['image_id'].isin(boxes['image_id'])).sum()),
+        'malformed_files': int(images['malformed'].sum()) if 'malformed' in images else 0,
+        'class_histogram': boxes['class_name'].value_counts().sort_index(),
+        'issue_counts': issues.sum().astype(int),
+        'issues': issues,
+        'balance': balance,
+        'balance_flags': flags,
+        **distributions(shapes),
+    }
+
+
+# --- REPORT ---
+def _md(df):
+    df = df.reset_index()
+    lines = ["| " + " | ".join(map(str, df.columns)) + " |", "|" + "---|" * len(df.columns)]
+    for row in df.itertuples(index=False):
+        lines.append("| " + " | ".join(f"{v:.3f}" if isinstance(v, float) else str(v) for v in row) + " |")
+    return "\n".join(lines)
+
+
+def write_report(result, images, boxes, out_dir):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    sections = [
+        f"# Dataset Audit\n\nImages: {result['images']} | Boxes: {result['boxes']} | "
+        f"Images without boxes: {result['empty_images']} | Malformed label files: {result['malformed_files']}",
+        "## Class Histogram\n\n" + _md(result['class_histogram'].rename('boxes')),
+        "## Split Balance\n\n" + _md(result['balance'])
+        + ("\n\n" + "\n".join(f"- {flag}" for flag in result['balance_flags']) if result['balance_flags'] else ""),
+        "## Box Size (sqrt of relative area)\n\n" + _md(result['per_class']) + "\n\n" + _md(result['size']),
+        "## Aspect Ratio (w / h)\n\n" + _md(result['aspect']),
+        "## Box Checks\n\n" + _md(result['issue_counts'].rename('boxes').rename_axis('check')),
+    ]
+    report = "\n\n".join(sections) + "\n"
+    (out_dir / 'dataset_audit.md').write_text(report, encoding='utf-8')
+
+    summary = {
+        'images': result['images'], 'boxes': result['boxes'], 'empty_images': result['empty_images'],
+        'malformed_files': result['malformed_files'],
+        'class_histogram': result['class_histogram'].to_dict(),
+        'issue_counts': result['issue_counts'].to_dict(),
+        'balance': result['balance'].to_dict(orient='index'),
+        'balance_flags': result['balance_flags'],
+    }
+    (out_dir / 'dataset_audit.json').write_text(json.dumps(summary, indent=2, default=int))
+
+    flagged = result['issues'].any(axis=1)
+    bad = boxes[flagged].join(result['issues'][flagged])
+    bad.insert(1, 'file_name', bad['image_id'].map(images.set_index('image_id')['file_name']))
+    bad.to_csv(out_dir / 'dataset_audit_issues.csv', index=False)
+    return report
+
+
+def load(args):
+    if args.labels:
+        return load_yolo(args.labels, load_class_mapping(args.data_config), args.workers)
+    images, boxes = load_coco(args.coco)
+    return assign_splits(images, args.images_root), boxes
+
+
+def run(args):
+    t0 = time.perf_counter()
+    images, boxes = load(args)
+    t_load = time.perf_counter() - t0
+    result = audit(images, boxes, args.min_px, args.min_instances)
+    report = write_report(result, images, boxes, args.out)
+    print(report)
+    print(f"Loaded in {t_load:.2f}s, audited in {time.perf_counter() - t0 - t_load:.2f}s. Report saved to: {args.out}")
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description='Headless dataset audit for COCO / YOLO labels')
+    parser.add_argument('--coco', type=str, default=str(ROOT / 'data' / 'annotations' / 'coco' / 'instances_annotations_cvat.json'),
+                        help='COCO instances JSON')
+    parser.add_argument('--labels', type=str, default=None,
+                        help='Audit YOLO labels instead (folder with <split>/*.txt)')
+    parser.add_argument('--images-root', type=str, default=str(ROOT / 'data' / 'processed' / 'images'),
+                        help='images/<split>/ folders used to assign COCO images to splits')
+    parser.add_argument('--data-config', type=str, default=str(ROOT / 'data' / 'processed' / 'data.yaml'),
+                        help='data.yaml whose names map YOLO class ids')
+    parser.add_argument('--min-px', type=int, default=4, help='Boxes with a side under this many pixels are "tiny"')
+    parser.add_argument('--min-instances', type=int, default=10, help='Flag classes with fewer instances in a split')
+    parser.add_argument('--workers', type=int, default=8, help='Label reader threads (YOLO)')
+    parser.add_argument('--out', type=str, default=str(ROOT / 'experiments' / 'audit'), help='Report folder')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    run(opt)
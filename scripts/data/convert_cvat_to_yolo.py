@@ -1,79 +1,220 @@
+import argparse
+import json
+from array import array
+import time
 import xml.etree.ElementTree as ET
-import os
-
-
-def convert_cvat_xml_to_yolo():
-    input_xml = r"C:\Workspace\projects\ml\real-world-telecom-infrastructure-object-detection\data\synthetic\labels\synthetic.xml"
-    output_folder = r"C:\Workspace\projects\ml\real-world-telecom-infrastructure-object-detection\data\synthetic\labels"
-
-    class_mapping = {
-        "Indihome": 0,
-        "Indosat": 1,
-        "MyRepublic": 2,
-        "Lintasarta": 3,
-        "CBN": 4
-    }
-
-    if not os.path.exists(input_xml):
-        print(f"ERROR: XML File not found: {input_xml}")
-        return
-
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-        print(f"Output folder created: {output_folder}")
-
-    print("Start processing XML...")
-    tree = ET.parse(input_xml)
-    root = tree.getroot()
-
-    processed_count = 0
-
-    for image in root.findall('image'):
-        image_name = image.get('name')
-        width = float(image.get('width'))
-        height = float(image.get('height'))
-
-        base_name = os.path.splitext(os.path.basename(image_name))[0]
-        txt_filename = base_name + ".txt"
-        output_path = os.path.join(output_folder, txt_filename)
-
-        yolo_lines = []
-
-        for box in image.findall('box'):
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+# PATH SETUP
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[2]
+
+DEFAULT_CLASSES = ["Indihome", "Indosat", "MyRepublic", "Lintasarta", "CBN"]
+ORPHAN = "<no image>"  # `skipped` key for COCO annotations whose image_id is not in `images`
+
+
+def load_class_mapping(data_config):
+    """name -> YOLO class id, from data.yaml `names` (falls back to the project classes)."""
+    if data_config and Path(data_config).exists():
+        with open(data_config) as f:
+            names = yaml.safe_load(f).get('names')
+        if isinstance(names, dict):
+            return {name: int(i) for i, name in names.items()}
+        if names:
+            return {name: i for i, name in enumerate(names)}
+    return {name: i for i, name in enumerate(DEFAULT_CLASSES)}
+
+
+# --- VECTORIZED CONVERSION ---
+def xyxy_to_yolo(boxes, width, height):
+    """(N, 4) pixel xyxy -> (N, 4) normalized cx, cy, w, h, clipped to the image."""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    width = np.broadcast_to(np.asarray(width, dtype=np.float64), len(boxes))
+    height = np.broadcast_to(np.asarray(height, dtype=np.float64), len(boxes))
+    x1, x2 = np.clip(boxes[:, 0], 0, width), np.clip(boxes[:, 2], 0, width)
+    y1, y2 = np.clip(boxes[:, 1], 0, height), np.clip(boxes[:, 3], 0, height)
+    return np.stack([(x1 + x2) / 2 / width, (y1 + y2) / 2 / height, (x2 - x1) / width, (y2 - y1) / height], axis=1)
+
+
+def format_labels(class_ids, yolo_boxes):
+    return "\n".join(f"{c} {x:.6f} {y:.6f} {w:.6f} {h:.6f}" for c, (x, y, w, h) in zip(class_ids, yolo_boxes.tolist()))
+
+
+# --- BUFFERED PARALLEL WRITER ---
+class LabelWriter:
+    """Buffers (file name, text) pairs and writes them in batches on a thread pool; in-flight batches are capped."""
+
+    def __init__(self, output_dir, workers=8, batch_size=256):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.batch_size = batch_size
+        self.max_in_flight = max(1, workers) * 2
+        self.buffer = []
+        self.in_flight = []
+        self.written = 0
+
+    def _write_batch(self, batch):
+        for name, text in batch:
+            with open(self.output_dir / name, 'w') as f:
+                f.write(text)
+        return len(batch)
+
+    def add(self, image_name, text):
+        self.buffer.append((Path(image_name).stem + ".txt", text))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer: return
+        while len(self.in_flight) >= self.max_in_flight:
+            self.written += self.in_flight.pop(0).result()
+        self.in_flight.append(self.pool.submit(self._write_batch, self.buffer))
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        for future in self.in_flight:
+            self.written += future.result()
+        self.pool.shutdown()
+        return self.written
+
+
+# --- CVAT XML (streamed) ---
+def convert_cvat(xml_path, writer, class_mapping, skipped):
+    """iterparse over <image> elements; each one is cleared (and dropped from the root) once written."""
+    images = boxes = 0
+    context = ET.iterparse(xml_path, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event != "end" or elem.tag != "image": continue
+
+        width, height = float(elem.get('width')), float(elem.get('height'))
+        class_ids, coords = [], []
+        for box in elem.iter('box'):
             label = box.get('label')
-
             if label not in class_mapping:
-                print(f"SKIP: Label '{label}' is not recognized in the image {image_name}")
+                skipped[label] += 1
                 continue
-
-            class_id = class_mapping[label]
-
-            xtl = float(box.get('xtl'))
-            ytl = float(box.get('ytl'))
-            xbr = float(box.get('xbr'))
-            ybr = float(box.get('ybr'))
-
-            box_w = xbr - xtl
-            box_h = ybr - ytl
-            x_center = xtl + (box_w / 2)
-            y_center = ytl + (box_h / 2)
-
-            norm_x = x_center / width
-            norm_y = y_center / height
-            norm_w = box_w / width
-            norm_h = box_h / height
-
-            line = f"{class_id} {norm_x:.6f} {norm_y:.6f} {norm_w:.6f} {norm_h:.6f}"
-            yolo_lines.append(line)
-
-        with open(output_path, 'w') as f:
-            f.write("\n".join(yolo_lines))
-
-        processed_count += 1
-        print(f"Generated: {txt_filename} ({len(yolo_lines)} labels)")
-
-    print(f"\nDone! A total of {processed_count} .txt files have been created in the output folder.")
+            class_ids.append(class_mapping[label])
+            coords.append((box.get('xtl'), box.get('ytl'), box.get('xbr'), box.get('ybr')))
+
+        yolo = xyxy_to_yolo(np.array(coords, dtype=np.float64), width, height)
+        writer.add(elem.get('name'), format_labels(class_ids, yolo))
+        images += 1
+        boxes += len(class_ids)
+        elem.clear()
+        root.clear()
+    return images, boxes
+
+
+# --- COCO JSON ---
+def _coco_sections(json_path):
+    """
+    categories, images and annotations of a COCO file as iterables. With
+    ijson each section is streamed; without it the file is parsed once and
+    held in memory.
+    """
+    keys = ('categories', 'images', 'annotations')
+    try:
+        import ijson
+    except ImportError:
+        with open(json_path) as f:
+            data = json.load(f)
+        return [data.get(key, []) for key in keys]
+
+    def stream(key):
+        with open(json_path, 'rb') as f:
+            yield from ijson.items(f, f"{key}.item")
+    return [stream(key) for key in keys]
+
+
+def convert_coco(json_path, writer, class_mapping, skipped):
+    """
+    All boxes go through one vectorized conversion, then are split per image
+    (sorted by image id). COCO does not group annotations by image, so every
+    kept box (as typed arrays, 48 bytes each) and the images table stay in
+    memory until the end; only the JSON parse itself is streamed (ijson).
+    """
+    categories, images, annotations = _coco_sections(json_path)
+    categories = {int(c['id']): c['name'] for c in categories}
+    images = {int(im['id']): (im['file_name'], float(im['width']), float(im['height'])) for im in images}
+
+    image_ids, class_ids, xywh = array('q'), array('q'), array('d')
+    for ann in annotations:
+        if int(ann['image_id']) not in images:
+            skipped[ORPHAN] += 1
+            continue
+        name = categories.get(int(ann['category_id']))
+        if name not in class_mapping:
+            skipped[name] += 1
+            continue
+        image_ids.append(int(ann['image_id']))
+        class_ids.append(class_mapping[name])
+        xywh.extend(float(v) for v in ann['bbox'])
+
+    image_ids = np.frombuffer(image_ids, dtype=np.int64)
+    class_ids = np.frombuffer(class_ids, dtype=np.int64)
+    xywh = np.frombuffer(xywh, dtype=np.float64).reshape(-1, 4)
+    sizes = np.array([images[i][1:] for i in image_ids], dtype=np.float64).reshape(-1, 2)
+    xyxy = np.concatenate([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]], axis=1)
+    yolo = xyxy_to_yolo(xyxy, sizes[:, 0], sizes[:, 1])
+
+    order = np.argsort(image_ids, kind="stable")
+    image_ids, class_ids, yolo = image_ids[order], class_ids[order], yolo[order]
+    starts = np.searchsorted(image_ids, list(images), side="left")
+    ends = np.searchsorted(image_ids, list(images), side="right")
+    for (image_id, (file_name, _, _)), start, end in zip(images.items(), starts, ends):
+        writer.add(file_name, format_labels(class_ids[start:end].tolist(), yolo[start:end]))
+    return len(images), len(class_ids)
+
+
+def convert(args):
+    fmt = args.format
+    if fmt == 'auto':
+        fmt = 'coco' if args.input.lower().endswith('.json') else 'cvat'
+    class_mapping = load_class_mapping(args.data_config)
+    print(f" [Start] {fmt.upper()} -> YOLO: {args.input}")
+    print(f" Classes: {class_mapping}")
+
+    t0 = time.perf_counter()
+    skipped = Counter()
+    writer = LabelWriter(args.output, args.workers)
+    try:
+        if fmt == 'cvat':
+            images, boxes = convert_cvat(args.input, writer, class_mapping, skipped)
+        else:
+            images, boxes = convert_coco(args.input, writer, class_mapping, skipped)
+    finally:
+        written = writer.close()
+
+    for label, count in skipped.items():
+        if label == ORPHAN:
+            print(f"SKIP: {count} annotations refer to an image_id that is not in 'images'")
+        else:
+            print(f"SKIP: label '{label}' is not in the class mapping ({count} boxes)")
+    print(f"\nDone! {written} label files ({images} images, {boxes} boxes) in {args.output} "
+          f"[{time.perf_counter() - t0:.2f}s]")
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description='Convert CVAT XML or COCO JSON annotations to YOLO label files')
+    parser.add_argument('--input', type=str, default=str(ROOT / 'data' / 'annotations' / 'cvat' / 'annotations.xml'),
+                        help='CVAT for images 1.1 XML, or COCO instances JSON')
+    parser.add_argument('--output', type=str, default=str(ROOT / 'data' / 'processed' / 'labels'),
+                        help='Folder for the .txt label files')
+    parser.add_argument('--format', type=str, default='auto', choices=['auto', 'cvat', 'coco'])
+    parser.add_argument('--data-config', type=str, default=str(ROOT / 'data' / 'processed' / 'data.yaml'),
+                        help='data.yaml whose names define the class ids')
+    parser.add_argument('--workers', type=int, default=8, help='Label writer threads')
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    convert_cvat_xml_to_yolo()
\ No newline at end of file
+    opt = parse_opt()
+    convert(opt)
@@ -1,59 +1,28 @@
+import argparse
 import os
 import random
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from PIL import Image
-from pycocotools.coco import COCO
 from pathlib import Path
 
-JSON_PATH = "annotations/coco/instances_annotations_cvat.json"
-IMAGE_DIR = r"C:\Workspace\projects\ml\real-world-telecom-infrastructure-object-detection\data\curated"
+from audit_dataset import ROOT, audit, load_coco
 
 
+def show_samples(images, boxes, image_dir, count=3):
+    """Draws the boxes of a few random images (needs a display; matplotlib is only imported here)."""
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+    from PIL import Image
 
-def validate_coco():
-    if not os.path.exists(JSON_PATH):
-        print(f"[ERROR] JSON file not found in: {JSON_PATH}")
-        return
-
-    print(f"Loading COCO file: {JSON_PATH}...")
-    coco = COCO(JSON_PATH)
-
-    cat_ids = coco.getCatIds()
-    cats = coco.loadCats(cat_ids)
-    img_ids = coco.getImgIds()
-    ann_ids = coco.getAnnIds()
-
-    print("\n" + "=" * 40)
-    print("DATASET STATISTICS")
-    print("=" * 40)
-    print(f"Total Images      : {len(img_ids)}")
-    print(f"Total Annotations : {len(ann_ids)}")
-    print(f"Total Categories  : {len(cats)}")
-
-    print("\nCATEGORY LIST:")
-    print(f"{'ID':<5} {'Name':<20} {'Count'}")
-    print("-" * 35)
-
-    for cat in cats:
-        cat_ann_ids = coco.getAnnIds(catIds=[cat['id']])
-        print(f"{cat['id']:<5} {cat['name']:<20} {len(cat_ann_ids)}")
+    by_image = boxes.groupby('image_id')
+    sample = images.sample(min(len(images), count), random_state=random.randrange(2 ** 31))
 
     print("\n" + "=" * 40)
     print("VISUALIZATIONS (Close window to continue)")
     print("=" * 40)
 
-    sample_img_ids = random.sample(img_ids, min(len(img_ids), 3))
-
-    for i, img_id in enumerate(sample_img_ids):
-        img_info = coco.loadImgs(img_id)[0]
-        img_filename = img_info['file_name']
-
-        img_path = Path(IMAGE_DIR) / Path(img_filename).name
-
+    for i, img in enumerate(sample.itertuples(index=False)):
+        img_path = Path(image_dir) / img.file_name
         if not img_path.exists():
-            img_path = Path(IMAGE_DIR).parent / Path(img_filename).name
-
+            img_path = Path(image_dir).parent / img.file_name
         if not img_path.exists():
             print(f"[WARNING] Image not found: {img_path}")
             continue
@@ -63,34 +32,64 @@ def validate_coco():
             plt.figure(figsize=(10, 8))
             plt.imshow(image)
             plt.axis('off')
-            plt.title(f"Image ID: {img_id} | File: {img_filename}")
-
-            ann_ids_img = coco.getAnnIds(imgIds=img_id)
-            anns = coco.loadAnns(ann_ids_img)
+            plt.title(f"Image ID: {img.image_id} | File: {img.file_name}")
 
+            anns = by_image.get_group(img.image_id) if img.image_id in by_image.groups else boxes.iloc[:0]
             ax = plt.gca()
-            for ann in anns:
-                bbox = ann['bbox']
-                cat_name = [c['name'] for c in cats if c['id'] == ann['category_id']][0]
-
-                rect = patches.Rectangle(
-                    (bbox[0], bbox[1]), bbox[2], bbox[3],
-                    linewidth=2, edgecolor='r', facecolor='none'
-                )
+            for ann in anns.itertuples(index=False):
+                x, y = ann.x1 * img.width, ann.y1 * img.height
+                rect = patches.Rectangle((x, y), ann.w_px, ann.h_px, linewidth=2, edgecolor='r', facecolor='none')
                 ax.add_patch(rect)
+                plt.text(x, y - 5, ann.class_name, color='white', fontsize=10, backgroundcolor='red')
 
-                plt.text(
-                    bbox[0], bbox[1] - 5,
-                    cat_name,
-                    color='white', fontsize=10, backgroundcolor='red'
-                )
-
-            print(f"Displaying images {i + 1}/3: {img_filename} ({len(anns)} objects)...")
+            print(f"Displaying images {i + 1}/{len(sample)}: {img.file_name} ({len(anns)} objects)...")
             plt.show()
 
         except Exception as e:
-            print(f"[ERROR] Failed to process image {img_filename}: {e}")
+            print(f"[ERROR] Failed to process image {img.file_name}: {e}")
+
+
+def validate_coco(args):
+    if not os.path.exists(args.json):
+        print(f"[ERROR] JSON file not found in: {args.json}")
+        return
+
+    print(f"Loading COCO file: {args.json}...")
+    images, boxes = load_coco(args.json)
+    images['split'] = 'all'
+    result = audit(images, boxes)
+
+    print("\n" + "=" * 40)
+    print("DATASET STATISTICS")
+    print("=" * 40)
+    print(f"Total Images      : {result['images']}")
+    print(f"Total Annotations : {result['boxes']}")
+    print(f"Total Categories  : {len(result['class_histogram'])}")
+    print(f"Images w/o boxes  : {result['empty_images']}")
+
+    print("\nCATEGORY LIST:")
+    print(f"{'Name':<20} {'Count'}")
+    print("-" * 30)
+    for name, count in result['class_histogram'].items():
+        print(f"{name:<20} {count}")
+
+    print("\nBOX CHECKS:")
+    for check, count in result['issue_counts'].items():
+        print(f"{check:<20} {count}")
+
+    if args.show:
+        show_samples(images, boxes, args.image_dir, args.samples)
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description='COCO statistics; see audit_dataset.py for the full report')
+    parser.add_argument('--json', type=str, default=str(ROOT / 'data' / 'annotations' / 'coco' / 'instances_annotations_cvat.json'))
+    parser.add_argument('--image-dir', type=str, default=str(ROOT / 'data' / 'curated'), help='Images for --show')
+    parser.add_argument('--show', action='store_true', help='Display random samples with their boxes')
+    parser.add_argument('--samples', type=int, default=3, help='Number of images shown with --show')
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    validate_coco()
\ No newline at end of file
+    opt = parse_opt()
+    validate_coco(opt)
@@ -0,0 +1,369 @@
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pandas as pd
+import yaml
+
+# PATH SETUP
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+if str(ROOT / 'deployment') not in sys.path:
+    sys.path.append(str(ROOT / 'deployment'))
+
+from export import resolve_data_path  # noqa: E402
+from image_cache import split_images  # noqa: E402
+from tiling import sliced_predict  # noqa: E402
+from utils import file_digest, weights_digest  # noqa: E402
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+CONF_FLOOR = 0.001  # same floor as ultralytics val, so every threshold can be evaluated from the cache
+CONF_GRID = np.linspace(0, 1, 1000)
+
+
+# --- PREDICTION CACHE ---
+class PredictionCache:
+    """
+    Raw predictions of one model configuration (weights digest, imgsz, tiling)
+    for any number of images, keyed by image content digest and stored
+    columnar in a single .npz:
+
+        image_keys, widths, heights, offsets   one entry per image (offsets: n + 1)
+        boxes (N, 4) xyxy px, confs (N,), classes (N,)
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.images = {}  # key -> (width, height, boxes, confs, classes)
+        if self.path.exists():
+            with np.load(self.path) as npz:
+                offsets = npz['offsets']
+                for i, key in enumerate(npz['image_keys']):
+                    lo, hi = offsets[i], offsets[i + 1]
+                    self.images[str(key)] = (int(npz['widths'][i]), int(npz['heights'][i]), npz['boxes'][lo:hi],
+                                             npz['confs'][lo:hi], npz['classes'][lo:hi])
+
+    def save(self):
+        keys = list(self.images)
+        counts = [len(self.images[k][3]) for k in keys]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp.npz')
+        np.savez_compressed(
+            tmp,
+            image_keys=np.array(keys, dtype='U40'),
+            widths=np.array([self.images[k][0] for k in keys], dtype=np.int32),
+            heights=np.array([self.images[k][1] for k in keys], dtype=np.int32),
+            offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            boxes=np.concatenate([self.images[k][2] for k in keys] or [np.zeros((0, 4))]).astype(np.float32),
+            confs=np.concatenate([self.images[k][3] for k in keys] or [np.zeros(0)]).astype(np.float32),
+            classes=np.concatenate([self.images[k][4] for k in keys] or [np.zeros(0)]).astype(np.int16),
+        )
+        os.replace(tmp, self.path)
+
+
+def model_key(args):
+    key = f"{weights_digest(args.weights)[:16]}_{args.imgsz}"
+    if args.tile_size:
+        key += f"_tile{args.tile_size}-{args.tile_overlap}-{args.tile_merge}-{int(not args.no_full_pass)}"
+    return key
+
+
+def predict_missing(args, image_paths, keys, cache):
+    """Runs the model only on images whose digest is not in the cache yet."""
+    missing = [(p, k) for p, k in zip(image_paths, keys) if k not in cache.images]
+    if not missing:
+        return 0
+    from ultralytics import YOLO
+
+    model = YOLO(args.weights, task='detect')
+    print(f" [Predict] {len(missing)} images ({len(image_paths) - len(missing)} cached)")
+    t0 = time.perf_counter()
+    for start in range(0, len(missing), args.batch):
+        chunk = missing[start:start + args.batch]
+        images = [cv2.imread(p) for p, _ in chunk]
+        if args.tile_size:
+            outputs = [sliced_predict(model, image, args.tile_size, args.tile_overlap, args.tile_merge,
+                                      not args.no_full_pass, conf=CONF_FLOOR, device=args.device)[:3]
+                       for image in images]
+        else:
+            results = model(images, imgsz=args.imgsz, conf=CONF_FLOOR, iou=0.7, max_det=300,
+                            device=args.device, verbose=False)
+            outputs = [(r.boxes.xyxy.cpu().numpy(), r.boxes.conf.cpu().numpy(), r.boxes.cls.cpu().numpy())
+                       for r in results]
+        for (_, key), image, (boxes, confs, classes) in zip(chunk, images, outputs):
+            h, w = image.shape[:2]
+            cache.images[key] = (w, h, np.asarray(boxes, np.float32).reshape(-1, 4),
+                                 np.asarray(confs, np.float32), np.asarray(classes, np.int16))
+    cache.save()
+    print(f" [Predict] Done in {time.perf_counter() - t0:.1f}s -> {cache.path}")
+    return len(missing)
+
+
+# --- GROUND TRUTH ---
+def label_path(img_path):
+    """Same mapping as ultralytics: .../images/... -> .../labels/....txt"""
+    sa, sb = f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"
+    return sb.join(img_path.rsplit(sa, 1)).rsplit('.', 1)[0] + '.txt'
+
+
+def load_targets(img_path, width, height):
+    path = label_path(img_path)
+    if not os.path.exists(path):
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.int16)
+    values = np.loadtxt(path, ndmin=2, dtype=np.float32)
+    if values.size == 0:
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.int16)
+    cx, cy, w, h = values[:, 1] * width, values[:, 2] * height, values[:, 3] * width, values[:, 4] * height
+    return np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], 1), values[:, 0].astype(np.int16)
+
+
+# --- MATCHING ---
+def box_iou(a, b):
+    """(len(a), len(b)) IoU matrix for xyxy boxes."""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def unique_matches(matches, iou):
+    """Keeps each (gt, pred) pair only once per side, highest IoU first."""
+    if len(matches) > 1:
+        matches = matches[iou[matches[:, 0], matches[:, 1]].argsort()[::-1]]
+        matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
+        matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
+    return matches
+
+
+def match_predictions(pred_classes, true_classes, iou, thresholds=IOU_THRESHOLDS):
+    """(n_pred, n_thresholds) true-positive mask; same one-to-one matching as ultralytics val."""
+    correct = np.zeros((len(pred_classes), len(thresholds)), dtype=bool)
+    iou = iou * (true_classes[:, None] == pred_classes[None, :])
+    for i, threshold in enumerate(thresholds):
+        matches = unique_matches(np.argwhere(iou >= threshold), iou)
+        correct[matches[:, 1], i] = True
+    return correct
+
+
+def confusion_matrix(preds, targets, nc, conf=0.25, iou_thres=0.45):
+    """(nc + 1) x (nc + 1) matrix, rows = predicted, columns = true; index nc is background."""
+    matrix = np.zeros((nc + 1, nc + 1), dtype=np.int64)
+    for (boxes, confs, classes), (gt_boxes, gt_classes) in zip(preds, targets):
+        keep = confs >= conf
+        boxes, classes = boxes[keep], classes[keep].astype(int)
+        gt_classes = gt_classes.astype(int)
+        if not len(gt_classes):
+            np.add.at(matrix, (classes, nc), 1)
+            continue
+        if not len(classes):
+            np.add.at(matrix, (nc, gt_classes), 1)
+            continue
+        iou = box_iou(gt_boxes, boxes)
+        matches = unique_matches(np.argwhere(iou > iou_thres), iou)
+        np.add.at(matrix, (classes[matches[:, 1]], gt_classes[matches[:, 0]]), 1)
+        missed = np.setdiff1d(np.arange(len(gt_classes)), matches[:, 0])
+        extra = np.setdiff1d(np.arange(len(classes)), matches[:, 1])
+        np.add.at(matrix, (nc, gt_classes[missed]), 1)
+        np.add.at(matrix, (classes[extra], nc), 1)
+    return matrix
+
+
+# --- METRICS ---
+def average_precision(recall, precision):
+    """
+    COCO 101-point interpolated AP of one PR curve, by the installed
+    ultralytics' compute_ap so the numbers match model.val(): how the
+    envelope is padded past the last recall changed between releases
+    (8.0.x ramps linearly to 0 at recall 1, later ones drop to 0 at once).
+    Without ultralytics, the current rule below is used.
+    """
+    try:
+        from ultralytics.utils.metrics import compute_ap
+    except ImportError:
+        pass
+    else:
+        return float(compute_ap(recall, precision)[0])
+    mrec = np.concatenate(([0.0], recall, [recall[-1] if len(recall) else 1.0], [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0], [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    x = np.linspace(0, 1, 101)
+    trapezoid = getattr(np, 'trapezoid', None) or np.trapz  # renamed in NumPy 2
+    return trapezoid(np.interp(x, mrec, mpre), x)
+
+
+def per_class_metrics(tp, confs, pred_classes, target_classes, names):
+    """
+    Per-class AP50, AP50-95 and P / R / F1 as functions of the confidence
+    threshold (PR curves), all from one sort + cumulative sums per class.
+    """
+    order = np.argsort(-confs, kind='stable')
+    tp, confs, pred_classes = tp[order], confs[order], pred_classes[order]
+    rows, curves = [], {}
+    for class_id, name in names.items():
+        n_true = int((target_classes == class_id).sum())
+        mask = pred_classes == class_id
+        if not mask.any() and not n_true: continue
+        tpc = np.cumsum(tp[mask], axis=0)
+        fpc = np.cumsum(~tp[mask], axis=0)
+        recall = tpc / (n_true + 1e-16)
+        precision = tpc / (tpc + fpc + 1e-16)
+        ap = np.array([average_precision(recall[:, j], precision[:, j]) for j in range(tp.shape[1])]) \
+            if mask.any() else np.zeros(tp.shape[1])
+        # P / R at every confidence on CONF_GRID (IoU 0.5), as ultralytics plots them
+        c = confs[mask]
+        r_curve = np.interp(-CONF_GRID, -c, recall[:, 0], left=0) if mask.any() else np.zeros_like(CONF_GRID)
+        p_curve = np.interp(-CONF_GRID, -c, precision[:, 0], left=1) if mask.any() else np.ones_like(CONF_GRID)
+        curves[name] = (p_curve, r_curve)
+        rows.append({'class': name, 'instances': n_true, 'predictions': int(mask.sum()),
+                     'ap50': ap[0], 'ap50_95': ap.mean()})
+    return pd.DataFrame(rows).set_index('class'), curves
+
+
+def f1(p, r):
+    return 2 * p * r / (p + r + 1e-16)
+
+
+def conf_sweep(curves, thresholds):
+    idx = np.clip(np.searchsorted(CONF_GRID, thresholds), 0, len(CONF_GRID) - 1)
+    rows = []
+    for name, (p_curve, r_curve) in curves.items():
+        for t, i in zip(thresholds, idx):
+            rows.append({'class': name, 'conf': round(float(t), 3), 'precision': p_curve[i], 'recall': r_curve[i],
+                         'f1': f1(p_curve[i], r_curve[i])})
+    return pd.DataFrame(rows)
+
+
+# --- EVALUATION ---
+def evaluate(args):
+    data_path = resolve_data_path(args.data_config)
+    with open(data_path) as f:
+        names = yaml.safe_load(f)['names']
+    names = dict(enumerate(names)) if isinstance(names, list) else {int(k): v for k, v in names.items()}
+    if args.classes:
+        unknown = set(args.classes) - set(names.values())
+        if unknown:
+            raise ValueError(f"Unknown classes: {', '.join(sorted(unknown))}")
+    subset = {i: n for i, n in names.items() if not args.classes or n in args.classes}
+
+    image_paths = split_images(data_path, [args.split])
+    if not image_paths:
+        raise FileNotFoundError(f"No '{args.split}' images for {data_path}")
+    cache = PredictionCache(ROOT / 'experiments' / 'eval_cache' / f'{model_key(args)}.npz')
+    keys = [file_digest(p) for p in image_paths]
+    predict_missing(args, image_paths, keys, cache)
+
+    t0 = time.perf_counter()
+    preds, targets, tps = [], [], []
+    for img_path, key in zip(image_paths, keys):
+        width, height, boxes, confs, classes = cache.images[key]
+        gt_boxes, gt_classes = load_targets(img_path, width, height)
+        if args.classes:
+            keep, keep_gt = np.isin(classes, list(subset)), np.isin(gt_classes, list(subset))
+            boxes, confs, classes = boxes[keep], confs[keep], classes[keep]
+            gt_boxes, gt_classes = gt_boxes[keep_gt], gt_classes[keep_gt]
+        preds.append((boxes, confs, classes))
+        targets.append((gt_boxes, gt_classes))
+        tps.append(match_predictions(classes, gt_classes, box_iou(gt_boxes, boxes)))
+
+    all_confs = np.concatenate([p[1] for p in preds])
+    all_classes = np.concatenate([p[2] for p in preds])
+    all_targets = np.concatenate([t[1] for t in targets])
+    metrics, curves = per_class_metrics(np.concatenate(tps), all_confs, all_classes, all_targets, subset)
+
+    # Operating point: --conf, or the threshold with the best mean F1 across classes
+    mean_f1 = np.mean([f1(p, r) for p, r in curves.values()], axis=0)
+    conf = args.conf if args.conf is not None else float(CONF_GRID[mean_f1.argmax()])
+    i = min(np.searchsorted(CONF_GRID, conf), len(CONF_GRID) - 1)
+    metrics['precision'] = [curves[n][0][i] for n in metrics.index]
+    metrics['recall'] = [curves[n][1][i] for n in metrics.index]
+    metrics['f1'] = f1(metrics['precision'], metrics['recall'])
+
+    sweep = conf_sweep(curves, np.round(np.arange(args.sweep_step, 1.0, args.sweep_step), 3))
+    matrix = confusion_matrix(preds, targets, len(names), conf, args.iou)
+    labels = [names[i] for i in range(len(names))] + ['background']
+    matrix = pd.DataFrame(matrix, index=pd.Index(labels, name='predicted'), columns=labels)
+    print(f" Metrics for {len(image_paths)} images in {time.perf_counter() - t0:.2f}s (from cache)")
+    return metrics, curves, sweep, matrix, conf, len(image_paths)
+
+
+def write_report(metrics, curves, sweep, matrix, conf, n_images, args):
+    out_dir = Path(args.out) if args.out else ROOT / 'experiments' / 'eval' / Path(args.weights).stem
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    table = metrics.round(4)
+    summary = {'weights': str(args.weights), 'split': args.split, 'images': n_images, 'imgsz': args.imgsz,
+               'tile_size': args.tile_size, 'conf': round(conf, 3), 'iou_confusion': args.iou,
+               'map50': round(float(metrics['ap50'].mean()), 4), 'map50_95': round(float(metrics['ap50_95'].mean()), 4),
+               'classes': table.to_dict(orient='index')}
+    lines = [f"# Evaluation: {Path(args.weights).name} on '{args.split}' ({n_images} images)", "",
+             f"mAP50: {summary['map50']:.4f} | mAP50-95: {summary['map50_95']:.4f} | "
+             f"P/R/F1 at conf {conf:.3f}", "",
+             "| Class | Instances | Predictions | AP50 | AP50-95 | Precision | Recall | F1 |",
+             "|---|---|---|---|---|---|---|---|"]
+    for name, r in table.iterrows():
+        lines.append(f"| {name} | {r['instances']:.0f} | {r['predictions']:.0f} | {r['ap50']:.4f} | "
+                     f"{r['ap50_95']:.4f} | {r['precision']:.4f} | {r['recall']:.4f} | {r['f1']:.4f} |")
+    lines += ["", f"## Confusion matrix (conf >= {conf:.3f}, IoU > {args.iou})", "",
+              "| predicted \\ true | " + " | ".join(matrix.columns) + " |", "|---" * (len(matrix.columns) + 1) + "|"]
+    lines += [f"| {name} | " + " | ".join(str(v) for v in row) + " |" for name, row in matrix.iterrows()]
+    report = "\n".join(lines) + "\n"
+
+    (out_dir / 'eval_report.md').write_text(report, encoding='utf-8')
+    (out_dir / 'eval_report.json').write_text(json.dumps(summary, indent=2))
+    sweep.round(4).to_csv(out_dir / 'conf_sweep.csv', index=False)
+    matrix.to_csv(out_dir / 'confusion_matrix.csv')
+    pr = pd.DataFrame({'conf': CONF_GRID})
+    for name, (p_curve, r_curve) in curves.items():
+        pr[f'{name}_precision'], pr[f'{name}_recall'] = p_curve, r_curve
+    pr.round(4).to_csv(out_dir / 'pr_curves.csv', index=False)
+
+    if args.plots:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        fig, ax = plt.subplots(figsize=(8, 6))
+        for name, (p_curve, r_curve) in curves.items():
+            ax.plot(r_curve, p_curve, label=f"{name} AP50 {metrics.at[name, 'ap50']:.3f}")
+        ax.set(xlabel='Recall', ylabel='Precision', xlim=(0, 1), ylim=(0, 1.01), title='PR curves (IoU 0.5)')
+        ax.legend()
+        fig.savefig(out_dir / 'pr_curves.png', dpi=150)
+        plt.close(fig)
+
+    print("\n" + report)
+    print(f"Report saved to: {out_dir}")
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description='Evaluate a model from cached val predictions')
+    parser.add_argument('--weights', type=str, default=str(ROOT / 'deployment' / 'best.pt'),
+                        help='best.pt, .onnx or an OpenVINO model folder')
+    parser.add_argument('--data-config', type=str, default='data.yaml', help='Config data file name')
+    parser.add_argument('--split', type=str, default='val', help='data.yaml split to evaluate')
+    parser.add_argument('--imgsz', type=int, default=1240, help='Inference image size')
+    parser.add_argument('--batch', type=int, default=8, help='Images per inference batch')
+    parser.add_argument('--device', type=str, default=None, help='Device (0, 1, or cpu)')
+    parser.add_argument('--tile-size', type=int, default=None, help='Sliced inference tile size (px)')
+    parser.add_argument('--tile-overlap', type=float, default=0.2, help='Tile overlap ratio')
+    parser.add_argument('--tile-merge', type=str, default='nms', choices=['nms', 'wbf'])
+    parser.add_argument('--no-full-pass', action='store_true', help='Skip the full-image pass when tiling')
+    parser.add_argument('--classes', nargs='+', default=None, help='Only evaluate these class names')
+    parser.add_argument('--conf', type=float, default=None,
+                        help='Confidence for P/R/F1 and the confusion matrix (default: best mean F1)')
+    parser.add_argument('--iou', type=float, default=0.45, help='IoU for the confusion matrix')
+    parser.add_argument('--sweep-step', type=float, default=0.05, help='Confidence step of conf_sweep.csv')
+    parser.add_argument('--plots', action='store_true', help='Also save pr_curves.png')
+    parser.add_argument('--out', type=str, default=None, help='Report folder (default: experiments/eval/<weights>)')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    write_report(*evaluate(opt), opt)
@@ -0,0 +1,190 @@
+import argparse
+import json
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import yaml
+from ultralytics import YOLO
+
+# PATH SETUP
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def resolve_data_path(data_config):
+    data_path = ROOT / 'data' / 'processed' / data_config
+    if not data_path.exists():
+        potential_paths = list(ROOT.glob(f"data/**/{data_config}"))
+        if not potential_paths:
+            raise FileNotFoundError(f" Data config '{data_config}' lost!")
+        data_path = potential_paths[0]
+    return data_path
+
+
+def calibration_images(data_path, split, limit):
+    """Image paths of one split from data.yaml, used to calibrate INT8 activations."""
+    with open(data_path) as f:
+        cfg = yaml.safe_load(f)
+    root = Path(cfg.get('path') or data_path.parent)
+    if not root.is_absolute():
+        root = (data_path.parent / root).resolve()
+    if not root.exists():
+        root = data_path.parent
+    split_dir = root / cfg[split]
+    images = sorted(p for p in split_dir.rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not images:
+        raise FileNotFoundError(f"No calibration images found in {split_dir}")
+    return images[:limit]
+
+
+def letterbox(image, imgsz):
+    """Same preprocessing as ultralytics: resize longest side, pad to a square with gray (114)."""
+    h, w = image.shape[:2]
+    r = imgsz / max(h, w)
+    nh, nw = int(round(h * r)), int(round(w * r))
+    resized = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    canvas[top:top + nh, left:left + nw] = resized
+    blob = canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0  # BGR->RGB, HWC->NCHW
+    return np.ascontiguousarray(blob)
+
+
+# --- EXPORT ---
+def export_onnx(weights, args):
+    model = YOLO(weights)
+    onnx_path = Path(model.export(format='onnx', imgsz=args.imgsz, dynamic=True, simplify=True))
+    outputs = {'onnx': onnx_path}
+
+    if args.int8:
+        from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                              quantize_static)
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+
+        images = calibration_images(resolve_data_path(args.data_config), args.calib_split, args.calib_images)
+        input_name = 'images'
+
+        class LetterboxReader(CalibrationDataReader):
+            def __init__(self):
+                self.paths = iter(images)
+
+            def get_next(self):
+                for path in self.paths:
+                    image = cv2.imread(str(path))
+                    if image is not None:
+                        return {input_name: letterbox(image, args.imgsz)}
+                return None
+
+        print(f" INT8 calibration on {len(images)} images ({args.calib_split} split)")
+        prep_path = onnx_path.with_name(onnx_path.stem + '_prep.onnx')
+        int8_path = onnx_path.with_name(onnx_path.stem + '_int8.onnx')
+        quant_pre_process(str(onnx_path), str(prep_path), skip_symbolic_shape=True)
+        quantize_static(str(prep_path), str(int8_path), LetterboxReader(),
+                        quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+        prep_path.unlink(missing_ok=True)
+        outputs['onnx-int8'] = int8_path
+    return outputs
+
+
+def export_openvino(weights, args):
+    outputs = {'openvino': Path(YOLO(weights).export(format='openvino', imgsz=args.imgsz, dynamic=True))}
+    if args.int8:
+        # Ultralytics runs NNCF post-training quantization, calibrated on the data.yaml images
+        data_path = resolve_data_path(args.data_config)
+        outputs['openvino-int8'] = Path(YOLO(weights).export(format='openvino', imgsz=args.imgsz,
+                                                             int8=True, data=str(data_path)))
+    return outputs
+
+
+# --- REPORT ---
+def evaluate(path, args, data_path):
+    model = YOLO(str(path), task='detect')
+    metrics = model.val(data=str(data_path), imgsz=args.imgsz, batch=1, device=args.device,
+                        split='val', plots=False, verbose=False)
+    return {
+        "map50": round(float(metrics.box.map50), 4),
+        "map50_95": round(float(metrics.box.map), 4),
+        "inference_ms": round(float(metrics.speed['inference']), 2),
+        "size_mb": round(sum(f.stat().st_size for f in Path(path).rglob('*')) / 2**20
+                         if Path(path).is_dir() else Path(path).stat().st_size / 2**20, 1),
+    }
+
+
+def write_report(results, out_dir):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    baseline = results.get('pytorch')
+    lines = ["| Backend | mAP50 | mAP50-95 | Δ mAP50-95 | Inference (ms/img) | Speed-up | Size (MB) |",
+             "|---|---|---|---|---|---|---|"]
+    for backend, r in results.items():
+        delta = r['map50_95'] - baseline['map50_95'] if baseline else 0.0
+        speedup = baseline['inference_ms'] / r['inference_ms'] if baseline and r['inference_ms'] else 1.0
+        lines.append(f"| {backend} | {r['map50']:.4f} | {r['map50_95']:.4f} | {delta:+.4f} | "
+                     f"{r['inference_ms']:.1f} | {speedup:.2f}x | {r['size_mb']:.1f} |")
+    table = "\n".join(lines)
+
+    (out_dir / 'export_report.md').write_text(table + "\n")
+    (out_dir / 'export_report.json').write_text(json.dumps(results, indent=2))
+    print("\n" + table)
+    print(f"\nReport saved to: {out_dir}")
+
+
+def export(args):
+    weights = Path(args.weights).resolve()
+    print(f" [Start] Exporting: {weights}")
+    print(f" Formats: {', '.join(args.formats)} | INT8: {args.int8} | Image Size: {args.imgsz}")
+
+    artifacts = {'pytorch': weights}
+    if 'onnx' in args.formats:
+        artifacts.update(export_onnx(weights, args))
+    if 'openvino' in args.formats:
+        artifacts.update(export_openvino(weights, args))
+
+    if args.copy_to:
+        copy_dir = Path(args.copy_to)
+        for backend, path in artifacts.items():
+            if backend == 'pytorch': continue
+            target = copy_dir / path.name
+            if path.is_dir():
+                shutil.copytree(path, target, dirs_exist_ok=True)
+            else:
+                shutil.copy2(path, target)
+            print(f" Copied {backend}: {target}")
+
+    if args.report:
+        data_path = resolve_data_path(args.data_config)
+        results = {}
+        for backend, path in artifacts.items():
+            print(f"\n Validating {backend} ({path.name})...")
+            t0 = time.perf_counter()
+            results[backend] = evaluate(path, args, data_path)
+            print(f"   done in {time.perf_counter() - t0:.1f}s: {results[backend]}")
+        write_report(results, ROOT / 'experiments' / 'export')
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description='Export best.pt to CPU-friendly ONNX / OpenVINO backends')
+    parser.add_argument('--weights', type=str, default=str(ROOT / 'deployment' / 'best.pt'), help='PyTorch weights')
+    parser.add_argument('--formats', nargs='+', default=['onnx', 'openvino'], choices=['onnx', 'openvino'])
+    parser.add_argument('--imgsz', type=int, default=1240, help='Export/inference image size (training used 1240)')
+    parser.add_argument('--int8', action='store_true', help='Also produce INT8 post-training quantized models')
+    parser.add_argument('--data-config', type=str, default='data.yaml', help='Config data file name')
+    parser.add_argument('--calib-split', type=str, default='train', help='Split used for ONNX INT8 calibration')
+    parser.add_argument('--calib-images', type=int, default=200, help='Max images for ONNX INT8 calibration')
+    parser.add_argument('--report', action='store_true', help='Compare mAP / latency on the val split')
+    parser.add_argument('--device', type=str, default='cpu', help='Device used for the report')
+    parser.add_argument('--copy-to', type=str, default=None, help='Copy exported models here (e.g. deployment/)')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    export(opt)
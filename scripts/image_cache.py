@@ -0,0 +1,243 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+import yaml
+from ultralytics.data import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils import colorstr
+from ultralytics.utils.torch_utils import unwrap_model
+
+# PATH SETUP
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+INDEX_VERSION = 1
+
+
+# --- ON-DISK IMAGE CACHE ---
+class ImageCache:
+    """
+    Decoded, EXIF-oriented images resized so the long side is `imgsz` (as
+    ultralytics does), stored in memory-mapped .npy shards of fixed
+    (imgsz, imgsz, 3) slots. Entries are keyed by the SHA-1 of the file
+    contents under a per-size folder, so renamed or copied images and other
+    experiments reuse them:
+
+        <root>/<imgsz>/index.json       sha1 -> [shard, slot, h, w, h0, w0]
+        <root>/<imgsz>/shard_00000.npy  (shard_size, imgsz, imgsz, 3) uint8
+    """
+
+    def __init__(self, root, imgsz, shard_size=64, workers=8):
+        self.dir = Path(root) / str(imgsz)
+        self.imgsz = imgsz
+        self.shard_size = shard_size
+        self.workers = workers
+        self.index_path = self.dir / 'index.json'
+        self.lock_path = self.dir / 'index.lock'
+        self.entries, self.files = {}, {}
+        self._shards = {}
+        self._load_index()
+
+    def __getstate__(self):
+        # Dataloader workers reopen the memmaps themselves
+        state = self.__dict__.copy()
+        state['_shards'] = {}
+        return state
+
+    def _load_index(self):
+        if self.index_path.exists():
+            index = json.loads(self.index_path.read_text())
+            if index.get('version') == INDEX_VERSION and index.get('shard_size') == self.shard_size:
+                self.entries, self.files = index['entries'], index['files']
+
+    def _save_index(self):
+        tmp = self.index_path.with_suffix('.tmp')
+        tmp.write_text(json.dumps({'version': INDEX_VERSION, 'imgsz': self.imgsz, 'shard_size': self.shard_size,
+                                   'entries': self.entries, 'files': self.files}))
+        os.replace(tmp, self.index_path)
+
+    def _lock(self, stale_after=3600):
+        """Cross-process lock so parallel runs (e.g. a sweep) don't fill the same shards twice."""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        waited = False
+        while True:
+            try:
+                os.close(os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return
+            except FileExistsError:
+                try:
+                    if time.time() - self.lock_path.stat().st_mtime > stale_after:
+                        self.lock_path.unlink(missing_ok=True)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if not waited:
+                    print(f" [Cache] Waiting for another run to fill {self.dir}...")
+                    waited = True
+                time.sleep(1)
+
+    def _shard(self, shard_id, create=False):
+        if shard_id not in self._shards:
+            path = self.dir / f'shard_{shard_id:05d}.npy'
+            if create and not path.exists():
+                shape = (self.shard_size, self.imgsz, self.imgsz, 3)
+                self._shards[shard_id] = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=shape)
+            else:
+                self._shards[shard_id] = np.load(path, mmap_mode='r+' if create else 'r')
+        return self._shards[shard_id]
+
+    def file_key(self, path):
+        """SHA-1 of the file; remembered per (path, size, mtime) so unchanged files are not re-read."""
+        stat = os.stat(path)
+        known = self.files.get(str(path))
+        if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return known[2]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self.files[str(path)] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def decode(self, path):
+        """Same decode + resize as ultralytics BaseDataset.load_image (rect mode)."""
+        im = cv2.imdecode(np.fromfile(path, np.uint8), cv2.IMREAD_COLOR)  # applies EXIF orientation
+        if im is None:
+            raise FileNotFoundError(f"Image Not Found {path}")
+        h0, w0 = im.shape[:2]
+        r = self.imgsz / max(h0, w0)
+        if r != 1:
+            w, h = min(math.ceil(w0 * r), self.imgsz), min(math.ceil(h0 * r), self.imgsz)
+            im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+        return im, (h0, w0)
+
+    def ensure(self, paths):
+        """Decodes every image not cached yet (once, on a thread pool) and returns their keys in order."""
+        self._lock()
+        try:
+            self._shards = {}
+            self._load_index()  # pick up entries written by other runs
+            keys = [self.file_key(p) for p in paths]
+            missing = list(dict.fromkeys(k for k in keys if k not in self.entries))
+            if missing:
+                first_path = {}
+                for path, key in zip(paths, keys):
+                    first_path.setdefault(key, path)
+                t0 = time.perf_counter()
+                print(f" [Cache] Decoding {len(missing)} images to {self.dir} ({len(keys) - len(missing)} cached)")
+
+                def fill(item):
+                    slot_index, key = item
+                    im, (h0, w0) = self.decode(first_path[key])
+                    shard_id, slot = divmod(slot_index, self.shard_size)
+                    h, w = im.shape[:2]
+                    self._shard(shard_id, create=True)[slot, :h, :w] = im
+                    return key, [shard_id, slot, h, w, h0, w0]
+
+                start = len(self.entries)
+                for shard_id in range(start // self.shard_size, (start + len(missing) - 1) // self.shard_size + 1):
+                    self._shard(shard_id, create=True)  # create shards up front, not racing in the pool
+                with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+                    for key, entry in pool.map(fill, enumerate(missing, start)):
+                        self.entries[key] = entry
+                for shard in self._shards.values():
+                    shard.flush()
+                print(f" [Cache] Done in {time.perf_counter() - t0:.1f}s")
+            self._save_index()
+            self._shards = {}  # reopen read-only for training
+            return keys
+        finally:
+            self.lock_path.unlink(missing_ok=True)
+
+    def read(self, key):
+        """(image, (h0, w0), (h, w)); the copy comes straight from the page cache, nothing is decoded."""
+        shard_id, slot, h, w, h0, w0 = self.entries[key]
+        im = np.array(self._shard(shard_id)[slot, :h, :w])  # writable copy; transforms modify in place
+        return im, (h0, w0), (h, w)
+
+
+# --- ULTRALYTICS HOOKS ---
+class CachedYOLODataset(YOLODataset):
+    """YOLODataset whose load_image reads from an ImageCache instead of decoding the JPEG every epoch."""
+
+    def __init__(self, *args, image_cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.image_cache = image_cache
+        self.cache_keys = image_cache.ensure(self.im_files)
+
+    def load_image(self, i, rect_mode=True, *args, **kwargs):
+        if not rect_mode or args or kwargs.get('resize_short'):
+            return super().load_image(i, rect_mode, *args, **kwargs)
+        im, hw0, hw = self.image_cache.read(self.cache_keys[i])
+        if self.augment:  # Mosaic samples its partners from this buffer
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                self.buffer.pop(0)
+        return im, hw0, hw
+
+
+class CachedDetectionTrainer(DetectionTrainer):
+    """DetectionTrainer that builds CachedYOLODataset for both the train and val loaders."""
+
+    def __init__(self, *args, cache_dir=None, **kwargs):
+        self.cache_dir = cache_dir
+        super().__init__(*args, **kwargs)
+
+    def build_dataset(self, img_path, mode="train", batch=None):
+        image_cache = ImageCache(self.cache_dir, self.args.imgsz, workers=max(1, self.args.workers))
+        gs = max(int(unwrap_model(self.model).stride.max()), 32)
+        return CachedYOLODataset(
+            img_path=img_path,
+            imgsz=self.args.imgsz,
+            batch_size=batch,
+            augment=mode == "train",
+            hyp=self.args,
+            rect=self.args.rect or mode == "val",
+            cache=None,
+            single_cls=self.args.single_cls or False,
+            stride=gs,
+            pad=0.0 if mode == "train" else 0.5,
+            prefix=colorstr(f"{mode}: "),
+            task=self.args.task,
+            classes=self.args.classes,
+            data=self.data,
+            fraction=self.args.fraction if mode == "train" else 1.0,
+            image_cache=image_cache,
+        )
+
+
+# --- PREBUILD ---
+def split_images(data_path, splits):
+    with open(data_path) as f:
+        cfg = yaml.safe_load(f)
+    root = Path(cfg.get('path') or data_path.parent)
+    if not root.is_absolute():
+        root = (data_path.parent / root).resolve()
+    if not root.exists():
+        root = data_path.parent
+    images = []
+    for split in splits:
+        if split in cfg:
+            images += sorted(str(p) for p in (root / cfg[split]).rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+    return images
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Pre-decode training images into the memory-mapped cache')
+    parser.add_argument('--data-config', type=str, default=str(ROOT / 'data' / 'processed' / 'data.yaml'))
+    parser.add_argument('--splits', nargs='+', default=['train', 'val'])
+    parser.add_argument('--imgsz', type=int, default=1240, help='Training image size')
+    parser.add_argument('--cache-dir', type=str, default=str(ROOT / 'data' / 'cache'))
+    parser.add_argument('--workers', type=int, default=8, help='Decoder threads')
+    args = parser.parse_args()
+
+    paths = split_images(Path(args.data_config), args.splits)
+    ImageCache(args.cache_dir, args.imgsz, workers=args.workers).ensure(paths)
+    print(f"{len(paths)} images cached at {args.imgsz}px in {Path(args.cache_dir) / str(args.imgsz)}")
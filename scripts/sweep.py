@@ -0,0 +1,270 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from train import parse_opt
+
+# PATH SETUP
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]
+TRAIN_SCRIPT = FILE.parent / 'train.py'
+
+METRIC_COLUMNS = {'map50': 'metrics/mAP50(B)', 'map50_95': 'metrics/mAP50-95(B)'}
+EXAMPLE_SPEC = """\
+# python scripts/sweep.py --spec sweep.yaml
+method: random        # grid | random
+trials: 12            # random only
+base:                 # fixed train.py flags for every trial
+  data_config: data.yaml
+  epochs: 60
+  batch: 16
+params:               # a list = choices, {min, max[, log]} = range (random only)
+  mosaic: [0.0, 0.5, 1.0]
+  mixup: {min: 0.0, max: 0.3}
+  copy_paste: [0.0, 0.1, 0.3]
+  erasing: {min: 0.0, max: 0.6}
+  imgsz: [960, 1240]
+"""
+
+
+# --- SEARCH SPACE ---
+def sample_trials(spec, seed=0):
+    """List of {flag: value} dicts from a grid or random search spec."""
+    params = spec.get('params', {})
+    if spec.get('method', 'grid') == 'grid':
+        for name, values in params.items():
+            if not isinstance(values, list):
+                raise ValueError(f"Grid search needs a list of values for '{name}'")
+        return [dict(zip(params, combo)) for combo in itertools.product(*params.values())]
+
+    rng = random.Random(seed)
+
+    def draw(values):
+        if isinstance(values, list):
+            return rng.choice(values)
+        lo, hi = values['min'], values['max']
+        if values.get('log'):
+            value = math.exp(rng.uniform(math.log(lo), math.log(hi)))
+        else:
+            value = rng.uniform(lo, hi)
+        return int(round(value)) if isinstance(lo, int) and isinstance(hi, int) else round(value, 4)
+
+    return [{name: draw(values) for name, values in params.items()} for _ in range(spec.get('trials', 10))]
+
+
+def train_argv(options):
+    argv = []
+    for name, value in options.items():
+        flag = '--' + name.replace('_', '-')
+        if isinstance(value, bool):
+            if value: argv.append(flag)
+        else:
+            argv += [flag, str(value)]
+    return argv
+
+
+# --- TRIALS ---
+class Trial:
+    def __init__(self, trial_id, params, argv, exp_name):
+        self.id = trial_id
+        self.params = params
+        self.argv = argv
+        self.exp_name = exp_name
+        self.results_csv = ROOT / 'experiments' / exp_name / 'results.csv'
+        self.process = self.log = None
+        self.device = None
+        self.started = self.finished = None
+        self.status = 'pending'
+        self.history = []  # per-epoch metric
+
+    def poll_metrics(self, column):
+        if not self.results_csv.exists(): return
+        try:
+            df = pd.read_csv(self.results_csv)
+        except (pd.errors.EmptyDataError, pd.errors.ParserError):
+            return  # written while we read; next poll
+        df.columns = df.columns.str.strip()
+        if column in df:
+            self.history = df[column].astype(float).tolist()
+
+    def best(self, epoch=None):
+        values = self.history if epoch is None else self.history[:epoch + 1]
+        return max(values) if values else float('nan')
+
+
+class Scheduler:
+    """
+    Runs trials as train.py subprocesses over a fixed set of slots (device,
+    threads). A running trial is stopped once it is past `grace_epochs` and
+    its best metric so far is below the `stop_quantile` of what the other
+    trials had reached at the same epoch (median stopping rule by default).
+    """
+
+    def __init__(self, trials, slots, threads, out_dir, metric='map50_95', grace_epochs=10, stop_quantile=0.5,
+                 min_peers=2, timeout_min=None, poll_s=10):
+        self.pending = list(trials)
+        self.trials = list(trials)
+        self.free_slots = list(slots)
+        self.threads = threads
+        self.out_dir = out_dir
+        self.column = METRIC_COLUMNS[metric]
+        self.grace_epochs = grace_epochs
+        self.stop_quantile = stop_quantile
+        self.min_peers = min_peers
+        self.timeout_s = timeout_min * 60 if timeout_min else None
+        self.poll_s = poll_s
+        self.running = []
+
+    def _launch(self, trial, device):
+        env = dict(os.environ, OMP_NUM_THREADS=str(self.threads), MKL_NUM_THREADS=str(self.threads),
+                   PYTHONUNBUFFERED='1')
+        if device != 'cpu':
+            env['CUDA_VISIBLE_DEVICES'] = device  # the trial sees its GPU as device 0
+        argv = [sys.executable, str(TRAIN_SCRIPT), *trial.argv, '--exp-name', trial.exp_name,
+                '--device', 'cpu' if device == 'cpu' else '0', '--skip-val']
+        trial.log = open(self.out_dir / f'{trial.id}.log', 'w')
+        trial.process = subprocess.Popen(argv, stdout=trial.log, stderr=subprocess.STDOUT, env=env, cwd=ROOT)
+        trial.device, trial.started, trial.status = device, time.time(), 'running'
+        self.running.append(trial)
+        print(f" [Sweep] {trial.id} started on {device}: {trial.params}")
+
+    def _finish(self, trial, status):
+        if trial.process.poll() is None:
+            trial.process.terminate()
+            try:
+                trial.process.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                trial.process.kill()
+        trial.log.close()
+        trial.poll_metrics(self.column)
+        trial.status, trial.finished = status, time.time()
+        self.running.remove(trial)
+        self.free_slots.append(trial.device)
+        print(f" [Sweep] {trial.id} {status} after {len(trial.history)} epochs, best {trial.best():.4f}")
+
+    def _should_stop(self, trial):
+        epoch = len(trial.history) - 1
+        if epoch + 1 < self.grace_epochs: return False
+        peers = [t.best(epoch) for t in self.trials if t is not trial and len(t.history) > epoch]
+        if len(peers) < self.min_peers: return False
+        return bool(trial.best(epoch) < np.quantile(peers, self.stop_quantile))
+
+    def run(self):
+        while self.pending or self.running:
+            while self.pending and self.free_slots:
+                self._launch(self.pending.pop(0), self.free_slots.pop(0))
+            time.sleep(self.poll_s)
+            for trial in list(self.running):
+                trial.poll_metrics(self.column)
+                code = trial.process.poll()
+                if code is not None:
+                    self._finish(trial, 'completed' if code == 0 else f'failed ({code})')
+                elif self.timeout_s and time.time() - trial.started > self.timeout_s:
+                    self._finish(trial, 'timeout')
+                elif self._should_stop(trial):
+                    self._finish(trial, 'stopped')
+            self.write_results()
+
+    def results(self):
+        rows = []
+        for trial in self.trials:
+            rows.append({'trial': trial.id, **trial.params, 'status': trial.status, 'epochs': len(trial.history),
+                         'best': round(trial.best(), 4), 'device': trial.device,
+                         'minutes': round(((trial.finished or time.time()) - trial.started) / 60, 1)
+                         if trial.started else None})
+        return pd.DataFrame(rows).sort_values('best', ascending=False, na_position='last')
+
+    def write_results(self):
+        df = self.results()
+        df.to_csv(self.out_dir / 'sweep_results.csv', index=False)
+        lines = ["| " + " | ".join(df.columns) + " |", "|" + "---|" * len(df.columns)]
+        lines += ["| " + " | ".join("" if pd.isna(v) else str(v) for v in row) + " |"
+                  for row in df.itertuples(index=False)]
+        (self.out_dir / 'sweep_results.md').write_text("\n".join(lines) + "\n")
+        return df
+
+
+def build_slots(devices, trials_per_device):
+    return [device for device in devices for _ in range(trials_per_device)]
+
+
+def sweep(args):
+    if args.example:
+        print(EXAMPLE_SPEC)
+        return
+    with open(args.spec) as f:
+        spec = yaml.safe_load(f)
+
+    base = spec.get('base', {})
+    for option in ('device', 'exp_name', 'skip_val'):
+        base.pop(option, None)  # set per trial by the scheduler
+    if args.cache_dir:
+        base['cache_dir'] = str(Path(args.cache_dir).resolve())  # trials share one pre-decoded image cache
+    slots = build_slots(args.devices, args.trials_per_device)
+    threads = args.threads or max(1, (os.cpu_count() or 1) // len(slots))
+    base.setdefault('workers', min(4, threads))
+
+    name = args.name or time.strftime('sweep_%Y%m%d_%H%M%S')
+    out_dir = ROOT / 'experiments' / name
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    trials = []
+    for i, params in enumerate(sample_trials(spec, args.seed)):
+        argv = train_argv({**base, **params})
+        parse_opt(argv)  # reject unknown flags / bad values before anything starts
+        trials.append(Trial(f't{i:03d}', params, argv, f'{name}/t{i:03d}'))
+
+    (out_dir / 'sweep_spec.json').write_text(json.dumps({'spec': spec, 'args': vars(args)}, indent=2, default=str))
+    print(f" [Sweep] {name}: {len(trials)} trials on {len(slots)} slots ({', '.join(slots)}), "
+          f"{threads} threads each, early stop on {args.metric} after {args.grace_epochs} epochs")
+
+    scheduler = Scheduler(trials, slots, threads, out_dir, args.metric, args.grace_epochs, args.stop_quantile,
+                          args.min_peers, args.timeout_min, args.poll)
+    t0 = time.time()
+    try:
+        scheduler.run()
+    finally:
+        for trial in list(scheduler.running):
+            scheduler._finish(trial, 'interrupted')
+        df = scheduler.write_results()
+    print("\n" + df.to_string(index=False))
+    print(f"\nSweep finished in {(time.time() - t0) / 60:.1f} min. Results: {out_dir / 'sweep_results.md'}")
+
+
+def parse_sweep_opt():
+    parser = argparse.ArgumentParser(description='Grid / random search over train.py with parallel trials')
+    parser.add_argument('--spec', type=str, help='Sweep spec (YAML); see --example')
+    parser.add_argument('--example', action='store_true', help='Print an example spec and exit')
+    parser.add_argument('--name', type=str, default=None, help='Sweep folder under experiments/')
+    parser.add_argument('--devices', nargs='+', default=['0'], help='GPU ids and/or "cpu"')
+    parser.add_argument('--trials-per-device', type=int, default=1, help='Concurrent trials per device')
+    parser.add_argument('--threads', type=int, default=None, help='CPU threads per trial (default: cores / slots)')
+    parser.add_argument('--timeout-min', type=float, default=None, help='Wall-clock budget per trial')
+    parser.add_argument('--metric', type=str, default='map50_95', choices=list(METRIC_COLUMNS))
+    parser.add_argument('--grace-epochs', type=int, default=10, help='Never stop a trial before this epoch')
+    parser.add_argument('--stop-quantile', type=float, default=0.5,
+                        help='Stop a trial below this quantile of its peers at the same epoch')
+    parser.add_argument('--min-peers', type=int, default=2, help='Peers needed at an epoch before stopping')
+    parser.add_argument('--cache-dir', type=str, default=None, help='Shared pre-decoded image cache for all trials')
+    parser.add_argument('--seed', type=int, default=0, help='Random search seed')
+    parser.add_argument('--poll', type=float, default=10, help='Seconds between results.csv checks')
+    args = parser.parse_args()
+    if not args.spec and not args.example:
+        parser.error('--spec is required')
+    return args
+
+
+if __name__ == "__main__":
+    opt = parse_sweep_opt()
+    sweep(opt)
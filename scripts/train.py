@@ -1,6 +1,7 @@
 import argparse
 import sys
 import yaml
+from functools import partial
 from pathlib import Path
 from ultralytics import YOLO, settings
 
@@ -18,6 +19,8 @@ def train(args):
     print(f" [Start] Training Project: {args.project_name}")
     print(f" Early Model: {args.model}")
     print(f"️ Image Size: {args.imgsz} | Batch: {args.batch}")
+    if args.cache_dir:
+        print(f" Image Cache: {args.cache_dir}")
 
     settings.update({'raytune': False})
 
@@ -39,10 +42,17 @@ def train(args):
     # Output Directory
     project_dir = ROOT / 'experiments'
 
+    # Optional pre-decoded image cache (decode + resize once, memory-mapped afterwards)
+    trainer = None
+    if args.cache_dir:
+        from image_cache import CachedDetectionTrainer
+        trainer = partial(CachedDetectionTrainer, cache_dir=args.cache_dir)
+
     print("\n Training Start with Specific Augmentations...")
 
     # TRAINING
     results = model.train(
+        trainer=trainer,
         data=str(data_path),
         epochs=args.epochs,
         imgsz=args.imgsz,
@@ -67,17 +77,20 @@ def train(args):
         flipud=0.0,
         fliplr=0.5,
         mosaic=args.mosaic,
-        mixup=0.1,
-        copy_paste=0.1,
-        erasing=0.4,
+        mixup=args.mixup,
+        copy_paste=args.copy_paste,
+        erasing=args.erasing,
 
         # System
+        workers=args.workers,
         optimizer='auto',
         verbose=True,
         seed=42
     )
 
     print(f"Training completed. Output saved to: {project_dir / args.exp_name}")
+    if args.skip_val:
+        return
 
     # VALIDATION
     print("\n Running Validation on the Best Model...")
@@ -89,9 +102,12 @@ def train(args):
     print(f"\n Validation Result:")
     print(f"   mAP50:    {metrics.box.map50:.4f}")
     print(f"   mAP50-95: {metrics.box.map:.4f}")
+    for i, class_id in enumerate(metrics.box.ap_class_index):
+        print(f"   {metrics.names[int(class_id)]:<12} AP50: {metrics.box.ap50[i]:.4f} | AP50-95: {metrics.box.ap[i]:.4f}")
+    print(" Slice by class / confidence / tiling without re-running inference: scripts/evaluate.py")
 
 
-def parse_opt():
+def parse_opt(argv=None):
     parser = argparse.ArgumentParser(description='Telkomsel Infrastructure Detection Training Script')
 
     # Default values
@@ -107,8 +123,15 @@ def parse_opt():
     parser.add_argument('--exp-name', type=str, default='aug_run_v1', help='Experiment Name (output folder)')
     parser.add_argument('--device', type=str, default='0', help='Device (0, 1, or cpu)')
     parser.add_argument('--mosaic', type=float, default=0.5, help='Mosaic Augmentation Probability')
-
-    return parser.parse_args()
+    parser.add_argument('--mixup', type=float, default=0.1, help='MixUp Augmentation Probability')
+    parser.add_argument('--copy-paste', type=float, default=0.1, help='Copy-Paste Augmentation Probability')
+    parser.add_argument('--erasing', type=float, default=0.4, help='Random Erasing Probability')
+    parser.add_argument('--workers', type=int, default=8, help='Dataloader workers')
+    parser.add_argument('--skip-val', action='store_true', help='Skip the final validation (per-epoch val still runs)')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='Pre-decoded image cache folder (e.g. data/cache); decodes each image once across runs')
+
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":